@@ -33,12 +33,39 @@ def migrate():
         "ALTER TABLE projects ADD COLUMN IF NOT EXISTS design_proposals TEXT DEFAULT ''",
         "ALTER TABLE projects ADD COLUMN IF NOT EXISTS full_report TEXT DEFAULT ''",
         "ALTER TABLE projects ADD COLUMN IF NOT EXISTS images JSONB DEFAULT '[]'",
+        # 原子合并 content 顶层字段（db_service.merge_project_content 调用）
+        """
+        CREATE OR REPLACE FUNCTION merge_project_content(p_project_name TEXT, p_patch JSONB)
+        RETURNS BOOLEAN
+        LANGUAGE sql
+        AS $$
+            UPDATE projects
+            SET content = COALESCE(content::jsonb, '{}'::jsonb) || p_patch
+            WHERE project_name = p_project_name
+            RETURNING TRUE;
+        $$
+        """,
+        # 认领中断的 run_all：仅当 run_state 的 owner/heartbeat 仍是扫描时的值才写入（db_service.claim_run_async 调用）
+        """
+        CREATE OR REPLACE FUNCTION claim_project_run(p_project_name TEXT, p_expected JSONB, p_state JSONB)
+        RETURNS BOOLEAN
+        LANGUAGE sql
+        AS $$
+            UPDATE projects
+            SET content = jsonb_set(COALESCE(content::jsonb, '{}'::jsonb), '{run_state}', p_state)
+            WHERE project_name = p_project_name
+              AND content::jsonb->'run_state'->'owner' = p_expected->'owner'
+              AND content::jsonb->'run_state'->'heartbeat' = p_expected->'heartbeat'
+            RETURNING TRUE;
+        $$
+        """,
+        "NOTIFY pgrst, 'reload schema'",
     ]
 
     for sql in migrations:
         try:
             cursor.execute(sql)
-            print(f"✅ 执行成功: {sql[:60]}...")
+            print(f"✅ 执行成功: {sql.strip()[:60]}...")
         except Exception as e:
             print(f"⚠️ {e}")
 
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+JSON 修复解析器基准测试
+用合成的 LLM 响应语料（含常见损坏方式）测量恢复率与解析吞吐量
+
+用法: python scripts/bench_json_repair.py [--size-kb 300] [--samples 20] [--chunk 64]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from core.json_repair import JsonRepairParser, parse_json  # noqa: E402
+
+PARAGRAPH = (
+    "## 市场洞察\n本季度户外露营装备的搜索量同比增长 42%，用户关注“轻量化”与“快速搭建”。"
+    "竞品普遍采用铝合金骨架，价格带集中在 300-800 元。\n- 目标人群：25-35 岁城市白领\n"
+)
+
+
+def make_response(size_kb: int, rng: random.Random) -> dict:
+    """生成约 size_kb 大小的设计报告结构"""
+    body = []
+    while sum(len(p) for p in body) * 3 < size_kb * 1024:
+        body.append(PARAGRAPH * rng.randint(1, 4))
+    prompts = [
+        {
+            "scheme": f"方案{i}",
+            "inspiration": "自然与科技的融合",
+            "description": PARAGRAPH,
+            "prompt": f"product render, camping chair, variant {i}, soft light, 8k",
+        }
+        for i in range(8)
+    ]
+    return {"summary": "核心摘要", "content": "".join(body), "prompts": prompts}
+
+
+# 每种损坏方式: 函数(合法 JSON 文本, rng) -> (损坏文本, 期望解析出的值；None 表示只要求恢复出前缀)
+def _trailing_commas(text, rng):
+    return text.replace("}", ",}").replace("]", ",]"), json.loads(text)
+
+
+def _truncate(text, rng):
+    return text[: int(len(text) * rng.uniform(0.5, 0.95))], None
+
+
+def _raw_newlines(text, rng):
+    return text.replace("\\n", "\n"), json.loads(text)
+
+
+def _smart_quotes(text, rng):
+    broken = text.replace('"summary"', "“summary”").replace('"prompts"', "“prompts”")
+    return broken, json.loads(text)
+
+
+def _inner_quotes(text, rng):
+    expected = json.loads(text.replace("轻量化", '\\"轻量化\\"'))
+    return text.replace("轻量化", '"轻量化"'), expected
+
+
+def _fenced_prose(text, rng):
+    broken = "好的，以下是分析结果：\n```json\n" + text + "\n```\n如需调整请告诉我。"
+    return broken, json.loads(text)
+
+
+CORRUPTIONS = [
+    ("trailing_commas", _trailing_commas),
+    ("truncated", _truncate),
+    ("raw_newlines", _raw_newlines),
+    ("smart_quotes", _smart_quotes),
+    ("inner_quotes", _inner_quotes),
+    ("fenced_prose", _fenced_prose),
+]
+
+
+def _recovered(value, expected, original) -> bool:
+    if expected is not None:
+        return value == expected
+    # 截断：摘要完整且正文至少保留了一部分
+    return (
+        isinstance(value, dict)
+        and value.get("summary") == original["summary"]
+        and original["content"].startswith(value.get("content") or "\0")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 修复解析器基准测试")
+    parser.add_argument("--size-kb", type=int, default=300, help="单个响应大小 (KB)")
+    parser.add_argument("--samples", type=int, default=20, help="每种损坏方式的样本数")
+    parser.add_argument("--chunk", type=int, default=64, help="增量解析的分块大小")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(
+        f"\n📊 JSON 修复基准: {args.samples} 样本 × {len(CORRUPTIONS)} 种损坏，"
+        f"约 {args.size_kb}KB/样本"
+    )
+    print("=" * 78)
+    print(
+        f"{'损坏方式':<18}{'json.loads':>12}{'修复恢复率':>12}"
+        f"{'一次性 MB/s':>14}{'增量 MB/s':>12}"
+    )
+
+    for name, corrupt in CORRUPTIONS:
+        baseline = recovered = 0
+        total_bytes = one_shot = incremental = 0.0
+        for _ in range(args.samples):
+            original = make_response(args.size_kb, rng)
+            text, expected = corrupt(json.dumps(original, ensure_ascii=False), rng)
+            total_bytes += len(text.encode("utf-8"))
+
+            try:
+                json.loads(text)
+                baseline += 1
+            except ValueError:
+                pass
+
+            start = time.perf_counter()
+            try:
+                value = parse_json(text).value
+            except ValueError:
+                value = None
+            one_shot += time.perf_counter() - start
+            if _recovered(value, expected, original):
+                recovered += 1
+
+            start = time.perf_counter()
+            stream = JsonRepairParser()
+            for i in range(0, len(text), args.chunk):
+                stream.feed(text[i : i + args.chunk])
+            try:
+                stream.finish()
+            except ValueError:
+                pass
+            incremental += time.perf_counter() - start
+
+        mb = total_bytes / 1024 / 1024
+        print(
+            f"{name:<18}{baseline / args.samples:>12.0%}{recovered / args.samples:>12.0%}"
+            f"{mb / one_shot:>14.1f}{mb / incremental:>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
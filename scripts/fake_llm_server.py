@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+本地 OpenAI 兼容的假 LLM 服务，用于离线压测与故障演练
+实现 /chat/completions（流式与非流式），按请求的 Agent 返回对应结构的 JSON，
+可配置延迟分布、429/500 注入、空响应、损坏的 JSON 与流中断。
+
+用法:
+    python scripts/fake_llm_server.py --port 8001 --latency-ms 800 --jitter-ms 400 \\
+        --error-429 0.05 --error-500 0.02 --malformed 0.05 \\
+        --model-faults '{"gemini-2.5-flash": {"error_500": 1.0}}'
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake \
+        LLM_LOG_PATH=/tmp/fake_llm_calls.jsonl python src/api.py
+
+运行期间可通过 POST /_fake/config 调整参数，GET /_fake/stats 查看注入统计。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 可按模型覆盖的故障参数（概率均为 0~1）
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "latency_ms": 300.0,  # 非流式响应的平均延迟；流式时为首 token 延迟
+    "jitter_ms": 100.0,  # 延迟抖动幅度
+    "distribution": "lognormal",  # fixed / uniform / lognormal（长尾）
+    "chunk_delay_ms": 15.0,  # 流式 chunk 间隔
+    "chunk_chars": 24,  # 每个流式 chunk 的字符数
+    "error_429": 0.0,
+    "error_500": 0.0,
+    "empty": 0.0,
+    "malformed": 0.0,
+    "stream_abort": 0.0,  # 流式输出到一半断开连接
+    "retry_after": 1.0,  # 429 响应的 Retry-After（秒）
+}
+
+PARAGRAPH = (
+    "目标人群集中在 25-35 岁的城市白领，关注“轻量化”“易收纳”与“高颜值”。"
+    "竞品价格带集中在 300-800 元，差异化机会在材质与细节交互。"
+)
+
+
+def _visuals(rng: random.Random, n: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "concept": f"概念{i + 1}",
+            "prompt": f"product photography, concept {i + 1}, soft light, studio, 8k, seed {rng.randint(1, 9999)}",
+        }
+        for i in range(n)
+    ]
+
+
+def agent_fixture(agent: str, brief: str, rng: random.Random) -> Dict[str, Any]:
+    """生成与 core.agent_schemas 中各 Agent schema 一致的 JSON"""
+    if agent == "product_designer":
+        return {
+            "summary": f"{brief} 的设计方案",
+            "prompts": [
+                {
+                    "scheme": f"方案{i + 1}",
+                    "inspiration": "自然与科技的融合",
+                    "description": PARAGRAPH,
+                    "prompt": f"industrial design render of {brief[:20]}, variant {i + 1}, 8k",
+                }
+                for i in range(4)
+            ],
+        }
+    title = "视觉调研" if agent == "visual_researcher" else "市场分析"
+    return {
+        "summary": f"{brief[:30]} 的{title}摘要",
+        "content": f"## {title}\n" + "\n".join(PARAGRAPH for _ in range(rng.randint(3, 6))),
+        "visuals": _visuals(rng, 2),
+    }
+
+
+def detect_agent(body: Dict[str, Any]) -> Optional[str]:
+    """优先按 response_format 的 schema 名称识别 Agent，否则按提示词关键字"""
+    response_format = body.get("response_format") or {}
+    name = (response_format.get("json_schema") or {}).get("name")
+    if name:
+        return name
+    messages = body.get("messages") or []
+    text = str(messages[-1].get("content", "")) if messages else ""
+    for agent, keywords in (
+        ("product_designer", ("设计方案", "product designer")),
+        ("visual_researcher", ("视觉调研", "visual research")),
+        ("market_analyst", ("市场分析", "market analy")),
+    ):
+        if any(k in text.lower() for k in keywords):
+            return agent
+    return None
+
+
+class FakeLLM:
+    """请求级的故障与延迟决策，按模型叠加覆盖参数"""
+
+    def __init__(self, settings: Dict[str, Any] = None, model_faults=None, seed=None):
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.model_faults: Dict[str, Dict[str, Any]] = model_faults or {}
+        self.rng = random.Random(seed)
+        self.stats: Counter = Counter()
+
+    def for_model(self, model: str) -> Dict[str, Any]:
+        return {**self.settings, **self.model_faults.get(model, {})}
+
+    def latency(self, s: Dict[str, Any]) -> float:
+        mean, jitter = s["latency_ms"], s["jitter_ms"]
+        if s["distribution"] == "fixed" or mean <= 0:
+            value = mean
+        elif s["distribution"] == "uniform":
+            value = self.rng.uniform(mean - jitter, mean + jitter)
+        else:
+            # 对数正态：中位数约为 mean，jitter 越大尾部越长
+            sigma = min(2.0, jitter / mean) if mean else 0.0
+            value = self.rng.lognormvariate(0, sigma) * mean
+        return max(0.0, value) / 1000
+
+    def roll(self, s: Dict[str, Any], fault: str) -> bool:
+        return self.rng.random() < s.get(fault, 0.0)
+
+    def content(self, body: Dict[str, Any], s: Dict[str, Any]) -> str:
+        agent = detect_agent(body)
+        messages = body.get("messages") or []
+        brief = str(messages[-1].get("content", ""))[:60] if messages else ""
+        if self.roll(s, "empty"):
+            self.stats["empty"] += 1
+            return ""
+        if agent is None:
+            # 自动补全 / 标签等纯文本调用
+            return "#简约 #科技 #户外" if "标签" in brief else f"{brief}（扩展后的设计需求）"
+        text = json.dumps(agent_fixture(agent, brief, self.rng), ensure_ascii=False)
+        if self.roll(s, "malformed"):
+            self.stats["malformed"] += 1
+            # 截断 + 多余逗号，模拟模型输出被截断或格式错误
+            return text[: int(len(text) * self.rng.uniform(0.5, 0.9))] + ","
+        return text
+
+
+def _usage(body: Dict[str, Any], text: str) -> Dict[str, Any]:
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages") or [])
+    return {
+        "prompt_tokens": prompt_chars // 2,
+        "completion_tokens": len(text) // 2,
+        "total_tokens": prompt_chars // 2 + len(text) // 2,
+    }
+
+
+def _error(status: int, message: str, retry_after: float = None) -> JSONResponse:
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else None
+    kind = "rate_limit_exceeded" if status == 429 else "server_error"
+    return JSONResponse(
+        {"error": {"message": message, "type": kind, "code": status}},
+        status_code=status,
+        headers=headers,
+    )
+
+
+def create_app(fake: FakeLLM = None) -> FastAPI:
+    fake = fake or FakeLLM()
+    app = FastAPI(title="Fake LLM")
+    app.state.fake = fake
+
+    @app.get("/models")
+    @app.get("/v1/models")
+    def list_models():
+        models = sorted(set(fake.model_faults) | {"fake-model"})
+        return {"object": "list", "data": [{"id": m, "object": "model"} for m in models]}
+
+    @app.post("/chat/completions")
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake-model")
+        s = fake.for_model(model)
+        fake.stats["requests"] += 1
+
+        if fake.roll(s, "error_429"):
+            fake.stats["429"] += 1
+            await asyncio.sleep(fake.latency(s) / 4)
+            return _error(429, "Rate limit exceeded (injected)", s["retry_after"])
+        if fake.roll(s, "error_500"):
+            fake.stats["500"] += 1
+            await asyncio.sleep(fake.latency(s) / 2)
+            return _error(500, "Internal server error (injected)")
+
+        text = fake.content(body, s)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(fake.latency(s))
+            fake.stats["ok"] += 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": _usage(body, text),
+            }
+
+        abort = fake.roll(s, "stream_abort")
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        def chunk(delta: Dict[str, Any], finish=None, usage=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            if usage is not None:
+                payload["usage"] = usage
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events():
+            await asyncio.sleep(fake.latency(s))
+            yield chunk({"role": "assistant", "content": ""})
+            size = max(1, int(s["chunk_chars"]))
+            pieces = [text[i : i + size] for i in range(0, len(text), size)]
+            for i, piece in enumerate(pieces):
+                if abort and i >= len(pieces) // 2:
+                    fake.stats["stream_abort"] += 1
+                    raise ConnectionResetError("stream aborted (injected)")
+                await asyncio.sleep(s["chunk_delay_ms"] / 1000)
+                yield chunk({"content": piece})
+            yield chunk({}, "stop", _usage(body, text) if include_usage else None)
+            yield "data: [DONE]\n\n"
+            fake.stats["ok"] += 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/_fake/stats")
+    def stats():
+        return dict(fake.stats)
+
+    @app.get("/_fake/config")
+    def get_config():
+        return {"settings": fake.settings, "model_faults": fake.model_faults}
+
+    @app.post("/_fake/config")
+    async def update_config(request: Request):
+        """局部更新：{"settings": {...}, "model_faults": {...}}"""
+        body = await request.json()
+        fake.settings.update(body.get("settings") or {})
+        fake.model_faults.update(body.get("model_faults") or {})
+        return get_config()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容的假 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_SETTINGS["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_SETTINGS["jitter_ms"])
+    parser.add_argument(
+        "--distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal"
+    )
+    parser.add_argument("--chunk-delay-ms", type=float, default=DEFAULT_SETTINGS["chunk_delay_ms"])
+    parser.add_argument("--error-429", type=float, default=0.0, help="429 注入概率")
+    parser.add_argument("--error-500", type=float, default=0.0, help="500 注入概率")
+    parser.add_argument("--empty", type=float, default=0.0, help="空响应概率")
+    parser.add_argument("--malformed", type=float, default=0.0, help="损坏 JSON 概率")
+    parser.add_argument("--stream-abort", type=float, default=0.0, help="流式中途断开概率")
+    parser.add_argument(
+        "--model-faults", default="{}", help='按模型覆盖参数的 JSON，如 {"gpt-4o-mini": {"error_500": 1}}'
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeLLM(
+        {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "distribution": args.distribution,
+            "chunk_delay_ms": args.chunk_delay_ms,
+            "error_429": args.error_429,
+            "error_500": args.error_500,
+            "empty": args.empty,
+            "malformed": args.malformed,
+            "stream_abort": args.stream_abort,
+        },
+        model_faults=json.loads(args.model_faults),
+        seed=args.seed,
+    )
+
+    import uvicorn
+
+    print(f"🤖 Fake LLM 服务: http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
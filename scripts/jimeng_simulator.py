@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+即梦后端模拟器，用于在不消耗真实积分的情况下压测图片生成链路
+实现 jimeng 客户端用到的接口（aigc_draft/generate、get_history_by_ids、
+user_credit、credit_receive）以及一个假的图片 CDN，可配置：
+排队时长分布、status=30 生成失败、2038 内容过滤、积分不足、登录失效，以及 gzip / br 压缩响应。
+
+用法:
+    python scripts/jimeng_simulator.py --port 8002 --queue-ms 8000 --jitter-ms 4000 \\
+        --fail 0.05 --filtered 0.02 --credits 100 --encoding br
+    JIMENG_BASE_URL=http://127.0.0.1:8002 JIMENG_API_TOKEN=sim python src/api.py
+
+运行期间可通过 POST /_sim/config 调整参数，GET /_sim/stats 查看统计。
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import struct
+import time
+import uuid
+import zlib
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # 未安装时 br 退化为不压缩
+    brotli = None
+
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "queue_ms": 5000.0,  # 提交到出图的平均排队 + 生成时长
+    "jitter_ms": 2000.0,  # 排队时长抖动（对数正态）
+    "api_latency_ms": 50.0,  # 每个接口本身的响应延迟
+    "cdn_latency_ms": 100.0,  # 图片下载延迟
+    "images_per_job": 4,
+    "fail": 0.0,  # status=30 生成失败概率
+    "filtered": 0.0,  # status=30 + fail_code=2038 内容过滤概率
+    "credits": 1000,  # 每个 token 的初始积分；每次生成扣 1 分
+    "daily_gift": 66,  # credit_receive 领取的积分
+    "token_credits": {},  # 按 token 覆盖初始积分，如 {"a": 0, "b": 500}
+    "expired_tokens": [],  # 这些 token 的生成请求返回登录失效（ret=34010105）
+    "encoding": "gzip",  # 响应压缩：none / gzip / br
+}
+
+
+def _png(rgb) -> bytes:
+    """生成 16x16 纯色 PNG"""
+    width = height = 16
+    raw = b"".join(b"\x00" + bytes(rgb) * width for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _session_token(request: Request) -> str:
+    cookie = request.headers.get("cookie", "")
+    for part in cookie.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == "sessionid":
+            return value
+    return "anonymous"
+
+
+class _Job:
+    __slots__ = ("history_id", "token", "prompt", "created", "ready_at", "outcome")
+
+    def __init__(self, history_id, token, prompt, ready_at, outcome):
+        self.history_id = history_id
+        self.token = token
+        self.prompt = prompt
+        self.created = time.time()
+        self.ready_at = ready_at
+        self.outcome = outcome
+
+
+class JimengSimulator:
+    """模拟器状态：任务表、各 token 的积分与统计"""
+
+    def __init__(self, settings: Dict[str, Any] = None, seed=None):
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self.rng = random.Random(seed)
+        self.jobs: Dict[str, _Job] = {}
+        self.credits: Dict[str, int] = {}
+        self.stats: Counter = Counter()
+
+    def queue_time(self) -> float:
+        mean, jitter = self.settings["queue_ms"], self.settings["jitter_ms"]
+        if mean <= 0:
+            return 0.0
+        sigma = min(2.0, jitter / mean)
+        return self.rng.lognormvariate(0, sigma) * mean / 1000
+
+    def balance(self, token: str) -> int:
+        initial = self.settings["token_credits"].get(token, self.settings["credits"])
+        return self.credits.setdefault(token, int(initial))
+
+    def submit(self, token: str, prompt: str) -> Optional[_Job]:
+        """提交任务；积分不足时返回 None"""
+        if self.balance(token) <= 0:
+            self.stats["insufficient_credits"] += 1
+            return None
+        self.credits[token] -= 1
+        roll = self.rng.random()
+        if roll < self.settings["filtered"]:
+            outcome = "filtered"
+        elif roll < self.settings["filtered"] + self.settings["fail"]:
+            outcome = "failed"
+        else:
+            outcome = "ok"
+        job = _Job(uuid.uuid4().hex, token, prompt, time.time() + self.queue_time(), outcome)
+        self.jobs[job.history_id] = job
+        self.stats["submitted"] += 1
+        return job
+
+    def record(self, history_id: str, cdn_base: str) -> Optional[Dict[str, Any]]:
+        """get_history_by_ids 中单个任务的记录：20 生成中，50 完成，30 失败"""
+        job = self.jobs.get(history_id)
+        if job is None:
+            return None
+        self.stats["polls"] += 1
+        if time.time() < job.ready_at:
+            return {"history_record_id": history_id, "status": 20, "item_list": []}
+        if job.outcome != "ok":
+            self.stats[job.outcome] += 1
+            return {
+                "history_record_id": history_id,
+                "status": 30,
+                "fail_code": "2038" if job.outcome == "filtered" else "1000",
+                "item_list": [],
+            }
+        urls = [
+            f"{cdn_base}/cdn/{history_id}/{i}.png"
+            for i in range(int(self.settings["images_per_job"]))
+        ]
+        return {
+            "history_record_id": history_id,
+            "status": 50,
+            "item_list": [
+                {
+                    "image": {"large_images": [{"image_url": url, "width": 1024, "height": 1024}]},
+                    "common_attr": {"cover_url": url},
+                }
+                for url in urls
+            ],
+        }
+
+
+def create_app(sim: JimengSimulator = None) -> FastAPI:
+    sim = sim or JimengSimulator()
+    app = FastAPI(title="Jimeng Simulator")
+    app.state.sim = sim
+
+    async def reply(data: Any = None, ret: str = "0", errmsg: str = "success") -> Response:
+        await asyncio.sleep(sim.settings["api_latency_ms"] / 1000)
+        body = json.dumps({"ret": ret, "errmsg": errmsg, "data": data}, ensure_ascii=False)
+        content = body.encode("utf-8")
+        headers = {}
+        encoding = sim.settings["encoding"]
+        if encoding == "gzip":
+            content = gzip.compress(content)
+            headers["Content-Encoding"] = "gzip"
+        elif encoding == "br" and brotli is not None:
+            content = brotli.compress(content)
+            headers["Content-Encoding"] = "br"
+        return Response(content, media_type="application/json", headers=headers)
+
+    @app.post("/mweb/v1/aigc_draft/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        try:
+            draft = json.loads(body.get("draft_content") or "{}")
+            core = draft["component_list"][0]["abilities"]["generate"]["core_param"]
+            prompt = core.get("prompt", "")
+        except (ValueError, KeyError, IndexError, TypeError):
+            return await reply(ret="1000", errmsg="invalid draft_content")
+        token = _session_token(request)
+        if token in sim.settings["expired_tokens"]:
+            sim.stats["expired"] += 1
+            return await reply(ret="34010105", errmsg="login error")
+        job = sim.submit(token, prompt)
+        if job is None:
+            return await reply(ret="5000", errmsg="credit not enough")
+        return await reply({"aigc_data": {"history_record_id": job.history_id}})
+
+    @app.post("/mweb/v1/get_history_by_ids")
+    async def get_history_by_ids(request: Request):
+        body = await request.json()
+        sim.stats["history_requests"] += 1
+        cdn_base = str(request.base_url).rstrip("/")
+        data = {}
+        for history_id in body.get("history_ids") or []:
+            record = sim.record(history_id, cdn_base)
+            if record is not None:
+                data[history_id] = record
+        return await reply(data)
+
+    @app.post("/commerce/v1/benefits/user_credit")
+    async def user_credit(request: Request):
+        balance = sim.balance(_session_token(request))
+        return await reply(
+            {"credit": {"gift_credit": balance, "purchase_credit": 0, "vip_credit": 0}}
+        )
+
+    @app.post("/commerce/v1/benefits/credit_receive")
+    async def credit_receive(request: Request):
+        token = _session_token(request)
+        sim.credits[token] = sim.balance(token) + int(sim.settings["daily_gift"])
+        sim.stats["credit_receive"] += 1
+        return await reply({"receive_quota": sim.settings["daily_gift"]})
+
+    @app.get("/cdn/{history_id}/{index}.png")
+    async def cdn_image(history_id: str, index: int):
+        await asyncio.sleep(sim.settings["cdn_latency_ms"] / 1000)
+        sim.stats["downloads"] += 1
+        seed = zlib.crc32(f"{history_id}/{index}".encode())
+        return Response(_png(((seed >> 16) & 255, (seed >> 8) & 255, seed & 255)), media_type="image/png")
+
+    @app.get("/_sim/stats")
+    def stats():
+        pending = sum(1 for job in sim.jobs.values() if time.time() < job.ready_at)
+        return {**sim.stats, "pending": pending, "credits": dict(sim.credits)}
+
+    @app.get("/_sim/config")
+    def get_config():
+        return sim.settings
+
+    @app.post("/_sim/config")
+    async def update_config(request: Request):
+        sim.settings.update(await request.json())
+        return sim.settings
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="即梦后端模拟器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--queue-ms", type=float, default=DEFAULT_SETTINGS["queue_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_SETTINGS["jitter_ms"])
+    parser.add_argument("--api-latency-ms", type=float, default=DEFAULT_SETTINGS["api_latency_ms"])
+    parser.add_argument("--cdn-latency-ms", type=float, default=DEFAULT_SETTINGS["cdn_latency_ms"])
+    parser.add_argument("--fail", type=float, default=0.0, help="status=30 生成失败概率")
+    parser.add_argument("--filtered", type=float, default=0.0, help="2038 内容过滤概率")
+    parser.add_argument("--credits", type=int, default=DEFAULT_SETTINGS["credits"], help="每个 token 的初始积分")
+    parser.add_argument("--encoding", choices=["none", "gzip", "br"], default="gzip")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    sim = JimengSimulator(
+        {
+            "queue_ms": args.queue_ms,
+            "jitter_ms": args.jitter_ms,
+            "api_latency_ms": args.api_latency_ms,
+            "cdn_latency_ms": args.cdn_latency_ms,
+            "fail": args.fail,
+            "filtered": args.filtered,
+            "credits": args.credits,
+            "encoding": args.encoding,
+        },
+        seed=args.seed,
+    )
+
+    import uvicorn
+
+    print(f"🎨 即梦模拟器: http://{args.host}:{args.port}  (JIMENG_BASE_URL)")
+    uvicorn.run(create_app(sim), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@ import os
 import sys
 import time
 import json
-from typing import Optional, List, Dict, Any
+import asyncio
+from typing import Optional, List, Dict, Any, Set
 from fastapi import FastAPI, HTTPException, Body, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -13,10 +14,19 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import logger
 from services.project_service import ProjectService
 from services import db_service
-from main import DesignWorkflow
+from services.run_checkpoint import RunCheckpoint, find_resumable
+from main import AsyncDesignWorkflow, indexable_analysis
 from task_manager import TaskRegistry, compute_dedup_key
 from core.config_manager import config_manager
-from llm_wrapper import LLMService
+from core.step_cache import get_step_cache
+from core.analysis_index import get_analysis_index
+from core.agent_schemas import get_capabilities
+from core.model_router import get_model_router
+from core.rate_limiter import get_rate_limiter
+from core.singleflight import get_async_singleflight, get_singleflight
+from core.log_sink import get_log_sink
+from core.usage import get_usage_tracker
+from core.service_container import get_service_container
 import config
 
 app = FastAPI(title="AI Design Workflow API (Cloud Only)")
@@ -45,6 +55,8 @@ class StepRequest(BaseModel):
     model_name: str
     context: Optional[Dict[str, Any]] = {}
     settings: Optional[Dict[str, Any]] = {}
+    # 重新生成：不读步骤缓存与相似需求复用。默认复用缓存，前端“重新生成”时显式传 True
+    force_refresh: bool = False
 
 
 class AutocompleteRequest(BaseModel):
@@ -58,6 +70,99 @@ def health_check():
     return {"status": "ok", "storage": "supabase_only", "timestamp": time.time()}
 
 
+@app.get("/api/llm/router")
+def llm_router_state():
+    """各模型的 EWMA 延迟、错误率、熔断状态、结构化输出降级与调用合并统计"""
+    return {
+        "models": get_model_router().snapshot(),
+        "hedging": get_model_router().hedge_stats(),
+        "rate_limits": get_rate_limiter().stats(),
+        "structured_output": get_capabilities().snapshot(),
+        "singleflight": {
+            "sync": get_singleflight().stats(),
+            "async": get_async_singleflight().stats(),
+        },
+        "call_log": get_log_sink().stats(),
+    }
+
+
+@app.get("/api/usage")
+def llm_usage():
+    """本进程内的 LLM token 用量与费用，按 Agent 与模型汇总"""
+    return get_usage_tracker().summary()
+
+
+@app.get("/api/project/{project_name}/usage")
+def project_usage(project_name: str):
+    """项目已保存的累计 / 最近一次运行用量，以及本进程内尚未落库的实时统计"""
+    project = db_service.db_get_project(project_name)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    content = project.get("content")
+    stored = content.get("usage") if isinstance(content, dict) else None
+    return {
+        "project_name": project_name,
+        "stored": stored or {},
+        "live": get_usage_tracker().summary(project=project_name),
+    }
+
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """步骤输出缓存的命中/未命中计数与容量"""
+    cache = get_step_cache()
+    if not cache:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@app.get("/api/cache/analysis-index")
+def analysis_index_stats():
+    """跨项目市场分析复用索引的条目数与命中率"""
+    index = get_analysis_index()
+    if not index:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "mode": config.ANALYSIS_REUSE_MODE,
+        "threshold": config.ANALYSIS_REUSE_THRESHOLD,
+        **index.stats(),
+    }
+
+
+@app.get("/api/jimeng/pool")
+def jimeng_pool_stats():
+    """即梦 API / 图片 CDN 的 keep-alive 连接复用统计"""
+    from jimeng.core import pool_stats
+
+    return pool_stats()
+
+
+@app.get("/api/jimeng/poller")
+def jimeng_poller_stats():
+    """即梦生成结果集中轮询的批量大小、请求数与预计生成耗时"""
+    from jimeng.poller import poller_stats
+
+    return poller_stats()
+
+
+@app.get("/api/jimeng/credits")
+def jimeng_credit_stats():
+    """即梦积分缓存的命中率与各 token 的缓存余额"""
+    from jimeng.credits import get_credit_cache
+
+    return get_credit_cache().stats()
+
+
+@app.get("/api/jimeng/tokens")
+def jimeng_token_stats():
+    """即梦多账号 token 池：各账号的积分、在途数、失败率与隔离状态"""
+    from jimeng.token_pool import get_token_pool
+
+    pool = get_token_pool()
+    return pool.stats() if pool else {"size": 0, "available": 0, "inflight": 0, "tokens": {}}
+
+
 @app.get("/api/projects")
 def list_projects(limit: int = 50):
     return db_service.db_get_projects(limit=limit)
@@ -91,30 +196,34 @@ def get_project(project_name: str):
 
 
 @app.post("/api/ai/autocomplete")
-def ai_autocomplete(req: AutocompleteRequest):
-    llm = LLMService(
-        api_key=config_manager.openai_api_key, base_url=config_manager.openai_base_url
+async def ai_autocomplete(req: AutocompleteRequest):
+    llm = get_service_container().async_llm(
+        config_manager.openai_api_key, config_manager.openai_base_url
     )
     prompt_tpl = config_manager.get_prompt(
         "autocomplete", "请根据以下简要描述扩展为专业设计需求：\n{brief}"
     )
     prompt = prompt_tpl.format(brief=req.brief)
 
-    response = llm.chat_completion([{"role": "user", "content": prompt}])
+    response = await llm.chat_completion(
+        [{"role": "user", "content": prompt}], agent="autocomplete"
+    )
     return {"expanded_brief": response.strip()}
 
 
 @app.post("/api/ai/tags")
-def ai_tags(req: AutocompleteRequest):
-    llm = LLMService(
-        api_key=config_manager.openai_api_key, base_url=config_manager.openai_base_url
+async def ai_tags(req: AutocompleteRequest):
+    llm = get_service_container().async_llm(
+        config_manager.openai_api_key, config_manager.openai_base_url
     )
     prompt_tpl = config_manager.get_prompt(
         "tags", "请为以下需求提取3-5个标签（如 #简约 #科技）：\n{brief}"
     )
     prompt = prompt_tpl.format(brief=req.brief)
 
-    response = llm.chat_completion([{"role": "user", "content": prompt}])
+    response = await llm.chat_completion(
+        [{"role": "user", "content": prompt}], agent="tags"
+    )
     # Clean tags
     tags = [
         t.strip()
@@ -133,91 +242,149 @@ class RunAllRequest(BaseModel):
     model_name: str = config.DEFAULT_MODEL
     image_count: int = 4
     persona: str = ""
+    stream_images: bool = config.STREAM_DESIGN_IMAGES
+    # 重新生成：不读步骤缓存与相似需求复用（失败后重跑时保持 False 以复用已完成的步骤）
+    force_refresh: bool = False
+
+
+PIPELINE_STEPS = (
+    "market_analysis",
+    "visual_research",
+    "design_generation",
+    "image_generation",
+)
 
 
-def _run_all_background(task_id: str, req: RunAllRequest):
-    """后台执行完整工作流"""
+async def _run_all_background(
+    task_id: str, req: RunAllRequest, checkpoint: Optional[RunCheckpoint] = None
+):
+    """
+    后台执行完整工作流（在事件循环上运行，不占用线程池）。
+    每个节点完成后写入检查点；传入已有检查点时从中断处续跑。
+    """
+    if checkpoint is None:
+        checkpoint = RunCheckpoint.new(req.dict())
     try:
         start_time = time.time()
-        workflow = DesignWorkflow(
+        workflow = AsyncDesignWorkflow(
             project_name=req.project_name,
             custom_config={"DEFAULT_MODEL": req.model_name},
+            use_cache=not req.force_refresh,
         )
 
-        # Step 1: Market Analysis
-        db_service.db_update_project(
-            req.project_name, status="in_progress", current_step="market_analysis"
-        )
-        market_result, _ = workflow.step_market_analysis(req.brief)
-        db_service.save_project_content(
-            req.project_name, {"market_analysis": market_result}
-        )
-
-        # Step 2: Visual Research
-        db_service.db_update_project(req.project_name, current_step="visual_research")
-        visual_result, _ = workflow.step_visual_research(req.brief, market_result)
-        db_service.save_project_content(
-            req.project_name, {"visual_research": visual_result}
-        )
+        async def on_step(node_name: str):
+            # 插图节点与主流程并行，不单独展示为 current_step
+            # 只缓冲修改，随下一次步骤边界/定时 flush 一起写库
+            if node_name in PIPELINE_STEPS:
+                workflow.state.update(status="in_progress", current_step=node_name)
 
-        # Step 3: Design Generation
-        db_service.db_update_project(req.project_name, current_step="design_generation")
-        design_json_str, prompts = workflow.step_design_generation(
+        report = await workflow.run(
             req.brief,
-            market_result,
-            visual_result,
             image_count=req.image_count,
             persona=req.persona,
+            on_step=on_step,
+            stream=req.stream_images,
+            checkpoint=checkpoint,
         )
-        db_service.save_project_content(
-            req.project_name, {"design_proposals": design_json_str}
-        )
-
-        # Step 4: Image Generation
-        db_service.db_update_project(req.project_name, current_step="image_generation")
-        workflow.step_image_generation(prompts)
-
-        try:
-            design_data = json.loads(design_json_str)
-            design_data["prompts"] = prompts
-
-            updated_design_result = json.dumps(design_data, ensure_ascii=False)
-            db_service.save_project_content(
-                req.project_name, {"design_proposals": updated_design_result}
-            )
-        except Exception as e:
-            print(f"⚠️ 更新设计方案 JSON 失败: {e}")
-            updated_design_result = json.dumps({"prompts": prompts}, ensure_ascii=False)
-            db_service.save_project_content(
-                req.project_name, {"design_proposals": updated_design_result}
-            )
 
         # Mark as completed
-        db_service.db_update_project(
-            req.project_name, status="completed", current_step=""
-        )
+        workflow.state.update(status="completed", current_step="")
+        await workflow.state.flush()
 
         duration_ms = int((time.time() - start_time) * 1000)
         task_result = {
             "status": "success",
             "project_name": req.project_name,
             "duration_ms": duration_ms,
-            "steps_completed": [
-                "market_analysis",
-                "visual_research",
-                "design_generation",
-                "image_generation",
-            ],
+            "steps_completed": list(PIPELINE_STEPS),
+            "critical_path": report.critical_path,
+            "timings": report.to_dict(),
         }
         task_registry.complete(task_id, result=task_result, duration_ms=duration_ms)
         print(f"✅ 后台任务完成: {req.project_name}")
 
+    except asyncio.CancelledError:
+        # 关闭进程时被取消：项目保持 in_progress，检查点心跳过期后续跑
+        task_registry.fail(task_id, "cancelled")
+        raise
     except Exception as e:
         print(f"❌ 后台任务失败: {e}")
-        db_service.db_update_project(req.project_name, status="failed")
+        await db_service.db_update_project_async(req.project_name, status="failed")
         task_registry.fail(task_id, str(e))
 
 
+# 续跑任务的句柄（事件循环只持有弱引用，不保存会被回收）
+_resumed_runs: Set[asyncio.Task] = set()
+
+
+async def resume_interrupted_runs():
+    """
+    扫描心跳已过期的 run_all 检查点（持有进程崩溃或重新部署），认领后从中断处续跑。
+    认领是一次条件更新：只有 owner/heartbeat 仍是扫描时的值才写入本进程 owner，
+    多个 worker 同时扫描时恰好一个认领成功。
+    """
+    projects = await db_service.db_get_projects_by_status_async("in_progress")
+    resumed = 0
+    for project_name, checkpoint in find_resumable(projects, config.RUN_STALE_SECONDS):
+        expected = checkpoint.lease()
+        checkpoint.touch()
+        if not await db_service.claim_run_async(project_name, expected, checkpoint.state):
+            continue
+
+        req = RunAllRequest(**checkpoint.request)
+        dedup_key = compute_dedup_key("run_all", req.dict())
+        entry, created = task_registry.get_or_create("run_all", dedup_key)
+        if not created:
+            continue
+        print(f"♻️ 续跑中断的工作流: {project_name} (run {checkpoint.run_id})")
+        task = asyncio.create_task(_run_all_background(entry.task_id, req, checkpoint))
+        _resumed_runs.add(task)
+        task.add_done_callback(_resumed_runs.discard)
+        resumed += 1
+    return resumed
+
+
+async def _run_reaper():
+    while True:
+        try:
+            await resume_interrupted_runs()
+        except Exception as e:
+            logger.error(f"续跑扫描失败: {e}")
+        await asyncio.sleep(config.RUN_REAPER_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_run_reaper():
+    if config.ENV != "test":
+        asyncio.create_task(_run_reaper())
+
+
+async def backfill_analysis_index():
+    """启动时把已完成项目的市场分析写入相似度索引，复用不必在每次部署后从零开始"""
+    index = get_analysis_index()
+    if not index:
+        return 0
+    projects = await db_service.db_get_projects_by_status_async(
+        "completed", limit=config.ANALYSIS_INDEX_MAX_ENTRIES
+    )
+    items = [item for item in map(indexable_analysis, projects) if item]
+    added = await asyncio.to_thread(index.backfill, items)
+    if added:
+        print(f"🔁 市场分析索引回填 {added} 个历史项目")
+    return added
+
+
+@app.on_event("startup")
+async def start_analysis_backfill():
+    if config.ENV != "test":
+        asyncio.create_task(backfill_analysis_index())
+
+
+@app.on_event("shutdown")
+def flush_call_log():
+    get_log_sink().close()
+
+
 @app.post("/api/workflow/run_all")
 def run_all_workflow(req: RunAllRequest, background_tasks: BackgroundTasks):
     """一键执行完整设计工作流（异步后台模式）"""
@@ -257,35 +424,38 @@ def run_all_workflow(req: RunAllRequest, background_tasks: BackgroundTasks):
 
 
 @app.post("/api/workflow/step")
-def run_step(req: StepRequest):
+async def run_step(req: StepRequest):
     # 任务去重逻辑保持不变
     dedup_key = compute_dedup_key(f"step:{req.step}", req.model_dump())
     entry, created = task_registry.get_or_create(f"step:{req.step}", dedup_key)
 
     if not created:
-        waited = task_registry.wait(entry.task_id, timeout_s=600)
+        # TaskRegistry.wait 基于 threading.Event，放到线程中等待以免阻塞事件循环
+        waited = await asyncio.to_thread(task_registry.wait, entry.task_id, 600)
         return waited.result if waited else {"status": "timeout"}
 
     try:
         start_time = time.time()
-        workflow = DesignWorkflow(project_name=req.project_name)
+        workflow = AsyncDesignWorkflow(
+            project_name=req.project_name, use_cache=not req.force_refresh
+        )
 
         result = ""
         prompts = []
 
         # 更新项目状态
-        db_service.db_update_project(
+        await db_service.db_update_project_async(
             req.project_name, status="in_progress", current_step=req.step
         )
 
         if req.step == "market_analysis":
-            result, _ = workflow.step_market_analysis(req.brief)
+            result, _, _ = await workflow.step_market_analysis(req.brief)
         elif req.step == "visual_research":
-            result, _ = workflow.step_visual_research(
+            result, _, _ = await workflow.step_visual_research(
                 req.brief, req.context.get("market_analysis", "")
             )
         elif req.step == "design_generation":
-            result, prompts = workflow.step_design_generation(
+            result, prompts = await workflow.step_design_generation(
                 req.brief,
                 req.context.get("market_analysis", ""),
                 req.context.get("visual_research", ""),
@@ -293,7 +463,7 @@ def run_step(req: StepRequest):
                 persona=req.settings.get("persona", ""),
             )
         elif req.step == "image_generation":
-            workflow.step_image_generation(req.context.get("design_prompts", []))
+            await workflow.step_image_generation(req.context.get("design_prompts", []))
             result = "Images generated"
 
         duration_ms = int((time.time() - start_time) * 1000)
@@ -309,7 +479,7 @@ def run_step(req: StepRequest):
 
         return task_result
     except Exception as e:
-        db_service.db_update_project(req.project_name, status="failed")
+        await db_service.db_update_project_async(req.project_name, status="failed")
         task_registry.fail(entry.task_id, str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
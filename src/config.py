@@ -48,6 +48,62 @@ MODEL_PRIORITY_LIST = [
 # 默认模型（取列表第一个）
 DEFAULT_MODEL = MODEL_PRIORITY_LIST[0]
 
+# 模型健康路由：EWMA 平滑系数、连续失败多少次熔断、熔断冷却时间（秒）
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "2"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "60"))
+
+# LLM 对冲请求（默认关闭）：主模型超过其延迟分位数仍未返回时并发请求下一个健康模型
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "15"))
+
+# 流式输出卡顿阈值（秒）：超过该时间没有新内容视为中断，切换模型续写
+LLM_STREAM_STALL_SECONDS = float(os.getenv("LLM_STREAM_STALL_SECONDS", "20"))
+
+# 结构化输出：按 Agent schema 发送 response_format（json_schema），模型不支持时自动降级为提示词约束
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "1") != "0"
+
+# 合并进行中的相同 LLM 调用（模型 + 规范化消息），重复提交只发起一次请求
+LLM_SINGLEFLIGHT_ENABLED = os.getenv("LLM_SINGLEFLIGHT_ENABLED", "1") != "0"
+
+# LLM 调用日志路径（默认 logs/llm_calls.jsonl，测试与压测可指向临时目录）
+LLM_LOG_PATH = os.getenv(
+    "LLM_LOG_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "logs",
+        "llm_calls.jsonl",
+    ),
+)
+# LLM 调用日志后台批量写入：队列上限、批大小、空闲 flush 间隔与轮转策略
+LLM_LOG_QUEUE_SIZE = int(os.getenv("LLM_LOG_QUEUE_SIZE", "10000"))
+LLM_LOG_BATCH_SIZE = int(os.getenv("LLM_LOG_BATCH_SIZE", "200"))
+LLM_LOG_FLUSH_SECONDS = float(os.getenv("LLM_LOG_FLUSH_SECONDS", "1"))
+LLM_LOG_MAX_MB = float(os.getenv("LLM_LOG_MAX_MB", "50"))
+LLM_LOG_ROTATE_HOURS = float(os.getenv("LLM_LOG_ROTATE_HOURS", "24"))
+LLM_LOG_BACKUPS = int(os.getenv("LLM_LOG_BACKUPS", "10"))
+
+# 各模型单价（美元 / 百万 token），用于估算调用费用；未配置的模型只统计 token
+# 示例: {"gemini-2.5-flash": {"prompt": 0.3, "completion": 2.5, "cached": 0.075}}
+LLM_PRICING = os.getenv("LLM_PRICING", "{}")
+
+# LLM 令牌桶限流（按 provider + 模型）；backend=sqlite 时同机多个 worker 共享限流状态
+# 默认 0 不主动限流（只在 429 后按 Retry-After 冷却）；按所用账号的实际配额设置后启用
+LLM_RATE_LIMIT_PER_MINUTE = float(os.getenv("LLM_RATE_LIMIT_PER_MINUTE", "0"))
+LLM_RATE_LIMIT_BURST = float(os.getenv("LLM_RATE_LIMIT_BURST", "10"))
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv("LLM_RATE_LIMIT_MAX_WAIT", "30"))
+LLM_RATE_LIMIT_BACKEND = os.getenv("LLM_RATE_LIMIT_BACKEND", "memory")
+LLM_RATE_LIMIT_PATH = os.getenv(
+    "LLM_RATE_LIMIT_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "cache",
+        "rate_limits.sqlite3",
+    ),
+)
+
 # 输出目录
 OUTPUT_DIR = "output"
 
@@ -67,12 +123,65 @@ else:
 # Supabase 数据库配置
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# 未配置 Supabase 时使用的本地 SQLite 项目库（离线开发）；留空则不保存项目
+LOCAL_DB_PATH = os.getenv(
+    "LOCAL_DB_PATH",
+    ""
+    if ENV == "test"
+    else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "cache",
+        "projects.sqlite3",
+    ),
+)
 if not SUPABASE_URL:
-    print("⚠️ 警告: SUPABASE_URL 未设置，数据库功能将不可用")
+    if LOCAL_DB_PATH:
+        print(f"⚠️ 警告: SUPABASE_URL 未设置，项目数据保存到本地 SQLite: {LOCAL_DB_PATH}")
+    else:
+        print("⚠️ 警告: SUPABASE_URL 未设置，数据库功能将不可用")
 
 # 安全配置
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 MAX_CONCURRENT_IMAGES = int(os.getenv("MAX_CONCURRENT_IMAGES", "3"))
+# 步骤输出持久化缓存（相同 prompt + 模型 + 解析器版本直接复用，不再调用 LLM）
+STEP_CACHE_ENABLED = os.getenv("STEP_CACHE_ENABLED", "0" if ENV == "test" else "1") != "0"
+STEP_CACHE_PATH = os.getenv(
+    "STEP_CACHE_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "cache",
+        "step_cache.sqlite3",
+    ),
+)
+STEP_CACHE_MAX_ENTRIES = int(os.getenv("STEP_CACHE_MAX_ENTRIES", "2000"))
+STEP_CACHE_MAX_MB = int(os.getenv("STEP_CACHE_MAX_MB", "200"))
+STEP_CACHE_TTL_HOURS = float(os.getenv("STEP_CACHE_TTL_HOURS", "168"))
+
+# 跨项目复用相似需求的市场分析：off 关闭；reuse 直接复用；seed 作为参考提供给 Market Analyst
+ANALYSIS_REUSE_MODE = os.getenv("ANALYSIS_REUSE_MODE", "off").lower()
+# 需求文本的 n-gram 余弦相似度达到该阈值才视为命中
+# 实测：只差编号的需求（"咖啡机概念设计2" / "3"）≈0.86，长需求只差编号 ≈0.95；
+# 换了产品但其余描述相同（咖啡机 → 空气净化器、蓝牙耳机 → 蓝牙音箱）≈0.75~0.76
+ANALYSIS_REUSE_THRESHOLD = float(os.getenv("ANALYSIS_REUSE_THRESHOLD", "0.8"))
+ANALYSIS_INDEX_PATH = os.getenv(
+    "ANALYSIS_INDEX_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "cache",
+        "analysis_index.sqlite3",
+    ),
+)
+ANALYSIS_INDEX_MAX_ENTRIES = int(os.getenv("ANALYSIS_INDEX_MAX_ENTRIES", "5000"))
+
+# 设计方案流式输出时边解析边出图（0 关闭，回退为整段响应后再出图）
+STREAM_DESIGN_IMAGES = os.getenv("STREAM_DESIGN_IMAGES", "1") != "0"
+
+# run_all 检查点：心跳间隔、判定持有进程已退出的超时、启动后扫描可续跑任务的间隔（秒）
+RUN_HEARTBEAT_SECONDS = float(os.getenv("RUN_HEARTBEAT_SECONDS", "30"))
+RUN_STALE_SECONDS = float(os.getenv("RUN_STALE_SECONDS", "180"))
+RUN_REAPER_INTERVAL = float(os.getenv("RUN_REAPER_INTERVAL", "60"))
+# 运行中项目状态的定时写库间隔（秒），步骤边界总会立即写库
+STATE_FLUSH_SECONDS = float(os.getenv("STATE_FLUSH_SECONDS", "2"))
 API_RATE_LIMIT = os.getenv("API_RATE_LIMIT", "100/minute")
 
 # 开发环境兜底配置（仅本地调试用）
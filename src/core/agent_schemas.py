@@ -0,0 +1,164 @@
+import copy
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 模型不支持 json_schema 时追加到提示词末尾的 JSON 约束（原 DesignWorkflow._get_prompt 中的指令）
+JSON_OUTPUT_INSTRUCTION = (
+    "\n\nCRITICAL INSTRUCTION:\n"
+    "1. You are a specialized design assistant API. You MUST output ONLY valid raw JSON.\n"
+    "2. DO NOT include any conversational text, explanations, or 'Sure, I can help with that' style messages.\n"
+    "3. DO NOT wrap the output in markdown code blocks like ```json.\n"
+    "4. Start your response with '{' and end with '}'.\n"
+    "5. Strictly follow the JSON schema defined in your task instructions."
+)
+
+_VISUAL_ITEM = {
+    "type": "object",
+    "properties": {
+        "concept": {"type": "string"},
+        "prompt": {"type": "string"},
+    },
+    "required": ["concept", "prompt"],
+    "additionalProperties": False,
+}
+
+_REPORT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "content": {"type": "string"},
+        "visuals": {"type": "array", "items": _VISUAL_ITEM},
+    },
+    "required": ["summary", "content", "visuals"],
+    "additionalProperties": False,
+}
+
+# 与 CONFIG.md 中各 Agent 提示词约定的字段保持一致
+AGENT_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "market_analyst": _REPORT_SCHEMA,
+    "visual_researcher": _REPORT_SCHEMA,
+    "product_designer": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string"},
+            "prompts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "scheme": {"type": "string"},
+                        "inspiration": {"type": "string"},
+                        "description": {"type": "string"},
+                        "prompt": {"type": "string"},
+                    },
+                    "required": ["scheme", "inspiration", "description", "prompt"],
+                    "additionalProperties": False,
+                },
+            },
+        },
+        "required": ["summary", "prompts"],
+        "additionalProperties": False,
+    },
+}
+
+
+def response_format_for(agent: str) -> Optional[Dict[str, Any]]:
+    """Agent 对应的 response_format（json_schema 严格模式）；没有 schema 的 Agent 返回 None"""
+    schema = AGENT_SCHEMAS.get(agent)
+    if schema is None:
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": agent, "schema": copy.deepcopy(schema), "strict": True},
+    }
+
+
+# 结构化输出能力等级：依次降级
+JSON_SCHEMA = "json_schema"
+JSON_OBJECT = "json_object"
+PROMPT_ONLY = "prompt"
+_LEVELS = (JSON_SCHEMA, JSON_OBJECT, PROMPT_ONLY)
+
+
+class StructuredOutputCapabilities:
+    """
+    按 (base_url, model) 缓存的结构化输出能力。
+    默认先尝试 json_schema；模型拒绝 response_format 时降级一档并记住，
+    同一进程内后续调用不再重复试错。
+    """
+
+    def __init__(self):
+        self._levels: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def level(self, base_url: str, model: str) -> str:
+        return self._levels.get((base_url, model), JSON_SCHEMA)
+
+    def downgrade(self, base_url: str, model: str) -> str:
+        with self._lock:
+            current = self.level(base_url, model)
+            index = min(_LEVELS.index(current) + 1, len(_LEVELS) - 1)
+            self._levels[(base_url, model)] = _LEVELS[index]
+        logger.warning(f"模型 {model} 不支持 {current} 输出，降级为 {_LEVELS[index]}")
+        return _LEVELS[index]
+
+    def apply(
+        self,
+        base_url: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        response_format: Optional[Dict[str, Any]],
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict[str, Any]]]:
+        """
+        按模型能力返回实际发送的 (messages, response_format)：
+        json_schema 原样发送；低于 json_schema 时都把 JSON 约束写回提示词——
+        json_object 模式要求消息中出现 "JSON" 字样，否则接口直接拒绝请求；
+        都不支持时只靠提示词约束
+        """
+        if response_format is None:
+            return messages, None
+        level = self.level(base_url, model)
+        if level == JSON_SCHEMA:
+            return messages, response_format
+        if level == JSON_OBJECT:
+            return _append_instruction(messages), {"type": "json_object"}
+        return _append_instruction(messages), None
+
+    def snapshot(self) -> Dict[str, str]:
+        with self._lock:
+            return {f"{url}|{model}": level for (url, model), level in self._levels.items()}
+
+
+def _append_instruction(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    messages = [dict(m) for m in messages]
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            message["content"] = message.get("content", "") + JSON_OUTPUT_INSTRUCTION
+            break
+    return messages
+
+
+def is_response_format_error(error: Exception) -> bool:
+    """模型/代理拒绝 response_format 参数时的错误"""
+    text = str(error).lower()
+    return any(
+        key in text
+        for key in ("response_format", "json_schema", "json_object", "structured output")
+    )
+
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+
+
+def get_capabilities() -> StructuredOutputCapabilities:
+    """进程内共享的结构化输出能力缓存"""
+    global _capabilities
+    if _capabilities is None:
+        with _capabilities_lock:
+            if _capabilities is None:
+                _capabilities = StructuredOutputCapabilities()
+    return _capabilities
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"\s+")
+
+
+def ngram_vector(text: str, dim: int = 4096, ngram_range=(1, 3)) -> np.ndarray:
+    """
+    字符 n-gram 哈希向量（L2 归一化）：中文需求不分词也能比较，
+    "咖啡机概念设计2" 与 "咖啡机概念设计3" 只差末尾几个 n-gram。
+    """
+    text = _SPACES.sub(" ", (text or "").lower()).strip()
+    indices = [
+        zlib.crc32(text[i : i + n].encode("utf-8")) % dim
+        for n in range(ngram_range[0], ngram_range[1] + 1)
+        for i in range(len(text) - n + 1)
+    ]
+    vector = np.bincount(np.asarray(indices, dtype=np.int64), minlength=dim).astype(
+        np.float32
+    )
+    # 次线性词频，避免长需求里重复出现的字主导相似度
+    np.log1p(vector, out=vector)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class AnalysisIndex:
+    """
+    历史需求 → 市场分析结果 的本地相似度索引。
+    - 需求文本转为字符 n-gram 向量，查询为一次矩阵乘法（余弦相似度）
+    - 条目持久化在 SQLite 中，启动时重新计算向量；超过 max_entries 时淘汰最早的条目
+    - lookup() 统计命中率（相似度达到阈值即算命中）
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, dim: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self.dim = dim
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._keys: List[str] = []
+        self._briefs: List[str] = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_index (
+                key TEXT PRIMARY KEY,
+                brief TEXT NOT NULL,
+                analysis TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT key, brief FROM analysis_index ORDER BY created_at ASC"
+        ).fetchall()
+        self._keys = [key for key, _ in rows]
+        self._briefs = [brief for _, brief in rows]
+        if rows:
+            self._matrix = np.vstack([ngram_vector(b, self.dim) for b in self._briefs])
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key: str, brief: str, analysis: Dict[str, Any]):
+        """写入（或覆盖）一个项目的需求与市场分析结果"""
+        vector = ngram_vector(brief, self.dim)
+        payload = json.dumps(analysis, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_index (key, brief, analysis, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, brief, payload, time.time()),
+            )
+            if key in self._keys:
+                i = self._keys.index(key)
+                del self._keys[i], self._briefs[i]
+                self._matrix = np.delete(self._matrix, i, axis=0)
+            self._keys.append(key)
+            self._briefs.append(brief)
+            self._matrix = np.vstack([self._matrix, vector[None, :]])
+            self._evict()
+            self._conn.commit()
+
+    def backfill(self, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        批量写入尚未索引的 (key, brief, analysis)，已有的 key 保持不变（不覆盖更新的结果）。
+        用于启动时从已完成的项目回填，只做一次矩阵拼接。返回新增条数。
+        """
+        with self._lock:
+            existing = set(self._keys)
+            fresh = []
+            for key, brief, analysis in items:
+                if key in existing or not brief:
+                    continue
+                existing.add(key)
+                fresh.append((key, brief, analysis))
+            if not fresh:
+                return 0
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO analysis_index (key, brief, analysis, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    # created_at=0：重启后按写入时间加载时仍排在最前
+                    (key, brief, json.dumps(analysis, ensure_ascii=False), 0.0)
+                    for key, brief, analysis in fresh
+                ],
+            )
+            # 回填的是历史项目：放在最前面，淘汰时先于本次进程写入的条目
+            self._keys = [key for key, _, _ in fresh] + self._keys
+            self._briefs = [brief for _, brief, _ in fresh] + self._briefs
+            vectors = np.vstack([ngram_vector(brief, self.dim) for _, brief, _ in fresh])
+            self._matrix = np.vstack([vectors, self._matrix])
+            self._evict()
+            self._conn.commit()
+        return len(fresh)
+
+    def _evict(self):
+        """按写入顺序淘汰最早的条目（调用方持有锁）"""
+        overflow = len(self._keys) - self.max_entries
+        if overflow <= 0:
+            return
+        stale = self._keys[:overflow]
+        self._conn.executemany(
+            "DELETE FROM analysis_index WHERE key = ?", [(k,) for k in stale]
+        )
+        self._keys = self._keys[overflow:]
+        self._briefs = self._briefs[overflow:]
+        self._matrix = self._matrix[overflow:]
+
+    def search(
+        self, brief: str, top_k: int = 5, exclude: str = None
+    ) -> List[Tuple[str, str, float]]:
+        """返回相似度最高的 (key, brief, score) 列表（不计入命中率）"""
+        vector = ngram_vector(brief, self.dim)
+        with self._lock:
+            if not self._keys:
+                return []
+            scores = self._matrix @ vector
+            keys, briefs = list(self._keys), list(self._briefs)
+        if exclude in keys:
+            scores[keys.index(exclude)] = -1.0
+        order = np.argsort(-scores)[:top_k]
+        return [(keys[i], briefs[i], float(scores[i])) for i in order if scores[i] >= 0]
+
+    def lookup(
+        self, brief: str, threshold: float, exclude: str = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查找相似度不低于 threshold 的最相似历史分析，
+        返回 {"key", "brief", "score", "analysis"}，未命中返回 None
+        """
+        best = self.search(brief, top_k=1, exclude=exclude)
+        match = best[0] if best and best[0][2] >= threshold else None
+        with self._lock:
+            self.lookups += 1
+            if match is None:
+                return None
+            row = self._conn.execute(
+                "SELECT analysis FROM analysis_index WHERE key = ?", (match[0],)
+            ).fetchone()
+            if row is None:
+                return None
+            self.hits += 1
+        return {
+            "key": match[0],
+            "brief": match[1],
+            "score": round(match[2], 4),
+            "analysis": json.loads(row[0]),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._keys),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "max_entries": self.max_entries,
+        }
+
+
+_analysis_index = None
+_analysis_index_lock = threading.Lock()
+
+
+def get_analysis_index() -> Optional[AnalysisIndex]:
+    """进程内共享的市场分析相似度索引；ANALYSIS_REUSE_MODE=off 或初始化失败时返回 None"""
+    global _analysis_index
+    if _analysis_index is None:
+        with _analysis_index_lock:
+            if _analysis_index is None:
+                if config.ANALYSIS_REUSE_MODE not in ("reuse", "seed"):
+                    _analysis_index = False
+                else:
+                    try:
+                        _analysis_index = AnalysisIndex(
+                            config.ANALYSIS_INDEX_PATH,
+                            max_entries=config.ANALYSIS_INDEX_MAX_ENTRIES,
+                        )
+                    except Exception as e:
+                        logger.error(f"市场分析相似度索引初始化失败: {e}")
+                        _analysis_index = False
+    return _analysis_index if _analysis_index else None
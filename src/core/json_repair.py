@@ -0,0 +1,492 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+class JsonRepairError(ValueError):
+    """输入中找不到可恢复的 JSON 对象/数组"""
+
+
+# 字符串内无需处理的连续字符（遇到引号、反斜杠、控制字符时停下）
+_PLAIN = re.compile(r'[^"\\\x00-\x1f]+')
+_PLAIN_SMART = re.compile(r'[^"\\\x00-\x1f“”]+')
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"[-+0-9.eE]+")
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_ROOT_START = re.compile(r"[{\[]")
+
+_VALID_ESCAPES = set('"\\/bfnrt')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_LITERALS = {
+    "true": "true",
+    "false": "false",
+    "null": "null",
+    "True": "true",
+    "False": "false",
+    "None": "null",
+    "NaN": "null",
+    "Infinity": "null",
+}
+_SMART_QUOTES = "“”"
+# 字符串结束引号之后可能出现的结构字符
+_AFTER_STRING = set(",:}]")
+
+# 修复类型（RepairResult.repairs 的键）
+STRIPPED_PREFIX = "stripped_prefix"
+STRIPPED_SUFFIX = "stripped_suffix"
+TRAILING_COMMA = "trailing_comma"
+REMOVED_COMMA = "removed_comma"
+INSERTED_COMMA = "inserted_comma"
+INSERTED_COLON = "inserted_colon"
+ESCAPED_CONTROL_CHARS = "escaped_control_chars"
+ESCAPED_INNER_QUOTE = "escaped_inner_quote"
+INVALID_ESCAPE = "invalid_escape"
+SMART_QUOTES = "smart_quotes"
+PYTHON_LITERAL = "python_literal"
+QUOTED_WORD = "quoted_word"
+INVALID_NUMBER = "invalid_number"
+REMOVED_COMMENT = "removed_comment"
+MISMATCHED_BRACKET = "mismatched_bracket"
+SKIPPED_GARBAGE = "skipped_garbage"
+CLOSED_STRING = "closed_string"
+CLOSED_BRACKETS = "closed_brackets"
+DROPPED_INCOMPLETE_MEMBER = "dropped_incomplete_member"
+
+# 说明原文被截断的修复：补出来的是半个回答，不能当作成功结果缓存或采用
+TRUNCATION_REPAIRS = frozenset({CLOSED_STRING, CLOSED_BRACKETS, DROPPED_INCOMPLETE_MEMBER})
+
+
+@dataclass
+class RepairResult:
+    """解析结果与应用过的修复（修复类型 -> 次数）"""
+
+    value: Any
+    repairs: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.repairs)
+
+    @property
+    def truncated(self) -> bool:
+        return any(kind in TRUNCATION_REPAIRS for kind in self.repairs)
+
+
+class _Frame:
+    __slots__ = ("kind", "expect", "member_start", "pending_comma")
+
+    def __init__(self, kind: str):
+        self.kind = kind  # "{" or "["
+        # 对象: key / colon / value / comma；数组: value / comma
+        self.expect = "key" if kind == "{" else "value"
+        # 当前成员在输出中的起点（截断时回滚到这里丢弃不完整的成员）
+        self.member_start = 0
+        # 已读到但尚未输出的逗号（后面紧跟闭合括号时即为多余的尾逗号）
+        self.pending_comma = False
+
+    def copy(self) -> "_Frame":
+        frame = _Frame(self.kind)
+        frame.expect = self.expect
+        frame.member_start = self.member_start
+        frame.pending_comma = self.pending_comma
+        return frame
+
+
+class JsonRepairParser:
+    """
+    容错的增量 JSON 解析器：逐块 feed() LLM 输出，边读边把它改写成合法 JSON，
+    finish() 时补齐截断的字符串与括号并返回解析结果。
+
+    能恢复的常见问题：
+    - 尾逗号、重复逗号、元素之间缺逗号、键值之间缺冒号
+    - 被截断的响应（补齐字符串与括号，丢弃不完整的最后一个成员）
+    - 字符串中未转义的换行/控制字符、未转义的内部引号（如中文里的 "引用"）
+    - 中文弯引号 “” 作为字符串定界符、Python 的 True/False/None、注释
+    - JSON 前后的说明文字与 ```json 代码块围栏
+
+    单次线性扫描，字符串内容按正则整段拷贝；分块方式不影响结果。
+    """
+
+    def __init__(self):
+        self.repairs: Dict[str, int] = {}
+        self._pending = ""
+        self._out: List[str] = []
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._string_role = "value"
+        self._string_smart = False
+        self._suffix_noted = False
+
+    # ---- 公共接口 ----
+
+    @property
+    def done(self) -> bool:
+        """根对象/数组是否已闭合"""
+        return self._done
+
+    def feed(self, chunk: str):
+        """喂入一段文本（可在任意位置切分）"""
+        if chunk:
+            self._pending += chunk
+            self._consume(final=False)
+
+    def finish(self) -> RepairResult:
+        """结束输入：补齐截断的结构并解析"""
+        self._consume(final=True)
+        self._close_all()
+        if not self._started:
+            raise JsonRepairError("no JSON object or array found")
+        text = "".join(self._out)
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise JsonRepairError(f"unrecoverable JSON: {e}") from e
+        return RepairResult(value, dict(self.repairs))
+
+    def peek(self) -> Optional[RepairResult]:
+        """
+        不结束输入，返回当前已收到部分补齐后的解析结果（流式预览用）。
+        每次调用会复制一遍已输出内容，O(n)。
+        """
+        if not self._started:
+            return None
+        try:
+            return self._clone().finish()
+        except JsonRepairError:
+            return None
+
+    # ---- 内部实现 ----
+
+    def _note(self, repair: str):
+        self.repairs[repair] = self.repairs.get(repair, 0) + 1
+
+    def _clone(self) -> "JsonRepairParser":
+        other = JsonRepairParser()
+        other.repairs = dict(self.repairs)
+        other._pending = self._pending
+        other._out = list(self._out)
+        other._stack = [frame.copy() for frame in self._stack]
+        other._started = self._started
+        other._done = self._done
+        other._in_string = self._in_string
+        other._string_role = self._string_role
+        other._string_smart = self._string_smart
+        other._suffix_noted = self._suffix_noted
+        return other
+
+    def _consume(self, final: bool):
+        s = self._pending
+        n = len(s)
+        i = 0
+        while i < n:
+            if self._done:
+                if not self._suffix_noted and s[i:].strip():
+                    self._note(STRIPPED_SUFFIX)
+                    self._suffix_noted = True
+                i = n
+                break
+            if self._in_string:
+                j = self._string_step(s, i, final)
+            elif not self._started:
+                j = self._find_root(s, i)
+            else:
+                j = self._structure_step(s, i, final)
+            if j is None:
+                # 需要更多输入才能判断（如字符串末尾的引号、被切开的数字）
+                break
+            i = j
+        self._pending = s[i:]
+
+    def _find_root(self, s: str, i: int) -> int:
+        match = _ROOT_START.search(s, i)
+        end = match.start() if match else len(s)
+        if s[i:end].strip():
+            if STRIPPED_PREFIX not in self.repairs:
+                self._note(STRIPPED_PREFIX)
+        if match is None:
+            return len(s)
+        self._started = True
+        self._open(s[end])
+        return end + 1
+
+    def _open(self, kind: str):
+        self._out.append(kind)
+        self._stack.append(_Frame(kind))
+
+    def _close(self, kind: str):
+        frame = self._stack.pop()
+        if frame.pending_comma:
+            self._note(TRAILING_COMMA)
+        if frame.kind == "{" and frame.expect in ("colon", "value"):
+            self._rollback(frame)
+        self._out.append("}" if frame.kind == "{" else "]")
+        if not self._stack:
+            self._done = True
+
+    def _rollback(self, frame: _Frame):
+        """丢弃对象中只有键没有值的最后一个成员"""
+        del self._out[frame.member_start :]
+        frame.expect = "comma"
+        self._note(DROPPED_INCOMPLETE_MEMBER)
+
+    def _begin_member(self, frame: _Frame):
+        frame.member_start = len(self._out)
+        if frame.pending_comma:
+            self._out.append(",")
+            frame.pending_comma = False
+        elif frame.expect == "comma":
+            self._out.append(",")
+            self._note(INSERTED_COMMA)
+
+    def _begin_value(self) -> bool:
+        """准备输出一个值；当前位置不允许出现值时返回 False"""
+        frame = self._stack[-1]
+        if frame.kind == "[":
+            self._begin_member(frame)
+        elif frame.expect == "colon":
+            self._out.append(":")
+            self._note(INSERTED_COLON)
+        elif frame.expect != "value":
+            return False
+        frame.expect = "comma"
+        return True
+
+    def _begin_string(self, smart: bool):
+        frame = self._stack[-1]
+        if frame.kind == "{" and frame.expect in ("key", "comma"):
+            self._begin_member(frame)
+            frame.expect = "colon"
+            self._string_role = "key"
+        else:
+            self._begin_value()
+            self._string_role = "value"
+        self._out.append('"')
+        self._in_string = True
+        self._string_smart = smart
+        if smart:
+            self._note(SMART_QUOTES)
+
+    def _structure_step(self, s: str, i: int, final: bool) -> Optional[int]:
+        ch = s[i]
+        if ch in " \t\r\n":
+            match = _WHITESPACE.match(s, i)
+            return match.end()
+        frame = self._stack[-1]
+
+        if ch == '"' or ch in _SMART_QUOTES:
+            self._begin_string(smart=ch != '"')
+            return i + 1
+        if ch in "{[":
+            if self._begin_value():
+                self._open(ch)
+            else:
+                self._note(SKIPPED_GARBAGE)
+            return i + 1
+        if ch in "}]":
+            if not any(f.kind == ("{" if ch == "}" else "[") for f in self._stack):
+                self._note(SKIPPED_GARBAGE)
+                return i + 1
+            while self._stack[-1].kind != ("{" if ch == "}" else "["):
+                self._note(MISMATCHED_BRACKET)
+                self._close(self._stack[-1].kind)
+            self._close(ch)
+            return i + 1
+        if ch == ",":
+            if frame.expect == "comma":
+                frame.pending_comma = True
+                frame.expect = "key" if frame.kind == "{" else "value"
+            else:
+                self._note(REMOVED_COMMA)
+            return i + 1
+        if ch == ":":
+            if frame.kind == "{" and frame.expect == "colon":
+                self._out.append(":")
+                frame.expect = "value"
+            else:
+                self._note(SKIPPED_GARBAGE)
+            return i + 1
+        if ch == "/":
+            return self._skip_comment(s, i, final)
+        if ch in "-+" or ch.isdigit():
+            return self._number(s, i, final)
+        if ch.isalpha() or ch == "_":
+            return self._word(s, i, final)
+
+        self._note(SKIPPED_GARBAGE)
+        return i + 1
+
+    def _skip_comment(self, s: str, i: int, final: bool) -> Optional[int]:
+        if i + 1 >= len(s):
+            if not final:
+                return None
+            self._note(SKIPPED_GARBAGE)
+            return i + 1
+        if s[i + 1] == "/":
+            end = s.find("\n", i)
+        elif s[i + 1] == "*":
+            end = s.find("*/", i + 2)
+            end = end + 2 if end != -1 else -1
+        else:
+            self._note(SKIPPED_GARBAGE)
+            return i + 1
+        if end == -1:
+            if not final:
+                return None
+            end = len(s)
+        self._note(REMOVED_COMMENT)
+        return end
+
+    def _number(self, s: str, i: int, final: bool) -> Optional[int]:
+        match = _NUMBER.match(s, i)
+        end = match.end()
+        if end == len(s) and not final:
+            return None
+        token = match.group()
+        if not self._begin_value():
+            self._note(SKIPPED_GARBAGE)
+            return end
+        try:
+            json.loads(token)
+            self._out.append(token)
+        except ValueError:
+            try:
+                number = float(token)
+                text = str(int(number)) if number.is_integer() else repr(number)
+            except ValueError:
+                text = "null"
+            self._out.append(text)
+            self._note(INVALID_NUMBER)
+        return end
+
+    def _word(self, s: str, i: int, final: bool) -> Optional[int]:
+        match = _WORD.match(s, i)
+        end = match.end()
+        if end == len(s) and not final:
+            return None
+        word = match.group()
+        frame = self._stack[-1]
+        if word in _LITERALS and not (frame.kind == "{" and frame.expect == "key"):
+            if not self._begin_value():
+                self._note(SKIPPED_GARBAGE)
+                return end
+            if _LITERALS[word] != word:
+                self._note(PYTHON_LITERAL)
+            self._out.append(_LITERALS[word])
+            return end
+        # 未加引号的键或单词值：补上引号
+        if frame.kind == "{" and frame.expect in ("key", "comma"):
+            self._begin_member(frame)
+            frame.expect = "colon"
+        elif not self._begin_value():
+            self._note(SKIPPED_GARBAGE)
+            return end
+        self._out.append(json.dumps(word))
+        self._note(QUOTED_WORD)
+        return end
+
+    def _string_step(self, s: str, i: int, final: bool) -> Optional[int]:
+        match = (_PLAIN_SMART if self._string_smart else _PLAIN).match(s, i)
+        if match:
+            self._out.append(match.group())
+            return match.end()
+
+        ch = s[i]
+        if ch == "\\":
+            return self._escape(s, i, final)
+        if ch == '"' or (self._string_smart and ch in _SMART_QUOTES):
+            if ch == "“":
+                # 弯引号字符串里的左引号只可能是内容
+                self._out.append(ch)
+                return i + 1
+            closing = self._is_closing_quote(s, i + 1, final)
+            if closing is None:
+                return None
+            if closing:
+                self._end_string()
+            elif ch == '"':
+                self._out.append('\\"')
+                self._note(ESCAPED_INNER_QUOTE)
+            else:
+                self._out.append(ch)
+            return i + 1
+
+        # 控制字符
+        self._out.append(_CONTROL_ESCAPES.get(ch) or "\\u%04x" % ord(ch))
+        self._note(ESCAPED_CONTROL_CHARS)
+        return i + 1
+
+    def _is_closing_quote(self, s: str, j: int, final: bool) -> Optional[bool]:
+        """引号后的下一个非空白字符是结构字符（或输入结束）时视为字符串结束"""
+        match = _WHITESPACE.match(s, j)
+        k = match.end() if match else j
+        if k >= len(s):
+            return True if final else None
+        nxt = s[k]
+        if nxt in _AFTER_STRING:
+            return True
+        # 换行后紧跟下一个键（缺逗号）
+        if (nxt == '"' or nxt in _SMART_QUOTES) and "\n" in s[j:k]:
+            return True
+        return False
+
+    def _escape(self, s: str, i: int, final: bool) -> Optional[int]:
+        if i + 1 >= len(s):
+            if final:
+                return i + 1  # 末尾孤立的反斜杠直接丢弃
+            return None
+        nxt = s[i + 1]
+        if nxt in _VALID_ESCAPES:
+            self._out.append(s[i : i + 2])
+            return i + 2
+        if nxt == "u":
+            digits = s[i + 2 : i + 6]
+            if len(digits) < 4 and not final:
+                return None
+            if len(digits) == 4 and all(c in "0123456789abcdefABCDEF" for c in digits):
+                self._out.append(s[i : i + 6])
+                return i + 6
+        if nxt == "'":
+            self._out.append("'")
+            self._note(INVALID_ESCAPE)
+            return i + 2
+        self._out.append("\\\\")
+        self._note(INVALID_ESCAPE)
+        return i + 1
+
+    def _end_string(self):
+        self._out.append('"')
+        self._in_string = False
+
+    def _close_all(self):
+        """输入结束时补齐未闭合的字符串与括号"""
+        if self._done or not self._started:
+            return
+        if self._in_string:
+            if self._string_role == "key":
+                self._rollback(self._stack[-1])
+            else:
+                self._end_string()
+                self._note(CLOSED_STRING)
+            self._in_string = False
+        self._note(CLOSED_BRACKETS)
+        while self._stack:
+            self._close(self._stack[-1].kind)
+
+
+def parse_json(text: str) -> RepairResult:
+    """解析 LLM 输出中的 JSON：合法时直接 json.loads，否则走修复解析"""
+    try:
+        return RepairResult(json.loads(text))
+    except (json.JSONDecodeError, TypeError):
+        pass
+    parser = JsonRepairParser()
+    parser.feed(text or "")
+    return parser.finish()
+
+
+def repair_json(text: str) -> str:
+    """返回修复后的 JSON 文本"""
+    return json.dumps(parse_json(text).value, ensure_ascii=False)
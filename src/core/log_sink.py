@@ -0,0 +1,231 @@
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Any, Dict, Optional, TextIO
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class _Segment:
+    __slots__ = ("handle", "opened_at")
+
+    def __init__(self, handle: TextIO):
+        self.handle = handle
+        self.opened_at = time.time()
+
+
+class LogSink:
+    """
+    后台批量写入的 JSONL 日志：
+    - write() 只把记录放进有界队列（满了就丢弃并计数），不在调用线程做任何 I/O
+    - 单个写线程攒批写入，同一文件的多行一次写出，不会与其他线程交错
+    - 当前文件超过 max_bytes 或写入超过 rotate_seconds 后轮转，旧段 gzip 压缩，
+      只保留最近 backups 个压缩段
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_seconds: float = 86400,
+        backups: int = 10,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backups = backups
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.errors = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._segments: Dict[str, _Segment] = {}
+        self._enqueued = 0
+        self._done = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="llm-log-sink", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, path: str, record: Dict[str, Any]) -> bool:
+        """非阻塞写入一条记录；队列已满时丢弃并返回 False"""
+        if self._closed:
+            return False
+        with self._cond:
+            try:
+                self._queue.put_nowait((path, record))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._enqueued += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待此前提交的记录全部落盘（测试与进程退出时使用）"""
+        deadline = time.time() + timeout
+        with self._cond:
+            target = self._enqueued
+            while self._done < target:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0):
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+    # ---- 写线程 ----
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._rotate_expired()
+                continue
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._queue.put(None)
+                    break
+                batch.append(nxt)
+            self._write_batch(batch)
+        for path in list(self._segments):
+            self._close_segment(path)
+
+    def _write_batch(self, batch):
+        grouped: Dict[str, list] = {}
+        for path, record in batch:
+            try:
+                line = json.dumps(record, ensure_ascii=False)
+            except (TypeError, ValueError):
+                line = json.dumps({"unserializable": str(record)[:500]})
+            grouped.setdefault(path, []).append(line)
+
+        for path, lines in grouped.items():
+            try:
+                segment = self._segment(path)
+                segment.handle.write("\n".join(lines) + "\n")
+                segment.handle.flush()
+                self.written += len(lines)
+                if self._should_rotate(segment):
+                    self._rotate(path)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"写入 LLM 日志失败 {path}: {e}")
+
+        with self._cond:
+            self._done += len(batch)
+            self._cond.notify_all()
+
+    def _segment(self, path: str) -> _Segment:
+        segment = self._segments.get(path)
+        if segment is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            segment = self._segments[path] = _Segment(
+                open(path, "a", encoding="utf-8")
+            )
+        return segment
+
+    def _should_rotate(self, segment: _Segment) -> bool:
+        if self.max_bytes and segment.handle.tell() >= self.max_bytes:
+            return True
+        return bool(
+            self.rotate_seconds
+            and time.time() - segment.opened_at >= self.rotate_seconds
+        )
+
+    def _rotate_expired(self):
+        for path, segment in list(self._segments.items()):
+            if self._should_rotate(segment):
+                self._rotate(path)
+
+    def _close_segment(self, path: str):
+        segment = self._segments.pop(path, None)
+        if segment is not None:
+            try:
+                segment.handle.close()
+            except Exception:
+                pass
+
+    def _rotate(self, path: str):
+        """当前段改名后 gzip 压缩，并清理超出保留数量的旧段"""
+        self._close_segment(path)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        rotated = f"{path}.{stamp}.{self.rotations}"
+        try:
+            os.replace(path, rotated)
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+            self.rotations += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"LLM 日志轮转失败 {path}: {e}")
+            return
+        if self.backups:
+            archives = sorted(glob.glob(f"{glob.escape(path)}.*.gz"), key=os.path.getmtime)
+            for old in archives[: -self.backups]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+
+_log_sink: Optional[LogSink] = None
+_log_sink_lock = threading.Lock()
+
+
+def get_log_sink() -> LogSink:
+    """进程内共享的 LLM 调用日志写入器（进程退出时自动 flush）"""
+    global _log_sink
+    if _log_sink is None:
+        with _log_sink_lock:
+            if _log_sink is None:
+                _log_sink = LogSink(
+                    max_queue=config.LLM_LOG_QUEUE_SIZE,
+                    batch_size=config.LLM_LOG_BATCH_SIZE,
+                    flush_interval=config.LLM_LOG_FLUSH_SECONDS,
+                    max_bytes=config.LLM_LOG_MAX_MB * 1024 * 1024,
+                    rotate_seconds=config.LLM_LOG_ROTATE_HOURS * 3600,
+                    backups=config.LLM_LOG_BACKUPS,
+                )
+                atexit.register(_log_sink.close)
+    return _log_sink
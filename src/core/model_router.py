@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+@dataclass
+class ModelHealth:
+    """单个模型的健康统计（EWMA 延迟 / 错误率 + 熔断状态）"""
+
+    model: str
+    ewma_latency: Optional[float] = None
+    error_rate: float = 0.0
+    state: str = CLOSED
+    consecutive_failures: int = 0
+    opened_at: float = 0.0
+    probe_started: float = 0.0
+    calls: int = 0
+    failures: int = 0
+    last_error: str = ""
+    # 最近成功调用的延迟样本（用于对冲阈值的分位数）
+    latencies: deque = field(default_factory=lambda: deque(maxlen=200))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ewma_latency_ms": (
+                int(self.ewma_latency * 1000) if self.ewma_latency is not None else None
+            ),
+            "error_rate": round(self.error_rate, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "p50_ms": _ms(self.percentile(50)),
+            "p90_ms": _ms(self.percentile(90)),
+            "p99_ms": _ms(self.percentile(99)),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return int(seconds * 1000) if seconds is not None else None
+
+
+class ModelRouter:
+    """
+    按实际观测到的健康度为 LLM 候选模型排序，进程内所有调用与线程共享：
+    - 每个模型维护 EWMA 延迟与错误率
+    - 连续失败达到阈值后熔断（open），冷却期内直接跳过，不再先付一次超时
+    - 冷却期结束进入半开（half_open），只放行一个探测请求，成功即恢复，失败重新熔断
+    - 健康模型保持优先级顺序；错误率高或明显偏慢的模型降级到末尾
+    """
+
+    def __init__(
+        self,
+        alpha: float = None,
+        failure_threshold: int = None,
+        cooldown_seconds: float = None,
+        degraded_error_rate: float = 0.5,
+        slow_factor: float = 3.0,
+    ):
+        self.alpha = config.ROUTER_EWMA_ALPHA if alpha is None else alpha
+        self.failure_threshold = (
+            config.ROUTER_FAILURE_THRESHOLD
+            if failure_threshold is None
+            else failure_threshold
+        )
+        self.cooldown_seconds = (
+            config.ROUTER_COOLDOWN_SECONDS
+            if cooldown_seconds is None
+            else cooldown_seconds
+        )
+        self.degraded_error_rate = degraded_error_rate
+        self.slow_factor = slow_factor
+        self._models: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+        # 对冲请求统计
+        self.hedged_requests = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+
+    def _health(self, model: str) -> ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = self._models[model] = ModelHealth(model)
+        return health
+
+    def _is_degraded(self, health: ModelHealth, best_latency: Optional[float]) -> bool:
+        if health.error_rate >= self.degraded_error_rate:
+            return True
+        return (
+            best_latency is not None
+            and health.ewma_latency is not None
+            and health.ewma_latency > best_latency * self.slow_factor
+        )
+
+    def order(self, candidates: List[str], now: float = None) -> List[str]:
+        """
+        返回本次调用应尝试的模型顺序：跳过熔断中的模型，半开模型只放行一个探测。
+        所有候选都已熔断时按原顺序返回，避免完全不可用。
+        """
+        now = now or time.time()
+        with self._lock:
+            healths = [self._health(m) for m in candidates]
+            latencies = [
+                h.ewma_latency
+                for h in healths
+                if h.state == CLOSED and h.ewma_latency is not None
+            ]
+            best_latency = min(latencies) if latencies else None
+
+            healthy, degraded = [], []
+            for health in healths:
+                if health.state == OPEN:
+                    if now - health.opened_at < self.cooldown_seconds:
+                        continue
+                    health.state = HALF_OPEN
+                if health.state == HALF_OPEN:
+                    # 探测名额在冷却期后自动过期（探测请求未轮到该模型时不会卡死）
+                    if now - health.probe_started < self.cooldown_seconds:
+                        continue
+                    health.probe_started = now
+                    healthy.append(health.model)
+                elif self._is_degraded(health, best_latency):
+                    degraded.append(health.model)
+                else:
+                    healthy.append(health.model)
+
+        ordered = healthy + degraded
+        return ordered or list(candidates)
+
+    def record_success(self, model: str, latency: float):
+        with self._lock:
+            health = self._health(model)
+            health.calls += 1
+            health.ewma_latency = (
+                latency
+                if health.ewma_latency is None
+                else self.alpha * latency + (1 - self.alpha) * health.ewma_latency
+            )
+            health.error_rate = (1 - self.alpha) * health.error_rate
+            health.latencies.append(latency)
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                logger.info(f"模型 {model} 探测成功，恢复路由")
+            health.state = CLOSED
+            health.probe_started = 0.0
+
+    def record_failure(self, model: str, error: Exception = None):
+        with self._lock:
+            health = self._health(model)
+            health.calls += 1
+            health.failures += 1
+            health.error_rate = self.alpha + (1 - self.alpha) * health.error_rate
+            health.consecutive_failures += 1
+            health.last_error = str(error)[:200] if error else ""
+            if (
+                health.state == HALF_OPEN
+                or health.consecutive_failures >= self.failure_threshold
+            ):
+                if health.state != OPEN:
+                    logger.warning(
+                        f"模型 {model} 熔断 {self.cooldown_seconds:.0f}s: {health.last_error}"
+                    )
+                health.state = OPEN
+                health.opened_at = time.time()
+            health.probe_started = 0.0
+
+    def release(self, model: str):
+        """调用未产生健康结论（如不可恢复的错误）时归还半开探测名额"""
+        with self._lock:
+            self._health(model).probe_started = 0.0
+
+    def latency_percentile(
+        self, model: str, q: float, min_samples: int = 10
+    ) -> Optional[float]:
+        """模型成功调用延迟的 q 分位数；样本不足时返回 None"""
+        with self._lock:
+            health = self._models.get(model)
+            if health is None or len(health.latencies) < min_samples:
+                return None
+            return health.percentile(q)
+
+    def record_hedge(self, fired: bool, backup_won: bool = False):
+        with self._lock:
+            self.hedged_requests += 1
+            if fired:
+                self.hedges_fired += 1
+            if backup_won:
+                self.hedge_wins += 1
+
+    def hedge_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hedged_requests
+            return {
+                "requests": total,
+                "hedges_fired": self.hedges_fired,
+                "hedge_rate": round(self.hedges_fired / total, 4) if total else 0.0,
+                "backup_wins": self.hedge_wins,
+                "win_rate": (
+                    round(self.hedge_wins / self.hedges_fired, 4)
+                    if self.hedges_fired
+                    else 0.0
+                ),
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: h.to_dict() for name, h in self._models.items()}
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+            self.hedged_requests = self.hedges_fired = self.hedge_wins = 0
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """进程内共享的模型路由器"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
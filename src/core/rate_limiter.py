@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitError(Exception):
+    """速率限制错误：等待时间超过上限（如 Retry-After 很长），需要切换模型"""
+
+    def __init__(self, message="Rate limit exceeded", retry_after: float = None):
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class MemoryBucketBackend:
+    """进程内令牌桶状态（线程安全）"""
+
+    # 取令牌只是内存操作，可以直接在事件循环上调用
+    blocking = False
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str, rate: float, capacity: float, now: float) -> float:
+        """尝试取一个令牌；成功返回 0，否则返回需要等待的秒数"""
+        with self._lock:
+            tokens, updated_at, blocked_until = self._buckets.get(
+                key, (capacity, now, 0.0)
+            )
+            wait, state = _take(tokens, updated_at, blocked_until, rate, capacity, now)
+            self._buckets[key] = state
+            return wait
+
+    def block(self, key: str, until: float, capacity: float):
+        with self._lock:
+            blocked_until = self._buckets.get(key, (capacity, 0.0, 0.0))[2]
+            # 冷却结束后只放行一个请求，其余按速率补充，避免所有等待者同时涌入
+            self._buckets[key] = (1.0, until, max(blocked_until, until))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                key: {"tokens": round(t, 2), "blocked_until": b}
+                for key, (t, _, b) in self._buckets.items()
+            }
+
+
+class SQLiteBucketBackend:
+    """
+    基于 SQLite 的令牌桶状态，同一台机器上的多个 uvicorn worker 共享。
+    每次取令牌在 BEGIN IMMEDIATE 事务内读-改-写，跨进程原子。
+    事务可能等待其他 worker 的写锁（最长 5 秒），async 调用方需放到线程中执行。
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=5, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    def _transaction(self, key: str, update):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at, blocked_until FROM rate_buckets WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                result, state = update(row)
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, blocked_until)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (key, *state),
+                )
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self, key: str, rate: float, capacity: float, now: float) -> float:
+        def update(row):
+            tokens, updated_at, blocked_until = row or (capacity, now, 0.0)
+            return _take(tokens, updated_at, blocked_until, rate, capacity, now)
+
+        return self._transaction(key, update)
+
+    def block(self, key: str, until: float, capacity: float):
+        def update(row):
+            blocked_until = row[2] if row else 0.0
+            return None, (1.0, until, max(blocked_until, until))
+
+        self._transaction(key, update)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, tokens, blocked_until FROM rate_buckets"
+            ).fetchall()
+        return {
+            key: {"tokens": round(tokens, 2), "blocked_until": blocked}
+            for key, tokens, blocked in rows
+        }
+
+
+def _take(tokens, updated_at, blocked_until, rate, capacity, now):
+    """令牌桶核心逻辑，返回 (需要等待的秒数, 新状态)"""
+    if now < blocked_until:
+        return blocked_until - now, (tokens, updated_at, blocked_until)
+    if rate <= 0:
+        # 未配置速率：不主动限流，只遵守 429 的冷却
+        return 0.0, (capacity, now, blocked_until)
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= 1:
+        return 0.0, (tokens - 1, now, blocked_until)
+    return (1 - tokens) / rate, (tokens, now, blocked_until)
+
+
+class RateLimiter:
+    """
+    按 provider/model 划分的令牌桶限流器。
+    - acquire / acquire_async 在发请求前取令牌，桶空时等待
+    - 收到 429 时 penalize(key, retry_after)：该键在所有线程（SQLite 后端下为所有 worker）
+      上冷却到 Retry-After 结束，而不是立即把压力转到下一个模型
+    - 需要等待的时间超过 max_wait 时抛出 RateLimitError，由调用方决定是否切换模型
+    - rate_per_minute <= 0 时不主动限流，只在 429 后冷却
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        rate_per_minute: float = 60,
+        burst: float = 10,
+        max_wait: float = 30,
+    ):
+        self.backend = backend or MemoryBucketBackend()
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.max_wait = max_wait
+        self.waits = 0
+        self.penalties = 0
+
+    def _next_wait(self, key: str, deadline: float) -> float:
+        now = time.time()
+        wait = self.backend.try_acquire(key, self.rate, self.capacity, now)
+        if wait > 0 and now + wait > deadline:
+            raise RateLimitError(f"rate limit {key}: retry after {wait:.1f}s", wait)
+        return wait
+
+    def acquire(self, key: str, max_wait: float = None):
+        deadline = time.time() + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            wait = self._next_wait(key, deadline)
+            if wait <= 0:
+                return
+            self.waits += 1
+            time.sleep(wait)
+
+    async def acquire_async(self, key: str, max_wait: float = None):
+        deadline = time.time() + (self.max_wait if max_wait is None else max_wait)
+        while True:
+            if self.backend.blocking:
+                wait = await asyncio.to_thread(self._next_wait, key, deadline)
+            else:
+                wait = self._next_wait(key, deadline)
+            if wait <= 0:
+                return
+            self.waits += 1
+            await asyncio.sleep(wait)
+
+    def penalize(self, key: str, retry_after: float):
+        """429 之后让该键整体冷却 retry_after 秒"""
+        self.penalties += 1
+        logger.warning(f"限流 {key}: 冷却 {retry_after:.1f}s")
+        self.backend.block(key, time.time() + retry_after, self.capacity)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "rate_per_minute": self.rate * 60,
+            "burst": self.capacity,
+            "waits": self.waits,
+            "penalties": self.penalties,
+            "buckets": self.backend.snapshot(),
+        }
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """进程内共享的 LLM 限流器（LLM_RATE_LIMIT_BACKEND=sqlite 时跨 worker 共享）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                backend = None
+                if config.LLM_RATE_LIMIT_BACKEND == "sqlite":
+                    try:
+                        backend = SQLiteBucketBackend(config.LLM_RATE_LIMIT_PATH)
+                    except Exception as e:
+                        logger.error(f"限流器 SQLite 初始化失败，使用进程内限流: {e}")
+                _rate_limiter = RateLimiter(
+                    backend,
+                    rate_per_minute=config.LLM_RATE_LIMIT_PER_MINUTE,
+                    burst=config.LLM_RATE_LIMIT_BURST,
+                    max_wait=config.LLM_RATE_LIMIT_MAX_WAIT,
+                )
+    return _rate_limiter
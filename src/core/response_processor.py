@@ -1,16 +1,25 @@
 import re
 import json
 import logging
-from typing import Dict, Any, List, Optional, Union
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+
+from .json_repair import TRUNCATION_REPAIRS, JsonRepairError, parse_json
 
 logger = logging.getLogger(__name__)
 
 
+class TruncatedResponseError(ValueError):
+    """响应被截断，只能靠补全括号/引号或丢弃半个成员才能解析"""
+
+
 class LLMResponseProcessor:
     """
     Centralized processor for handling, cleaning, and normalizing LLM JSON responses.
     """
 
+    # Bump when parsing/normalization changes so cached step outputs are re-validated.
+    VERSION = "2"
+
     @staticmethod
     def clean_json_string(raw_text: str) -> str:
         """
@@ -54,6 +63,60 @@ class LLMResponseProcessor:
             logger.error(f"Problematic JSON prefix: {json_str[:500]}...")
             raise e
 
+    @classmethod
+    def parse_response_with_repairs(
+        cls, raw_response: str
+    ) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """
+        Parse an LLM response: strict parse of the cleaned JSON first, then fall back
+        to the repair parser on the raw text (trailing commas, truncation, unescaped
+        newlines/quotes, smart quotes). Returns (data, repairs) where repairs maps
+        repair kind -> count (empty when the strict parse succeeded).
+        """
+        try:
+            return cls.safe_parse_json(cls.clean_json_string(raw_response)), {}
+        except json.JSONDecodeError as e:
+            try:
+                result = parse_json(raw_response)
+            except JsonRepairError:
+                raise e
+            if not isinstance(result.value, dict):
+                raise e
+            logger.warning(f"JSON repaired: {result.repairs}")
+            return result.value, result.repairs
+
+    @classmethod
+    def parse_response(cls, raw_response: str) -> Dict[str, Any]:
+        """
+        Tolerant parse used for the final result, so a malformed response does not
+        fail the step. Callers deciding whether to cache or accept a response should
+        use ensure_complete / strict instead.
+        """
+        return cls.parse_response_with_repairs(raw_response)[0]
+
+    @classmethod
+    def ensure_complete(cls, raw_response: str) -> Dict[str, Any]:
+        """Parse and raise TruncatedResponseError if the response had to be completed."""
+        data, repairs = cls.parse_response_with_repairs(raw_response)
+        truncation = sorted(kind for kind in repairs if kind in TRUNCATION_REPAIRS)
+        if truncation:
+            raise TruncatedResponseError(f"truncated response ({', '.join(truncation)})")
+        return data
+
+    @classmethod
+    def strict(cls, processor_func: Callable[[str], Any]) -> Callable[[str], Any]:
+        """
+        Validator for hedging / failover: rejects truncated responses, then runs the
+        agent processor. Cosmetic repairs (trailing commas, smart quotes) still pass.
+        """
+
+        def validate(raw_response: str):
+            cls.ensure_complete(raw_response)
+            return processor_func(raw_response)
+
+        validate.__qualname__ = f"strict.{processor_func.__qualname__}"
+        return validate
+
     @staticmethod
     def normalize_keys(
         data: Dict[str, Any], key_mapping: Dict[str, List[str]]
@@ -109,7 +172,7 @@ class LLMResponseProcessor:
     @classmethod
     def process_market_analysis(cls, raw_response: str) -> Dict[str, Any]:
         """Process output from Market Analyst agent."""
-        data = cls.safe_parse_json(cls.clean_json_string(raw_response))
+        data = cls.parse_response(raw_response)
 
         mapping = {
             "summary": ["摘要", "核心摘要", "summary_text", "conclusion"],
@@ -124,7 +187,7 @@ class LLMResponseProcessor:
     @classmethod
     def process_visual_research(cls, raw_response: str) -> Dict[str, Any]:
         """Process output from Visual Researcher agent."""
-        data = cls.safe_parse_json(cls.clean_json_string(raw_response))
+        data = cls.parse_response(raw_response)
 
         mapping = {
             "summary": ["摘要", "核心摘要", "summary_text"],
@@ -139,7 +202,7 @@ class LLMResponseProcessor:
     @classmethod
     def process_design_generation(cls, raw_response: str) -> Dict[str, Any]:
         """Process output from Product Designer agent."""
-        data = cls.safe_parse_json(cls.clean_json_string(raw_response))
+        data = cls.parse_response(raw_response)
 
         mapping = {
             "summary": ["摘要", "核心摘要", "设计思路", "design_concept"],
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class StepGraphError(Exception):
+    """步骤依赖图定义错误（未知依赖、环、重复节点）"""
+
+
+@dataclass
+class StepNode:
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    deps: Sequence[str] = ()
+
+
+@dataclass
+class NodeTiming:
+    name: str
+    start: float
+    end: float
+    deps: Sequence[str] = ()
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class RunReport:
+    """一次 DAG 运行的结果与耗时分析"""
+
+    results: Dict[str, Any]
+    timings: Dict[str, NodeTiming]
+    wall_time: float
+    critical_path: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = min((t.start for t in self.timings.values()), default=0.0)
+        return {
+            "wall_time_ms": int(self.wall_time * 1000),
+            "critical_path": self.critical_path,
+            "nodes": {
+                name: {
+                    "start_ms": int((t.start - origin) * 1000),
+                    "duration_ms": int(t.duration * 1000),
+                    "deps": list(t.deps),
+                }
+                for name, t in self.timings.items()
+            },
+        }
+
+
+class StepGraph:
+    """
+    轻量 DAG 调度器：每个节点声明依赖，依赖全部完成后立即启动。
+    节点函数以关键字参数接收依赖节点的结果（参数名即依赖节点名）。
+    """
+
+    def __init__(self):
+        self._nodes: Dict[str, StepNode] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], deps=()):
+        if name in self._nodes:
+            raise StepGraphError(f"重复的节点: {name}")
+        self._nodes[name] = StepNode(name=name, func=func, deps=tuple(deps))
+        return self
+
+    @property
+    def nodes(self) -> Dict[str, StepNode]:
+        return dict(self._nodes)
+
+    def validate(self):
+        for node in self._nodes.values():
+            for dep in node.deps:
+                if dep not in self._nodes:
+                    raise StepGraphError(f"节点 {node.name} 依赖未知节点 {dep}")
+
+        # Kahn 拓扑排序检测环
+        indegree = {name: len(node.deps) for name, node in self._nodes.items()}
+        ready = [name for name, d in indegree.items() if d == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for node in self._nodes.values():
+                if current in node.deps:
+                    indegree[node.name] -= 1
+                    if indegree[node.name] == 0:
+                        ready.append(node.name)
+        if visited != len(self._nodes):
+            raise StepGraphError("步骤依赖图存在环")
+
+    async def run(
+        self,
+        on_start: Optional[Callable[[str], Awaitable[None]]] = None,
+        skip: Optional[Dict[str, Any]] = None,
+        on_finish: Optional[Callable[[str, Any], Awaitable[None]]] = None,
+    ) -> RunReport:
+        """
+        运行整张图。任一节点失败时取消其余节点并抛出原异常。
+        skip: 已有结果的节点（直接作为结果使用，不再执行）
+        on_finish: 节点成功完成后的回调（如持久化检查点），完成前下游不会启动
+        """
+        self.validate()
+        skip = skip or {}
+        results: Dict[str, Any] = {}
+        timings: Dict[str, NodeTiming] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        run_start = time.time()
+
+        async def run_node(node: StepNode):
+            if node.deps:
+                await asyncio.gather(*(tasks[dep] for dep in node.deps))
+            if node.name in skip:
+                results[node.name] = skip[node.name]
+                return results[node.name]
+            if on_start:
+                await on_start(node.name)
+            start = time.time()
+            result = await node.func(**{dep: results[dep] for dep in node.deps})
+            if on_finish:
+                await on_finish(node.name, result)
+            timings[node.name] = NodeTiming(node.name, start, time.time(), node.deps)
+            results[node.name] = result
+            return result
+
+        for node in self._nodes.values():
+            tasks[node.name] = asyncio.ensure_future(run_node(node))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+
+        report = RunReport(
+            results=results,
+            timings=timings,
+            wall_time=time.time() - run_start,
+        )
+        report.critical_path = self.critical_path(timings)
+        logger.info(
+            f"DAG 完成 ({report.wall_time:.2f}s)，关键路径: {' → '.join(report.critical_path)}"
+        )
+        return report
+
+    def critical_path(self, timings: Dict[str, NodeTiming]) -> List[str]:
+        """
+        从最晚结束的节点回溯：每一步选择结束最晚的依赖节点，
+        即真正决定该节点开始时间的那条依赖链。
+        """
+        if not timings:
+            return []
+        current = max(timings.values(), key=lambda t: t.end)
+        path = [current.name]
+        while True:
+            executed = [timings[d] for d in current.deps if d in timings]
+            if not executed:
+                break
+            current = max(executed, key=lambda t: t.end)
+            path.append(current.name)
+        path.reverse()
+        return path
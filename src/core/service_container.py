@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BASE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "KNOWLEDGE.md",
+)
+DEFAULT_KNOWLEDGE = "暂无外部知识库。"
+
+
+class ServiceContainer:
+    """
+    进程级服务容器：LLM 客户端、图片服务、知识库只构建一次，跨请求复用。
+    - LLM 服务按 (api_key, base_url) 区分，自定义配置各自一份，复用 keep-alive 连接池
+    - 异步客户端的连接池绑定事件循环，额外按当前事件循环的 id 区分；
+      循环退出（或被关闭）后丢弃并关闭该循环的实例，不让已结束的循环常驻内存
+    - 知识库按文件 mtime 缓存，文件修改后自动重新读取
+    """
+
+    def __init__(self):
+        self._services: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        # id(loop) -> loop：已登记清理任务的事件循环
+        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
+        self._knowledge: Optional[str] = None
+        self._knowledge_mtime: Optional[float] = None
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]):
+        service = self._services.get(key)
+        if service is not None:
+            return service
+        with self._lock:
+            service = self._services.get(key)
+            if service is None:
+                service = factory()
+                self._services[key] = service
+        return service
+
+    def llm(self, api_key=None, base_url=None, factory=None):
+        if factory is None:
+            from llm_wrapper import LLMService as factory
+        return self.get_or_create(
+            ("llm", factory, api_key, base_url),
+            lambda: factory(api_key=api_key, base_url=base_url),
+        )
+
+    def async_llm(self, api_key=None, base_url=None, factory=None):
+        if factory is None:
+            from llm_wrapper import AsyncLLMService as factory
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            self._track_loop(loop)
+        return self.get_or_create(
+            ("async_llm", factory, api_key, base_url, id(loop) if loop else None),
+            lambda: factory(api_key=api_key, base_url=base_url),
+        )
+
+    def _track_loop(self, loop: asyncio.AbstractEventLoop):
+        """登记事件循环并挂上清理任务；顺带丢弃已关闭循环（或 id 被新循环复用）的实例"""
+        if self._loops.get(id(loop)) is loop:
+            return
+        with self._lock:
+            if self._loops.get(id(loop)) is loop:
+                return
+            for loop_id, old_loop in list(self._loops.items()):
+                if loop_id == id(loop) or old_loop.is_closed():
+                    self._drop_loop(loop_id)
+            self._loops[id(loop)] = loop
+        loop.create_task(self._release_with_loop(loop))
+
+    def _drop_loop(self, loop_id: int) -> List[Any]:
+        """移除绑定到该循环的异步服务并返回它们（调用方持有 self._lock）"""
+        self._loops.pop(loop_id, None)
+        keys = [
+            key
+            for key in self._services
+            if key[0] == "async_llm" and key[-1] == loop_id
+        ]
+        return [self._services.pop(key) for key in keys]
+
+    async def _release_with_loop(self, loop: asyncio.AbstractEventLoop):
+        """挂起到事件循环退出：asyncio.run / uvicorn 关闭时会取消剩余任务，借此关闭该循环的客户端"""
+        try:
+            await loop.create_future()
+        finally:
+            services = []
+            with self._lock:
+                if self._loops.get(id(loop)) is loop:
+                    services = self._drop_loop(id(loop))
+            for service in services:
+                client = getattr(service, "client", None)
+                if client is None:
+                    continue
+                try:
+                    await client.close()
+                except Exception as e:
+                    logger.debug(f"关闭异步 LLM 客户端失败: {e}")
+
+    def image_gen(self, server_script_path=None, factory=None):
+        if factory is None:
+            from image_gen import ImageGenService as factory
+        return self.get_or_create(
+            ("image_gen", factory, server_script_path),
+            lambda: factory(server_script_path=server_script_path),
+        )
+
+    def knowledge_base(self, path: str = KNOWLEDGE_BASE_PATH) -> str:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return DEFAULT_KNOWLEDGE
+        if self._knowledge is None or mtime != self._knowledge_mtime:
+            with self._lock:
+                if self._knowledge is None or mtime != self._knowledge_mtime:
+                    with open(path, "r", encoding="utf-8") as f:
+                        self._knowledge = f.read()
+                    self._knowledge_mtime = mtime
+        return self._knowledge
+
+    def clear(self):
+        with self._lock:
+            self._services.clear()
+            self._loops.clear()
+            self._knowledge = None
+            self._knowledge_mtime = None
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for key in list(self._services):
+            counts[key[0]] = counts.get(key[0], 0) + 1
+        return {"services": counts, "knowledge_cached": self._knowledge is not None}
+
+
+_container = None
+_container_lock = threading.Lock()
+
+
+def get_service_container() -> ServiceContainer:
+    """进程内共享的服务容器"""
+    global _container
+    if _container is None:
+        with _container_lock:
+            if _container is None:
+                _container = ServiceContainer()
+    return _container
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+_SPACES = re.compile(r"\s+")
+
+
+def flight_key(model: str, messages: List[Dict[str, str]], **options) -> str:
+    """
+    合并键：模型 + 规范化后的消息（去掉首尾空白、连续空白折叠为一个空格）+ 其他请求选项。
+    只差空白的重复提交（如表单双击、多个标签页）会得到同一个键。
+    """
+    normalized = [
+        {
+            "role": str(m.get("role", "")).lower(),
+            "content": _SPACES.sub(" ", str(m.get("content", ""))).strip(),
+        }
+        for m in messages
+    ]
+    payload = json.dumps(
+        {"model": model, "messages": normalized, "options": options},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    线程版 singleflight：同一个键同时只执行一次 fn，
+    执行期间到达的相同调用等待并共享这次的结果（或异常）。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return _stats(self.leaders, self.coalesced, len(self._calls))
+
+
+class AsyncSingleFlight:
+    """
+    asyncio 版 singleflight：相同键的并发调用共享同一个后台任务。
+    某个等待者被取消不影响其他等待者；所有等待者都离开后才取消请求本身。
+    任务绑定在各自的事件循环上，不同循环之间不共享。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[int, str], List[Any]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        entry = self._calls.get(slot)
+        if entry is None or entry[0].done():
+            task = loop.create_task(factory())
+            # [任务, 等待者数量]
+            entry = self._calls[slot] = [task, 0]
+            task.add_done_callback(lambda _, e=entry: self._forget(slot, e))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+    def _forget(self, slot, entry):
+        if self._calls.get(slot) is entry:
+            del self._calls[slot]
+
+    def stats(self) -> Dict[str, Any]:
+        return _stats(self.leaders, self.coalesced, len(self._calls))
+
+
+def _stats(leaders: int, coalesced: int, in_flight: int) -> Dict[str, Any]:
+    total = leaders + coalesced
+    return {
+        "calls": total,
+        "executed": leaders,
+        "coalesced": coalesced,
+        "coalesce_rate": round(coalesced / total, 4) if total else 0.0,
+        "in_flight": in_flight,
+    }
+
+
+_singleflight = None
+_async_singleflight = None
+_singleflight_lock = threading.Lock()
+
+
+def get_singleflight() -> SingleFlight:
+    """进程内共享的同步 LLM 调用合并器"""
+    global _singleflight
+    if _singleflight is None:
+        with _singleflight_lock:
+            if _singleflight is None:
+                _singleflight = SingleFlight()
+    return _singleflight
+
+
+def get_async_singleflight() -> AsyncSingleFlight:
+    """进程内共享的异步 LLM 调用合并器"""
+    global _async_singleflight
+    if _async_singleflight is None:
+        with _singleflight_lock:
+            if _async_singleflight is None:
+                _async_singleflight = AsyncSingleFlight()
+    return _async_singleflight
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    agent: str, model: str, messages: List[Dict[str, str]], processor_version: str
+) -> str:
+    """按 渲染后的 prompt + 模型 + 解析器版本 计算内容寻址键"""
+    payload = json.dumps(
+        {
+            "agent": agent,
+            "model": model,
+            "processor_version": processor_version,
+            "messages": messages,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StepCache:
+    """
+    基于 SQLite 的持久化步骤输出缓存。
+    - 内容寻址：键由 make_cache_key 计算，值为通过解析校验的原始 LLM 响应
+    - TTL 过期 + 按条数/字节数上限的 LRU 淘汰
+    - 单连接 + 锁保证线程安全，WAL 模式允许多个 worker 进程共享同一文件
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 2000,
+        max_bytes: int = 200 * 1024 * 1024,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS step_cache (
+                key TEXT PRIMARY KEY,
+                agent TEXT,
+                model TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_step_cache_accessed ON step_cache(accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM step_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM step_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE step_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, agent: str = "", model: str = ""):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO step_cache
+                    (key, agent, model, value, size, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, agent, model, value, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到条数与字节数都回到上限以内（调用方持有锁）"""
+        if self.ttl_seconds:
+            cur = self._conn.execute(
+                "DELETE FROM step_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            self.evictions += cur.rowcount
+
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM step_cache"
+        ).fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM step_cache ORDER BY accessed_at ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM step_cache WHERE key = ?", (row[0],))
+            self.evictions += 1
+            count -= 1
+            total -= row[1]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM step_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM step_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+_step_cache = None
+_step_cache_lock = threading.Lock()
+
+
+def get_step_cache() -> Optional[StepCache]:
+    """进程内共享的步骤缓存；未启用或初始化失败时返回 None"""
+    global _step_cache
+    if _step_cache is None:
+        with _step_cache_lock:
+            if _step_cache is None:
+                if not config.STEP_CACHE_ENABLED:
+                    _step_cache = False
+                else:
+                    try:
+                        _step_cache = StepCache(
+                            config.STEP_CACHE_PATH,
+                            max_entries=config.STEP_CACHE_MAX_ENTRIES,
+                            max_bytes=config.STEP_CACHE_MAX_MB * 1024 * 1024,
+                            ttl_seconds=config.STEP_CACHE_TTL_HOURS * 3600,
+                        )
+                    except Exception as e:
+                        logger.error(f"步骤缓存初始化失败: {e}")
+                        _step_cache = False
+    return _step_cache if _step_cache else None
@@ -0,0 +1,150 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .json_repair import parse_json
+
+logger = logging.getLogger(__name__)
+
+# 设计方案列表可能出现的键名（与 LLMResponseProcessor.process_design_generation 保持一致）
+DEFAULT_ARRAY_KEYS = ("prompts", "schemes", "designs", "proposals", "方案", "设计方案")
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "expect_key", "last_key")
+
+    def __init__(self, kind: str, key: Optional[str]):
+        self.kind = kind  # "{" or "["
+        self.key = key  # 该容器在父对象中的键名
+        self.expect_key = kind == "{"
+        self.last_key: Optional[str] = None
+
+
+class PromptStreamParser:
+    """
+    增量 JSON 解析器：逐块喂入 LLM 流式输出，顶层对象中 prompts 数组的
+    每个元素对象一旦闭合就立即解析并返回，无需等待整个响应结束。
+    返回的元素带有其在数组中的下标：解析失败或非对象的元素会被跳过，
+    调用方必须按下标而不是按输出顺序与最终方案对应。
+
+    只跟踪结构（字符串/转义/括号栈），不构建完整语法树，O(n) 且与分块方式无关。
+    代码块围栏等顶层对象之前的文本会被忽略。
+    """
+
+    def __init__(self, array_keys: Sequence[str] = DEFAULT_ARRAY_KEYS):
+        self.array_keys = set(array_keys)
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._key_chars: List[str] = []
+        self._capture: Optional[List[str]] = None
+        self._capture_depth = 0
+        self._capture_index = 0
+        self._index = 0  # 当前所在方案元素在数组中的下标
+        self._done = False
+        self.emitted = 0
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已闭合"""
+        return self._done
+
+    def _in_target_array(self) -> bool:
+        # 栈: [root "{", prompts "["] -> 下一个 "{" 就是方案元素
+        return (
+            len(self._stack) == 2
+            and self._stack[0].kind == "{"
+            and self._stack[1].kind == "["
+            and self._stack[1].key in self.array_keys
+        )
+
+    def feed(self, chunk: str) -> List[Tuple[int, Dict[str, Any]]]:
+        """喂入一段文本，返回本次新闭合的 (数组下标, 元素) 列表"""
+        completed: List[Tuple[int, Dict[str, Any]]] = []
+        if self._done or not chunk:
+            return completed
+
+        for ch in chunk:
+            if self._capture is not None:
+                self._capture.append(ch)
+
+            if self._in_string:
+                if self._string_is_key:
+                    self._key_chars.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._finish_key()
+                continue
+
+            if ch == '"':
+                if not self._stack:
+                    continue
+                self._in_string = True
+                top = self._stack[-1]
+                self._string_is_key = top.kind == "{" and top.expect_key
+                self._key_chars = ['"'] if self._string_is_key else []
+            elif ch in "{[":
+                if not self._stack and ch == "[":
+                    continue
+                key = None
+                if self._stack and self._stack[-1].kind == "{":
+                    key = self._stack[-1].last_key
+                if ch == "{" and self._capture is None and self._in_target_array():
+                    self._capture = ["{"]
+                    self._capture_depth = len(self._stack) + 1
+                    self._capture_index = self._index
+                self._stack.append(_Frame(ch, key))
+                if self._in_target_array():
+                    self._index = 0
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if (
+                    self._capture is not None
+                    and ch == "}"
+                    and len(self._stack) == self._capture_depth - 1
+                ):
+                    item = self._emit("".join(self._capture))
+                    if item is not None:
+                        completed.append((self._capture_index, item))
+                    self._capture = None
+                if not self._stack:
+                    self._done = True
+                    break
+            elif ch == ":":
+                if self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].expect_key = False
+            elif ch == ",":
+                if self._stack and self._stack[-1].kind == "{":
+                    self._stack[-1].expect_key = True
+                elif self._in_target_array():
+                    self._index += 1
+
+        return completed
+
+    def _finish_key(self):
+        raw = "".join(self._key_chars)
+        try:
+            key = json.loads(raw)
+        except ValueError:
+            key = raw.strip('"')
+        self._stack[-1].last_key = key
+        self._string_is_key = False
+
+    def _emit(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = parse_json(text).value
+        except ValueError as e:
+            logger.warning(f"流式方案解析失败，等待完整响应兜底: {e}")
+            return None
+        if not isinstance(item, dict):
+            return None
+        self.emitted += 1
+        return item
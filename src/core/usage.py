@@ -0,0 +1,225 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def _int(value) -> int:
+    # 供应商未返回（或测试中的 Mock 对象）时按 0 计
+    return value if isinstance(value, int) and not isinstance(value, bool) else 0
+
+
+def extract_usage(response) -> Optional[Dict[str, int]]:
+    """从 OpenAI 兼容响应（或流式最后一个 chunk）中提取 token 用量；没有用量时返回 None"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    result = {
+        "prompt_tokens": _int(getattr(usage, "prompt_tokens", None)),
+        "completion_tokens": _int(getattr(usage, "completion_tokens", None)),
+        "cached_tokens": _int(getattr(details, "cached_tokens", None)),
+    }
+    return result if any(result.values()) else None
+
+
+def _load_pricing() -> Dict[str, Dict[str, float]]:
+    try:
+        pricing = json.loads(config.LLM_PRICING or "{}")
+        return pricing if isinstance(pricing, dict) else {}
+    except ValueError:
+        logger.error("LLM_PRICING 不是合法的 JSON，忽略费用计算")
+        return {}
+
+
+def estimate_cost(model: str, usage: Dict[str, int], pricing=None) -> Optional[float]:
+    """
+    按 LLM_PRICING（每百万 token 的美元单价）估算费用，模型未配置单价时返回 None。
+    LLM_PRICING 示例: {"gemini-2.5-flash": {"prompt": 0.3, "completion": 2.5, "cached": 0.075}}
+    """
+    price = (pricing if pricing is not None else _load_pricing()).get(model)
+    if not price:
+        return None
+    cached = usage.get("cached_tokens", 0)
+    uncached = max(0, usage.get("prompt_tokens", 0) - cached)
+    cost = (
+        uncached * price.get("prompt", 0)
+        + cached * price.get("cached", price.get("prompt", 0))
+        + usage.get("completion_tokens", 0) * price.get("completion", 0)
+    )
+    return cost / 1_000_000
+
+
+class _Bucket:
+    __slots__ = (
+        "calls",
+        "failed_calls",
+        "prompt_tokens",
+        "completion_tokens",
+        "cached_tokens",
+        "cost_usd",
+        "duration_ms",
+        "prompt_chars",
+    )
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def add(self, other: "_Bucket"):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self) -> Dict[str, Any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "failed_calls": self.failed_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "avg_prompt_tokens": int(self.prompt_tokens / calls),
+            "avg_prompt_chars": int(self.prompt_chars / calls),
+            "avg_duration_ms": int(self.duration_ms / calls),
+        }
+
+
+class UsageTracker:
+    """
+    进程内的 LLM token 用量汇总，按 (project, run_id, agent, model) 分组累计。
+    summary() 可按项目 / 单次运行筛选，并按 Agent 与模型分别汇总。
+    组数超过 max_groups 时淘汰最早的分组。
+    """
+
+    def __init__(self, max_groups: int = 5000):
+        self.max_groups = max_groups
+        self._groups: "OrderedDict[Tuple, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pricing = _load_pricing()
+
+    def record(
+        self,
+        model: str,
+        usage: Optional[Dict[str, int]],
+        duration: float,
+        prompt_chars: int = 0,
+        agent: str = None,
+        project: str = None,
+        run_id: str = None,
+        status: str = "success",
+    ) -> Optional[float]:
+        """
+        记录一次调用，返回估算费用（未配置单价时为 None）。
+        被拒绝（空响应、被截断等）或中途失败的调用同样计费，status 非 success 时计入 failed_calls
+        """
+        usage = usage or {}
+        cost = estimate_cost(model, usage, self._pricing) if usage else None
+        key = (project or "", run_id or "", agent or "other", model)
+        with self._lock:
+            bucket = self._groups.get(key)
+            if bucket is None:
+                bucket = self._groups[key] = _Bucket()
+                while len(self._groups) > self.max_groups:
+                    self._groups.popitem(last=False)
+            bucket.calls += 1
+            if status != "success":
+                bucket.failed_calls += 1
+            for name in TOKEN_FIELDS:
+                setattr(bucket, name, getattr(bucket, name) + usage.get(name, 0))
+            bucket.cost_usd += cost or 0.0
+            bucket.duration_ms += int(duration * 1000)
+            bucket.prompt_chars += prompt_chars
+        return cost
+
+    def summary(self, project: str = None, run_id: str = None) -> Dict[str, Any]:
+        total = _Bucket()
+        by_agent: Dict[str, _Bucket] = {}
+        by_model: Dict[str, _Bucket] = {}
+        with self._lock:
+            for (p, r, agent, model), bucket in self._groups.items():
+                if project is not None and p != project:
+                    continue
+                if run_id is not None and r != run_id:
+                    continue
+                total.add(bucket)
+                by_agent.setdefault(agent, _Bucket()).add(bucket)
+                by_model.setdefault(model, _Bucket()).add(bucket)
+        return {
+            "total": total.to_dict(),
+            "by_agent": {name: b.to_dict() for name, b in by_agent.items()},
+            "by_model": {name: b.to_dict() for name, b in by_model.items()},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._groups.clear()
+
+
+def merge_summaries(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """合并两个 summary()（用于把本次运行累加到项目中已保存的历史用量上）"""
+
+    def bucket(data: Dict[str, Any]) -> _Bucket:
+        result = _Bucket()
+        calls = data.get("calls", 0)
+        result.calls = calls
+        result.failed_calls = data.get("failed_calls", 0)
+        for name in TOKEN_FIELDS:
+            setattr(result, name, data.get(name, 0))
+        result.cost_usd = data.get("cost_usd", 0.0)
+        result.duration_ms = data.get("avg_duration_ms", 0) * calls
+        result.prompt_chars = data.get("avg_prompt_chars", 0) * calls
+        return result
+
+    def merged(x: Dict[str, Any], y: Dict[str, Any]) -> Dict[str, Any]:
+        result = bucket(x or {})
+        result.add(bucket(y or {}))
+        return result.to_dict()
+
+    merged_summary = {"total": merged(a.get("total"), b.get("total"))}
+    for group in ("by_agent", "by_model"):
+        names = set(a.get(group, {})) | set(b.get(group, {}))
+        merged_summary[group] = {
+            name: merged(a.get(group, {}).get(name), b.get(group, {}).get(name))
+            for name in names
+        }
+    return merged_summary
+
+
+def project_usage(
+    stored: Any, run_id: str, run_summary: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    计算保存在项目 content["usage"] 中的用量：
+    total 为历史累计，last_run 为本次运行。stored 是本次运行开始时读到的旧值；
+    续跑同一个 run_id 时在其已保存的用量上继续累加。
+    """
+    stored = stored if isinstance(stored, dict) else {}
+    last_run = stored.get("last_run") or {}
+    base_run = last_run if last_run.get("run_id") == run_id else {}
+    run = merge_summaries(base_run, run_summary)
+    # stored.total 已包含 base_run，只需加上本进程新增的部分
+    total = merge_summaries(stored.get("total") or {}, run_summary)
+    return {"total": total, "last_run": {"run_id": run_id, **run}}
+
+
+_usage_tracker = None
+_usage_tracker_lock = threading.Lock()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """进程内共享的 token 用量汇总"""
+    global _usage_tracker
+    if _usage_tracker is None:
+        with _usage_tracker_lock:
+            if _usage_tracker is None:
+                _usage_tracker = UsageTracker()
+    return _usage_tracker
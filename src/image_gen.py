@@ -2,7 +2,10 @@ import os
 import sys
 import time
 import shutil
+import uuid
+import asyncio
 import requests
+import httpx
 import logging
 from datetime import datetime
 
@@ -63,7 +66,7 @@ class ImageGenService:
         if self.jimeng_token and self.jimeng_path:
             self.mode = "direct"
             print(f"ℹ️ 即梦模块: 直接调用模式")
-            print(f"   - Token: {self.jimeng_token[:10]}...")
+            print(f"   - Token: {self.jimeng_token[:10]}... (共 {len(self.jimeng_token.split(','))} 个账号)")
             print(f"   - 路径: {self.jimeng_path}")
         elif self.jimeng_token:
             self.mode = "http"
@@ -118,7 +121,47 @@ class ImageGenService:
             print(f"❌ Supabase 上传异常: {e}")
             return None
 
-    def generate_image(self, prompt, output_dir, session_id=None):
+    async def upload_to_supabase_async(self, file_data, project_name, filename):
+        """异步上传图片字节到 Supabase Storage"""
+        if not self.use_storage:
+            return None
+
+        try:
+            from services.db_service import get_project_id
+
+            storage_folder = get_project_id(project_name)
+            file_path = f"{storage_folder}/{filename}"
+            url = f"{self.supabase_url}/storage/v1/object/{self.supabase_bucket}/{file_path}"
+
+            headers = {
+                "Authorization": f"Bearer {self.supabase_key}",
+                "Content-Type": "image/jpeg",
+            }
+
+            async with httpx.AsyncClient(timeout=60) as client:
+                response = await client.post(url, headers=headers, content=file_data)
+
+            if response.status_code in [200, 201]:
+                public_url = f"{self.supabase_url}/storage/v1/object/public/{self.supabase_bucket}/{file_path}"
+                print(f"✅ 已上传到 Supabase Storage: {file_path}")
+                return public_url
+            else:
+                print(f"❌ 上传失败: {response.status_code} - {response.text[:100]}")
+                return None
+        except Exception as e:
+            print(f"❌ Supabase 上传异常: {e}")
+            return None
+
+    def _new_output(self, output_dir):
+        """确保输出目录存在并构造唯一文件名（并发生成时避免同秒覆盖）"""
+        os.makedirs(output_dir, exist_ok=True)
+
+        timestamp = int(time.time())
+        filename = f"jimeng_{timestamp}_{uuid.uuid4().hex[:6]}.jpg"
+        output_path = os.path.abspath(os.path.join(output_dir, filename))
+        return output_path, filename
+
+    def generate_image(self, prompt, output_dir, session_id=None, project_name=None):
         """生成图片"""
         print(f"[{datetime.now().strftime('%H:%M:%S')}] 🎨 即梦生成: {prompt[:50]}...")
 
@@ -126,28 +169,45 @@ class ImageGenService:
             print("❌ 图片生成服务未配置")
             return None
 
-        # 确保输出目录存在
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        # 构造输出文件名
-        timestamp = int(time.time())
-        filename = f"jimeng_{timestamp}.jpg"
-        output_path = os.path.abspath(os.path.join(output_dir, filename))
+        output_path, filename = self._new_output(output_dir)
+        project_name = project_name or os.path.basename(output_dir)
 
         if self.mode == "direct":
             return self._generate_direct(
-                prompt, output_path, filename, session_id, output_dir
+                prompt, output_path, filename, session_id, project_name
             )
         elif self.mode == "http":
             return self._generate_http(
-                prompt, output_path, filename, session_id, output_dir
+                prompt, output_path, filename, session_id, project_name
             )
         else:
             return None
 
+    async def generate_image_async(
+        self, prompt, output_dir, session_id=None, project_name=None
+    ):
+        """异步生成图片：即梦轮询、下载与上传均不占用线程"""
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] 🎨 即梦生成(async): {prompt[:50]}...")
+
+        if self.mode == "disabled":
+            print("❌ 图片生成服务未配置")
+            return None
+
+        output_path, filename = self._new_output(output_dir)
+        project_name = project_name or os.path.basename(output_dir)
+
+        if self.mode == "direct":
+            return await self._generate_direct_async(
+                prompt, output_path, filename, session_id, project_name
+            )
+        elif self.mode == "http":
+            return await self._generate_http_async(
+                prompt, output_path, filename, session_id, project_name
+            )
+        return None
+
     def _generate_direct(
-        self, prompt, output_path, filename, session_id=None, output_dir=None
+        self, prompt, output_path, filename, session_id=None, project_name=None
     ):
         """直接调用即梦模块"""
         try:
@@ -155,21 +215,25 @@ class ImageGenService:
             if self.jimeng_path and self.jimeng_path not in sys.path:
                 sys.path.insert(0, self.jimeng_path)
 
+            from jimeng.core import get_session
             from jimeng.images import generate_images as jimeng_generate
-
-            token = session_id or self.jimeng_token
-            print(f"[DEBUG] 使用 Token: {token[:10]}...")
-
-            # 调用即梦生成图片
-            image_urls = jimeng_generate(
-                model="jimeng-2.1",
-                prompt=prompt,
-                width=1024,
-                height=1024,
-                sample_strength=0.5,
-                negative_prompt="",
-                refresh_token=token,
-            )
+            from jimeng.token_pool import get_token_pool
+
+            def run(token):
+                print(f"[DEBUG] 使用 Token: {token[:10]}...")
+                return jimeng_generate(
+                    model="jimeng-2.1",
+                    prompt=prompt,
+                    width=1024,
+                    height=1024,
+                    sample_strength=0.5,
+                    negative_prompt="",
+                    refresh_token=token,
+                )
+
+            # 调用即梦生成图片：指定 session_id 时直接使用，否则由 token 池分配账号
+            pool = get_token_pool()
+            image_urls = run(session_id) if session_id or pool is None else pool.call(run)
 
             print(f"[DEBUG] 获取 {len(image_urls)} 个 URL")
 
@@ -178,16 +242,14 @@ class ImageGenService:
                 url = image_urls[0]
                 print(f"[DEBUG] 下载: {url[:80]}...")
 
-                response = requests.get(url, timeout=60)
+                # 与即梦 API 共用 keep-alive 连接池，CDN 下载不再每张图重新握手
+                response = get_session().get(url, timeout=60)
                 if response.status_code == 200:
                     with open(output_path, "wb") as f:
                         f.write(response.content)
                     print(f"✅ 已保存本地: {output_path}")
 
                     # 上传到 Supabase Storage
-                    project_name = (
-                        os.path.basename(output_dir) if output_dir else "unknown"
-                    )
                     storage_url = self.upload_to_supabase(
                         output_path, project_name, filename
                     )
@@ -207,7 +269,7 @@ class ImageGenService:
             print(f"[DEBUG] 尝试 HTTP 模式...")
             self.mode = "http"
             return self._generate_http(
-                prompt, output_path, filename, session_id, output_dir
+                prompt, output_path, filename, session_id, project_name
             )
 
         except Exception as e:
@@ -218,7 +280,7 @@ class ImageGenService:
             return None
 
     def _generate_http(
-        self, prompt, output_path, filename, session_id=None, output_dir=None
+        self, prompt, output_path, filename, session_id=None, project_name=None
     ):
         """HTTP 模式调用图片生成服务"""
         http_url = os.getenv("IMAGE_GEN_SERVER_URL", "").strip()
@@ -255,9 +317,6 @@ class ImageGenService:
                         print(f"✅ 已保存本地: {output_path}")
 
                         # 上传到 Supabase Storage
-                        project_name = (
-                            os.path.basename(output_dir) if output_dir else "unknown"
-                        )
                         storage_url = self.upload_to_supabase(
                             output_path, project_name, filename
                         )
@@ -278,3 +337,111 @@ class ImageGenService:
         except Exception as e:
             print(f"❌ HTTP 调用失败: {e}")
             return None
+
+    async def _generate_direct_async(
+        self, prompt, output_path, filename, session_id=None, project_name=None
+    ):
+        """异步直接调用即梦模块"""
+        try:
+            if self.jimeng_path and self.jimeng_path not in sys.path:
+                sys.path.insert(0, self.jimeng_path)
+
+            from jimeng.core import get_async_client
+            from jimeng.images import generate_images_async as jimeng_generate_async
+            from jimeng.token_pool import get_token_pool
+
+            def run(token):
+                return jimeng_generate_async(
+                    model="jimeng-2.1",
+                    prompt=prompt,
+                    width=1024,
+                    height=1024,
+                    sample_strength=0.5,
+                    negative_prompt="",
+                    refresh_token=token,
+                )
+
+            pool = get_token_pool()
+            if session_id or pool is None:
+                image_urls = await run(session_id)
+            else:
+                image_urls = await pool.call_async(run)
+
+            if not image_urls:
+                return None
+
+            response = await get_async_client().get(image_urls[0], timeout=60)
+            if response.status_code != 200:
+                print(f"❌ 下载失败: {response.status_code}")
+                return None
+
+            storage_url = await self.upload_to_supabase_async(
+                response.content, project_name, filename
+            )
+            if storage_url:
+                return storage_url
+
+            print(f"❌ 上传 Supabase 失败，且当前模式要求必须使用云端存储")
+            return None
+
+        except ImportError as e:
+            print(f"❌ 导入失败: {e}")
+            self.mode = "http"
+            return await self._generate_http_async(
+                prompt, output_path, filename, session_id, project_name
+            )
+
+        except Exception as e:
+            print(f"❌ 调用失败: {type(e).__name__}: {e}")
+            return None
+
+    async def _generate_http_async(
+        self, prompt, output_path, filename, session_id=None, project_name=None
+    ):
+        """异步 HTTP 模式调用图片生成服务"""
+        http_url = os.getenv("IMAGE_GEN_SERVER_URL", "").strip()
+        if not http_url:
+            print("❌ IMAGE_GEN_SERVER_URL 未配置")
+            return None
+
+        try:
+            payload = {
+                "prompt": prompt,
+                "file_name": filename,
+                "save_folder": self.temp_dir,
+            }
+
+            async with httpx.AsyncClient(timeout=120) as client:
+                response = await client.post(f"{http_url}/generate", json=payload)
+
+            if response.status_code == 200:
+                result = response.json()
+                if result.get("success") and result.get("images"):
+                    # HTTP 服务返回的是本地路径
+                    src_path = result["images"][0]
+                    if os.path.exists(src_path):
+                        file_data = await asyncio.to_thread(_read_bytes, src_path)
+                        storage_url = await self.upload_to_supabase_async(
+                            file_data, project_name, filename
+                        )
+                        if storage_url:
+                            return storage_url
+
+                        print(f"❌ 上传 Supabase 失败，且当前模式要求必须使用云端存储")
+                        return None
+
+            print(f"❌ 生成失败: {response.text[:200]}")
+            return None
+
+        except httpx.TimeoutException:
+            print("❌ HTTP 请求超时")
+            return None
+
+        except Exception as e:
+            print(f"❌ HTTP 调用失败: {e}")
+            return None
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
@@ -4,13 +4,26 @@
 提供即梦AI的图像生成功能，支持多账号token。
 """
 
-from .images import generate_images
+from .images import (
+    GenerationJob,
+    generate_images,
+    generate_images_async,
+    submit_generation,
+    submit_generation_async,
+)
 from .chat import create_completion, create_completion_stream
+from .token_pool import TokenPool, get_token_pool
 
 __version__ = "0.0.1"
 
 __all__ = [
+    "GenerationJob",
     "generate_images",
+    "generate_images_async",
+    "submit_generation",
+    "submit_generation_async",
+    "TokenPool",
+    "get_token_pool",
     "create_completion",
     "create_completion_stream"
 ] 
\ No newline at end of file
@@ -6,12 +6,12 @@
 """对话补全相关功能"""
 
 import re
-import time
+import asyncio
 from typing import Dict, List, Optional, Union, Generator
 import random
 
 from . import utils
-from .images import generate_images, DEFAULT_MODEL
+from .images import generate_images_async, DEFAULT_MODEL
 from .exceptions import API_REQUEST_PARAMS_INVALID
 
 MAX_RETRY_COUNT = 3
@@ -55,7 +55,7 @@ async def create_completion(
     model: str = DEFAULT_MODEL,
     retry_count: int = 0
 ) -> Dict:
-    """同步对话补全
+    """对话补全（非流式），等待出图与重试都不阻塞事件循环
     
     Args:
         messages: 消息列表
@@ -77,7 +77,7 @@ async def create_completion(
         model_info = parse_model(model)
         
         # 生成图像
-        image_urls = generate_images(
+        image_urls = await generate_images_async(
             model=model_info['model'],
             prompt=messages[-1]['content'],
             width=model_info['width'],
@@ -109,7 +109,7 @@ async def create_completion(
         if retry_count < MAX_RETRY_COUNT:
             print(f"Response error: {str(e)}")
             print(f"Try again after {RETRY_DELAY / 1000}s...")
-            time.sleep(RETRY_DELAY / 1000)
+            await asyncio.sleep(RETRY_DELAY / 1000)
             return await create_completion(messages, refresh_token, model, retry_count + 1)
         raise e
 
@@ -161,7 +161,7 @@ async def create_completion_stream(
         
         try:
             # 生成图像
-            image_urls = generate_images(
+            image_urls = await generate_images_async(
                 model=model_info['model'],
                 prompt=messages[-1]['content'],
                 width=model_info['width'],
@@ -219,7 +219,7 @@ async def create_completion_stream(
         if retry_count < MAX_RETRY_COUNT:
             print(f"Response error: {str(e)}")
             print(f"Try again after {RETRY_DELAY / 1000}s...")
-            time.sleep(RETRY_DELAY / 1000)
+            await asyncio.sleep(RETRY_DELAY / 1000)
             async for chunk in create_completion_stream(messages, refresh_token, model, retry_count + 1):
                 yield chunk
             return
@@ -5,13 +5,23 @@
 
 """核心功能实现"""
 
+import asyncio
 import json
-from typing import Any, Dict, Optional, Union
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict, Optional, Tuple, Union
 import requests
+from requests.adapters import HTTPAdapter
+import httpx
 import logging
 
 from . import utils
-from .exceptions import API_REQUEST_FAILED, API_IMAGE_GENERATION_INSUFFICIENT_POINTS
+from .exceptions import (
+    API_REQUEST_FAILED,
+    API_IMAGE_GENERATION_INSUFFICIENT_POINTS,
+    API_TOKEN_EXPIRES,
+)
 
 import gzip
 import brotli
@@ -19,6 +29,8 @@ import json
 from io import BytesIO
 
 # 常量定义
+# 即梦服务地址，可通过 JIMENG_BASE_URL 指向本地模拟器（scripts/jimeng_simulator.py）做压测
+BASE_URL = os.getenv("JIMENG_BASE_URL", "https://jimeng.jianying.com").rstrip("/")
 MODEL_NAME = "jimeng"
 DEFAULT_ASSISTANT_ID = "513695"
 VERSION_CODE = "5.8.0"
@@ -29,6 +41,12 @@ USER_ID = utils.generate_uuid(False)
 MAX_RETRY_COUNT = 3
 RETRY_DELAY = 5000
 FILE_MAX_SIZE = 100 * 1024 * 1024
+# 登录失效（sessionid 过期或被踢下线）
+RET_TOKEN_EXPIRED = "34010105"
+# 连接池：每个域名最多保持的连接数（超出时等待空闲连接而不是新建）
+POOL_MAXSIZE = int(os.getenv("JIMENG_POOL_MAXSIZE", "32"))
+# 池中保留连接的域名数（即梦 API + 图片 CDN）
+POOL_HOSTS = int(os.getenv("JIMENG_POOL_HOSTS", "8"))
 
 # 请求头
 FAKE_HEADERS = {
@@ -91,6 +109,7 @@ def check_result(response: requests.Response) -> Dict[str, Any]:
 
     Raises:
         API_IMAGE_GENERATION_INSUFFICIENT_POINTS: 积分不足
+        API_TOKEN_EXPIRES: 登录失效
         API_REQUEST_FAILED: 请求失败
     """
     result = response.json()
@@ -105,31 +124,28 @@ def check_result(response: requests.Response) -> Dict[str, Any]:
     if ret == '5000':
         raise API_IMAGE_GENERATION_INSUFFICIENT_POINTS(f"即梦积分可能不足，{errmsg}")
 
+    if ret == RET_TOKEN_EXPIRED:
+        raise API_TOKEN_EXPIRES(f"即梦登录已失效，{errmsg}")
+
     raise API_REQUEST_FAILED(f"请求jimeng失败: {errmsg}")
 
 
-def request(
-    method: str,
+def _prepare_request(
     uri: str,
     refresh_token: str,
     params: Optional[Dict] = None,
-    data: Optional[Dict] = None,
-    headers: Optional[Dict] = None,
-    **kwargs
-) -> Dict[str, Any]:
-    """请求即梦API
+    headers: Optional[Dict] = None
+) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """构造签名后的请求头与URL参数
 
     Args:
-        method: 请求方法
         uri: 请求路径
         refresh_token: 刷新token
         params: URL参数
-        data: 请求数据
         headers: 请求头
-        **kwargs: 其他参数
 
     Returns:
-        Dict: 响应数据
+        Tuple: (请求头, URL参数)
     """
     token = acquire_token(refresh_token)
     device_time = utils.get_timestamp()
@@ -154,9 +170,61 @@ def request(
     if params:
         _params.update(params)
 
-    response = requests.request(
+    return _headers, _params
+
+
+def _unwrap_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """解析即梦统一响应结构
+
+    Raises:
+        API_IMAGE_GENERATION_INSUFFICIENT_POINTS: 积分不足
+        API_TOKEN_EXPIRES: 登录失效
+        API_REQUEST_FAILED: 请求失败
+    """
+    ret = result.get('ret')
+    if ret is None:
+        return result
+
+    if str(ret) == '0':
+        return result.get('data', {})
+
+    if str(ret) == '5000':
+        raise API_IMAGE_GENERATION_INSUFFICIENT_POINTS(f"[无法生成图像]: 即梦积分可能不足，{result.get('errmsg')}")
+
+    if str(ret) == RET_TOKEN_EXPIRED:
+        raise API_TOKEN_EXPIRES(f"[登录失效]: {result.get('errmsg')}")
+
+    raise API_REQUEST_FAILED(f"[请求jimeng失败]: {result.get('errmsg')}")
+
+
+def request(
+    method: str,
+    uri: str,
+    refresh_token: str,
+    params: Optional[Dict] = None,
+    data: Optional[Dict] = None,
+    headers: Optional[Dict] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """请求即梦API
+
+    Args:
+        method: 请求方法
+        uri: 请求路径
+        refresh_token: 刷新token
+        params: URL参数
+        data: 请求数据
+        headers: 请求头
+        **kwargs: 其他参数
+
+    Returns:
+        Dict: 响应数据
+    """
+    _headers, _params = _prepare_request(uri, refresh_token, params, headers)
+
+    response = get_session().request(
         method=method.lower(),
-        url=f"https://jimeng.jianying.com{uri}",
+        url=f"{BASE_URL}{uri}",
         params=_params,
         json=data,
         headers=_headers,
@@ -167,8 +235,6 @@ def request(
 
     # 检查响应
     try:
-        logging.debug(f'请求uri:{uri},响应状态:{response.status_code}')
-        # 检查Content-Encoding
         logging.debug(f'请求uri:{uri},响应状态:{response.status_code}')
         # 检查Content-Encoding并解压
         try:
@@ -178,22 +244,144 @@ def request(
             logging.debug(f'解压失败,使用原始响应: {str(e)}')
             content = response.text
             logging.debug(f'响应结果:{content}')
-        # result = response.json()
         result = json.loads(content)
     except:
         raise API_REQUEST_FAILED("响应格式错误")
 
-    ret = result.get('ret')
-    if ret is None:
-        return result
+    return _unwrap_result(result)
 
-    if str(ret) == '0':
-        return result.get('data', {})
 
-    if str(ret) == '5000':
-        raise API_IMAGE_GENERATION_INSUFFICIENT_POINTS(f"[无法生成图像]: 即梦积分可能不足，{result.get('errmsg')}")
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
 
-    raise API_REQUEST_FAILED(f"[请求jimeng失败]: {result.get('errmsg')}")
+
+def get_session() -> requests.Session:
+    """获取共享的同步HTTP会话（懒加载，跨线程、跨token复用 keep-alive 连接）
+
+    - 每个域名一个连接池，最多 POOL_MAXSIZE 个连接，用满时阻塞等待
+    - 不保存响应里的 Cookie：身份只由每次请求的 Cookie 头决定，多个 token 共用会话也不会串号
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(
+                    pool_connections=POOL_HOSTS,
+                    pool_maxsize=POOL_MAXSIZE,
+                    pool_block=True,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def pool_stats() -> Dict[str, Any]:
+    """同步连接池的复用统计：新建连接数越接近域名数，握手开销越小"""
+    if _session is None:
+        return {"requests": 0, "connections": 0, "reuse_rate": 0.0, "hosts": {}}
+    hosts = {}
+    for adapter in {id(a): a for a in _session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "idle": pool.pool.qsize() if pool.pool is not None else 0,
+            }
+    requests_count = sum(h["requests"] for h in hosts.values())
+    connections = sum(h["connections"] for h in hosts.values())
+    return {
+        "requests": requests_count,
+        "connections": connections,
+        "reuse_rate": round(1 - connections / requests_count, 4) if requests_count else 0.0,
+        "max_per_host": POOL_MAXSIZE,
+        "hosts": hosts,
+    }
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# 每个事件循环一个异步客户端：httpx 的连接绑定在创建它的事件循环上，不能跨循环复用
+_async_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+
+async def _close_with_loop(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+    """挂起到事件循环退出：asyncio.run / uvicorn 关闭时会取消剩余任务，借此关闭该循环的客户端"""
+    try:
+        await loop.create_future()
+    finally:
+        entry = _async_clients.get(id(loop))
+        if entry is not None and entry[1] is client:
+            del _async_clients[id(loop)]
+        await client.aclose()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的异步HTTP客户端（懒加载，复用连接；安装了 h2 时启用 HTTP/2 多路复用）"""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(id(loop))
+    if entry is None or entry[0] is not loop or entry[1].is_closed:
+        # 清理未经 asyncio.run 正常退出就被关闭的循环
+        for key, (old_loop, _) in list(_async_clients.items()):
+            if old_loop.is_closed():
+                del _async_clients[key]
+        client = httpx.AsyncClient(
+            timeout=15,
+            verify=True,
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=POOL_MAXSIZE * POOL_HOSTS,
+                max_keepalive_connections=POOL_MAXSIZE,
+            ),
+        )
+        entry = _async_clients[id(loop)] = (loop, client)
+        loop.create_task(_close_with_loop(loop, client))
+    return entry[1]
+
+
+async def async_request(
+    method: str,
+    uri: str,
+    refresh_token: str,
+    params: Optional[Dict] = None,
+    data: Optional[Dict] = None,
+    headers: Optional[Dict] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    """异步请求即梦API，参数与返回值同 request
+
+    httpx 会按 Content-Encoding 自动解压 gzip/br 响应。
+    """
+    _headers, _params = _prepare_request(uri, refresh_token, params, headers)
+
+    response = await get_async_client().request(
+        method.upper(),
+        f"{BASE_URL}{uri}",
+        params=_params,
+        json=data,
+        headers=_headers,
+        **kwargs
+    )
+
+    try:
+        logging.debug(f'请求uri:{uri},响应状态:{response.status_code}')
+        result = json.loads(response.text)
+    except:
+        raise API_REQUEST_FAILED("响应格式错误")
+
+    return _unwrap_result(result)
 
 
 def decompress_response(response: requests.Response) -> str:
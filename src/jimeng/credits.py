@@ -0,0 +1,237 @@
+"""token 积分缓存
+
+生成前不再每张图都同步查询一次积分：
+- 每个 token 的余额缓存 CREDIT_TTL 秒，提交成功后在本地乐观扣减
+- 余额不足时每天最多领取一次每日积分；收到积分不足错误（ret=5000）立即作废缓存
+- 后台线程定期刷新已知 token 的余额，并为每个 token 每天领取一次每日积分
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# 缓存的余额多久后重新查询（秒）
+CREDIT_TTL = float(os.getenv("JIMENG_CREDIT_TTL", "300"))
+# 后台刷新间隔（秒），0 关闭后台刷新
+CREDIT_REFRESH_SECONDS = float(os.getenv("JIMENG_CREDIT_REFRESH_SECONDS", "600"))
+# 每次生成消耗的积分（用于本地乐观扣减）
+CREDIT_COST = int(os.getenv("JIMENG_CREDIT_COST", "1"))
+
+
+def _today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+class _Entry:
+    __slots__ = ("balance", "fetched_at", "received_day", "lock")
+
+    def __init__(self):
+        self.balance: Optional[int] = None
+        self.fetched_at = 0.0
+        self.received_day: Optional[str] = None
+        self.lock = threading.Lock()
+
+
+class CreditCache:
+    """按 token 缓存即梦积分余额（线程与协程共用同一份状态）"""
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Dict[str, int]],
+        receive: Callable[[str], None],
+        fetch_async: Callable[[str], Awaitable[Dict[str, int]]] = None,
+        receive_async: Callable[[str], Awaitable[None]] = None,
+        ttl: float = None,
+        refresh_interval: float = None,
+        cost: int = None,
+    ):
+        self._fetch = fetch
+        self._receive = receive
+        self._fetch_async = fetch_async
+        self._receive_async = receive_async
+        self.ttl = CREDIT_TTL if ttl is None else ttl
+        self.refresh_interval = (
+            CREDIT_REFRESH_SECONDS if refresh_interval is None else refresh_interval
+        )
+        self.cost = CREDIT_COST if cost is None else cost
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.fetches = 0
+        self.receives = 0
+        self.invalidations = 0
+
+    def _entry(self, token: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                entry = self._entries[token] = _Entry()
+            return entry
+
+    def _fresh(self, entry: _Entry) -> bool:
+        return (
+            entry.balance is not None
+            and entry.balance > 0
+            and time.time() - entry.fetched_at < self.ttl
+        )
+
+    def _store(self, entry: _Entry, credit: Dict[str, int]):
+        entry.balance = int(credit.get("totalCredit", 0))
+        entry.fetched_at = time.time()
+        self.fetches += 1
+
+    def _should_receive(self, entry: _Entry) -> bool:
+        return entry.balance is not None and entry.balance <= 0 and entry.received_day != _today()
+
+    def _received(self, entry: _Entry):
+        # 领取后余额未知，下次使用时重新查询
+        entry.received_day = _today()
+        entry.fetched_at = 0.0
+        self.receives += 1
+
+    def ensure(self, token: str) -> Optional[int]:
+        """生成前检查积分：缓存有效时直接返回，否则查询（余额为 0 时领取每日积分）"""
+        self._start_refresher()
+        entry = self._entry(token)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry.balance
+        with entry.lock:
+            if self._fresh(entry):
+                self.hits += 1
+                return entry.balance
+            self._store(entry, self._fetch(token))
+            if self._should_receive(entry):
+                self._receive(token)
+                self._received(entry)
+            return entry.balance
+
+    async def ensure_async(self, token: str) -> Optional[int]:
+        """ensure 的异步版本：同一事件循环内同一 token 的并发查询合并为一次"""
+        self._start_refresher()
+        entry = self._entry(token)
+        if self._fresh(entry):
+            self.hits += 1
+            return entry.balance
+        loop = asyncio.get_running_loop()
+        key = (id(loop), token)
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = self._inflight[key] = loop.create_task(self._refresh_async(token, entry))
+            task.add_done_callback(
+                lambda t: self._inflight.pop(key) if self._inflight.get(key) is t else None
+            )
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    async def _refresh_async(self, token: str, entry: _Entry) -> Optional[int]:
+        self._store(entry, await self._fetch_async(token))
+        if self._should_receive(entry):
+            await self._receive_async(token)
+            self._received(entry)
+        return entry.balance
+
+    def peek(self, token: str) -> Optional[int]:
+        """只读缓存中的余额，不触发查询（未知时返回 None）"""
+        with self._lock:
+            entry = self._entries.get(token)
+        return entry.balance if entry is not None else None
+
+    def consume(self, token: str, amount: int = None):
+        """提交成功后本地扣减，余额耗尽时下次使用会重新查询"""
+        entry = self._entry(token)
+        with self._lock:
+            if entry.balance is not None:
+                entry.balance -= self.cost if amount is None else amount
+
+    def invalidate(self, token: str):
+        """收到积分不足错误时作废缓存，下次使用重新查询"""
+        entry = self._entry(token)
+        entry.balance = None
+        entry.fetched_at = 0.0
+        self.invalidations += 1
+
+    # ---- 后台刷新 ----
+
+    def _start_refresher(self):
+        if self._refresher is not None or self.refresh_interval <= 0:
+            return
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(
+                    target=self._refresh_loop, name="jimeng-credits", daemon=True
+                )
+                self._refresher.start()
+
+    def refresh_all(self):
+        """刷新所有已知 token 的余额，并为当天尚未领取的 token 领取每日积分"""
+        with self._lock:
+            tokens = list(self._entries.items())
+        for token, entry in tokens:
+            try:
+                with entry.lock:
+                    if entry.received_day != _today():
+                        self._receive(token)
+                        entry.received_day = _today()
+                        self.receives += 1
+                    self._store(entry, self._fetch(token))
+            except Exception as e:
+                logging.warning(f"刷新即梦积分失败 ({token[:6]}...): {e}")
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh_all()
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tokens = {
+                f"{token[:6]}...": {
+                    "balance": entry.balance,
+                    "age": round(time.time() - entry.fetched_at, 1) if entry.fetched_at else None,
+                    "received_today": entry.received_day == _today(),
+                }
+                for token, entry in self._entries.items()
+            }
+        lookups = self.hits + self.fetches
+        return {
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "receives": self.receives,
+            "invalidations": self.invalidations,
+            "ttl": self.ttl,
+            "tokens": tokens,
+        }
+
+
+_credit_cache: Optional[CreditCache] = None
+_credit_cache_lock = threading.Lock()
+
+
+def get_credit_cache() -> CreditCache:
+    """进程内共享的积分缓存"""
+    global _credit_cache
+    if _credit_cache is None:
+        with _credit_cache_lock:
+            if _credit_cache is None:
+                from .images import (
+                    get_credit,
+                    get_credit_async,
+                    receive_credit,
+                    receive_credit_async,
+                )
+
+                _credit_cache = CreditCache(
+                    get_credit, receive_credit, get_credit_async, receive_credit_async
+                )
+    return _credit_cache
@@ -10,8 +10,14 @@ from typing import Dict, List, Optional, Union
 import random
 
 from . import utils
-from .core import request, DEFAULT_ASSISTANT_ID
-from .exceptions import API_IMAGE_GENERATION_FAILED, API_CONTENT_FILTERED
+from .core import request, async_request, DEFAULT_ASSISTANT_ID
+from .poller import get_poller, get_async_poller
+from .credits import get_credit_cache
+from .exceptions import (
+    API_IMAGE_GENERATION_FAILED,
+    API_CONTENT_FILTERED,
+    API_IMAGE_GENERATION_INSUFFICIENT_POINTS,
+)
 
 # 默认模型
 DEFAULT_MODEL = "jimeng-2.1"
@@ -86,186 +92,332 @@ def receive_credit(refresh_token: str) -> None:
         }
     )
 
-def generate_images(
-    model: str,
+def _build_generate_params(_model: str) -> Dict:
+    """构造生成请求的 URL 参数"""
+    return {
+        "babi_param": utils.url_encode(utils.json_encode({
+            "scenario": "image_video_generation",
+            "feature_key": "aigc_to_image",
+            "feature_entrance": "to_image",
+            "feature_entrance_detail": f"to_image-{_model}",
+        }))
+    }
+
+def _build_generate_data(
+    _model: str,
     prompt: str,
-    width: int = 1024,
-    height: int = 1024,
-    sample_strength: float = 0.5,
-    negative_prompt: str = "",
-    refresh_token: str = None
-) -> List[str]:
-    """生成图像
+    width: int,
+    height: int,
+    sample_strength: float,
+    negative_prompt: str
+) -> Dict:
+    """构造生成请求的请求体
     
     Args:
-        model: 模型名称
+        _model: 映射后的模型名称
         prompt: 提示词
         width: 图像宽度
         height: 图像高度
         sample_strength: 精细度
         negative_prompt: 反向提示词
-        refresh_token: 刷新token
         
     Returns:
-        List[str]: 图像URL列表
-        
-    Raises:
-        API_IMAGE_GENERATION_FAILED: 图像生成失败
-        API_CONTENT_FILTERED: 内容被过滤
+        Dict: 请求体
     """
-    # 参数验证
-    if not prompt or not isinstance(prompt, str):
-        raise ValueError("prompt must be a non-empty string")
-    if not refresh_token:
-        raise ValueError("refresh_token is required")
-        
-    # 获取实际模型
-    _model = get_model(model)
-    
-    # 检查积分
-    credit_info = get_credit(refresh_token)
-    if credit_info.get('totalCredit', 0) <= 0:
-        receive_credit(refresh_token)
-        
     # 生成组件ID
     component_id = utils.generate_uuid()
     
-    # 发送生成请求
-    result = request(
-        "post",
-        "/mweb/v1/aigc_draft/generate",
-        refresh_token,
-        params={
-            "babi_param": utils.url_encode(utils.json_encode({
-                "scenario": "image_video_generation",
-                "feature_key": "aigc_to_image",
-                "feature_entrance": "to_image",
-                "feature_entrance_detail": f"to_image-{_model}",
-            }))
+    return {
+        "extend": {
+            "root_model": _model,
+            "template_id": "",
         },
-        data={
-            "extend": {
-                "root_model": _model,
-                "template_id": "",
-            },
-            "submit_id": utils.generate_uuid(),
-            "metrics_extra": utils.json_encode({
-                "templateId": "",
-                "generateCount": 1,
-                "promptSource": "custom",
-                "templateSource": "",
-                "lastRequestId": "",
-                "originRequestId": "",
-            }),
-            "draft_content": utils.json_encode({
-                "type": "draft",
-                "id": utils.generate_uuid(),
+        "submit_id": utils.generate_uuid(),
+        "metrics_extra": utils.json_encode({
+            "templateId": "",
+            "generateCount": 1,
+            "promptSource": "custom",
+            "templateSource": "",
+            "lastRequestId": "",
+            "originRequestId": "",
+        }),
+        "draft_content": utils.json_encode({
+            "type": "draft",
+            "id": utils.generate_uuid(),
+            "min_version": DRAFT_VERSION,
+            "is_from_tsn": True,
+            "version": DRAFT_VERSION,
+            "main_component_id": component_id,
+            "component_list": [{
+                "type": "image_base_component",
+                "id": component_id,
                 "min_version": DRAFT_VERSION,
-                "is_from_tsn": True,
-                "version": DRAFT_VERSION,
-                "main_component_id": component_id,
-                "component_list": [{
-                    "type": "image_base_component",
-                    "id": component_id,
-                    "min_version": DRAFT_VERSION,
-                    "generate_type": "generate",
-                    "aigc_mode": "workbench",
-                    "abilities": {
+                "generate_type": "generate",
+                "aigc_mode": "workbench",
+                "abilities": {
+                    "type": "",
+                    "id": utils.generate_uuid(),
+                    "generate": {
                         "type": "",
                         "id": utils.generate_uuid(),
-                        "generate": {
+                        "core_param": {
                             "type": "",
                             "id": utils.generate_uuid(),
-                            "core_param": {
-                                "type": "",
-                                "id": utils.generate_uuid(),
-                                "model": _model,
-                                "prompt": prompt,
-                                "negative_prompt": negative_prompt,
-                                "seed": int(random.random() * 100000000) + 2500000000,
-                                "sample_strength": sample_strength,
-                                "image_ratio": 1,
-                                "large_image_info": {
-                                    "type": "",
-                                    "id": utils.generate_uuid(),
-                                    "height": height,
-                                    "width": width,
-                                }
-                            },
-                            "history_option": {
+                            "model": _model,
+                            "prompt": prompt,
+                            "negative_prompt": negative_prompt,
+                            "seed": int(random.random() * 100000000) + 2500000000,
+                            "sample_strength": sample_strength,
+                            "image_ratio": 1,
+                            "large_image_info": {
                                 "type": "",
                                 "id": utils.generate_uuid(),
+                                "height": height,
+                                "width": width,
                             }
+                        },
+                        "history_option": {
+                            "type": "",
+                            "id": utils.generate_uuid(),
                         }
                     }
-                }]
-            }),
-            "http_common_info": {
-                "aid": int(DEFAULT_ASSISTANT_ID)
-            }
+                }
+            }]
+        }),
+        "http_common_info": {
+            "aid": int(DEFAULT_ASSISTANT_ID)
         }
-    )
+    }
+
+def _extract_image_urls(record: Dict) -> List[str]:
+    """从已完成的历史记录中提取图片URL
     
-    # 获取历史记录ID
+    Raises:
+        API_IMAGE_GENERATION_FAILED: 图像生成失败
+        API_CONTENT_FILTERED: 内容被过滤
+    """
+    if record.get('status') == 30:
+        if record.get('fail_code') == '2038':
+            raise API_CONTENT_FILTERED()
+        raise API_IMAGE_GENERATION_FAILED()
+        
+    # 提取图片URL
+    return [
+        item.get('image', {}).get('large_images', [{}])[0].get('image_url') or 
+        item.get('common_attr', {}).get('cover_url')
+        for item in record.get('item_list', [])
+        if item
+    ]
+
+class GenerationJob:
+    """已提交的生成任务句柄
+    
+    result() 在线程中阻塞等待；collect()（或直接 await 句柄）在事件循环中等待，
+    不占用线程。两者都由集中轮询器合并查询。
+    """
+
+    def __init__(self, history_id: str, refresh_token: str, model: str, prompt: str):
+        self.history_id = history_id
+        self.refresh_token = refresh_token
+        self.model = model
+        self.prompt = prompt
+        self.submitted_at = time.time()
+
+    def result(self, timeout: Optional[float] = None) -> List[str]:
+        """阻塞等待生成完成，返回图像URL列表
+        
+        Raises:
+            API_IMAGE_GENERATION_FAILED: 图像生成失败
+            API_CONTENT_FILTERED: 内容被过滤
+        """
+        future = get_poller().submit(self.history_id, self.refresh_token)
+        return _extract_image_urls(future.result(timeout))
+
+    async def collect(self) -> List[str]:
+        """异步等待生成完成，返回图像URL列表（异常同 result）"""
+        record = await get_async_poller().wait(self.history_id, self.refresh_token)
+        return _extract_image_urls(record)
+
+    def __await__(self):
+        return self.collect().__await__()
+
+    def __repr__(self):
+        return f"GenerationJob(history_id={self.history_id!r}, model={self.model!r})"
+
+def _validate(prompt: str, refresh_token: str) -> None:
+    if not prompt or not isinstance(prompt, str):
+        raise ValueError("prompt must be a non-empty string")
+    if not refresh_token:
+        raise ValueError("refresh_token is required")
+
+def _history_id(result: Dict) -> str:
     history_id = result.get('aigc_data', {}).get('history_record_id')
     if not history_id:
         raise API_IMAGE_GENERATION_FAILED("记录ID不存在")
+    return history_id
+
+def submit_generation(
+    model: str,
+    prompt: str,
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.5,
+    negative_prompt: str = "",
+    refresh_token: str = None
+) -> GenerationJob:
+    """提交生成任务（检查缓存的积分 + 提交草稿），立即返回任务句柄，不等待出图
+    
+    Args:
+        model: 模型名称
+        prompt: 提示词
+        width: 图像宽度
+        height: 图像高度
+        sample_strength: 精细度
+        negative_prompt: 反向提示词
+        refresh_token: 刷新token
         
-    # 轮询获取结果
-    status = 20
-    fail_code = None
-    item_list = []
+    Returns:
+        GenerationJob: 任务句柄
+    """
+    _validate(prompt, refresh_token)
+        
+    # 获取实际模型
+    _model = get_model(model)
     
-    while status == 20:
-        time.sleep(1)
+    # 检查积分（按 token 缓存，余额充足时不发请求）
+    credits = get_credit_cache()
+    credits.ensure(refresh_token)
+        
+    # 发送生成请求
+    try:
         result = request(
             "post",
-            "/mweb/v1/get_history_by_ids",
+            "/mweb/v1/aigc_draft/generate",
             refresh_token,
-            data={
-                "history_ids": [history_id],
-                "image_info": {
-                    "width": 2048,
-                    "height": 2048,
-                    "format": "webp",
-                    "image_scene_list": [
-                        {"scene": "smart_crop", "width": 360, "height": 360, "uniq_key": "smart_crop-w:360-h:360", "format": "webp"},
-                        {"scene": "smart_crop", "width": 480, "height": 480, "uniq_key": "smart_crop-w:480-h:480", "format": "webp"},
-                        {"scene": "smart_crop", "width": 720, "height": 720, "uniq_key": "smart_crop-w:720-h:720", "format": "webp"},
-                        {"scene": "smart_crop", "width": 720, "height": 480, "uniq_key": "smart_crop-w:720-h:480", "format": "webp"},
-                        {"scene": "smart_crop", "width": 360, "height": 240, "uniq_key": "smart_crop-w:360-h:240", "format": "webp"},
-                        {"scene": "smart_crop", "width": 240, "height": 320, "uniq_key": "smart_crop-w:240-h:320", "format": "webp"},
-                        {"scene": "smart_crop", "width": 480, "height": 640, "uniq_key": "smart_crop-w:480-h:640", "format": "webp"},
-                        {"scene": "normal", "width": 2400, "height": 2400, "uniq_key": "2400", "format": "webp"},
-                        {"scene": "normal", "width": 1080, "height": 1080, "uniq_key": "1080", "format": "webp"},
-                        {"scene": "normal", "width": 720, "height": 720, "uniq_key": "720", "format": "webp"},
-                        {"scene": "normal", "width": 480, "height": 480, "uniq_key": "480", "format": "webp"},
-                        {"scene": "normal", "width": 360, "height": 360, "uniq_key": "360", "format": "webp"}
-                    ]
-                },
-                "http_common_info": {
-                    "aid": int(DEFAULT_ASSISTANT_ID)
-                }
-            }
+            params=_build_generate_params(_model),
+            data=_build_generate_data(_model, prompt, width, height, sample_strength, negative_prompt)
         )
+    except API_IMAGE_GENERATION_INSUFFICIENT_POINTS:
+        credits.invalidate(refresh_token)
+        raise
+    credits.consume(refresh_token)
+    return GenerationJob(_history_id(result), refresh_token, model, prompt)
+
+def generate_images(
+    model: str,
+    prompt: str,
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.5,
+    negative_prompt: str = "",
+    refresh_token: str = None
+) -> List[str]:
+    """生成图像（submit_generation + 阻塞等待结果）
+    
+    Args:
+        model: 模型名称
+        prompt: 提示词
+        width: 图像宽度
+        height: 图像高度
+        sample_strength: 精细度
+        negative_prompt: 反向提示词
+        refresh_token: 刷新token
         
-        record = result.get(history_id)
-        if not record:
-            raise API_IMAGE_GENERATION_FAILED("记录不存在")
-            
-        status = record.get('status')
-        fail_code = record.get('fail_code')
-        item_list = record.get('item_list', [])
+    Returns:
+        List[str]: 图像URL列表
         
-    if status == 30:
-        if fail_code == '2038':
-            raise API_CONTENT_FILTERED()
-        raise API_IMAGE_GENERATION_FAILED()
+    Raises:
+        API_IMAGE_GENERATION_FAILED: 图像生成失败
+        API_CONTENT_FILTERED: 内容被过滤
+    """
+    return submit_generation(
+        model, prompt, width, height, sample_strength, negative_prompt, refresh_token
+    ).result()
+
+async def get_credit_async(refresh_token: str) -> Dict[str, int]:
+    """异步获取积分信息"""
+    result = await async_request(
+        "POST",
+        "/commerce/v1/benefits/user_credit",
+        refresh_token,
+        data={},
+        headers={
+            "Referer": "https://jimeng.jianying.com/ai-tool/image/generate"
+        }
+    )
+    credit = result.get('credit', {})
+    gift_credit = credit.get('gift_credit', 0)
+    purchase_credit = credit.get('purchase_credit', 0)
+    vip_credit = credit.get('vip_credit', 0)
+    return {
+        'giftCredit': gift_credit,
+        'purchaseCredit': purchase_credit,
+        'vipCredit': vip_credit,
+        'totalCredit': gift_credit + purchase_credit + vip_credit
+    }
+
+async def receive_credit_async(refresh_token: str) -> None:
+    """异步领取积分"""
+    await async_request(
+        "POST",
+        "/commerce/v1/benefits/credit_receive",
+        refresh_token,
+        data={
+            "time_zone": "Asia/Shanghai"
+        },
+        headers={
+            "Referer": "https://jimeng.jianying.com/ai-tool/image/generate"
+        }
+    )
+
+async def submit_generation_async(
+    model: str,
+    prompt: str,
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.5,
+    negative_prompt: str = "",
+    refresh_token: str = None
+) -> GenerationJob:
+    """异步提交生成任务（基于 httpx），参数同 submit_generation
+    
+    返回的句柄可直接 await 或调用 collect() 等待结果；大量在途任务只占用协程，不占用线程。
+    """
+    _validate(prompt, refresh_token)
         
-    # 提取图片URL
-    return [
-        item.get('image', {}).get('large_images', [{}])[0].get('image_url') or 
-        item.get('common_attr', {}).get('cover_url')
-        for item in item_list
-        if item
-    ] 
\ No newline at end of file
+    _model = get_model(model)
+    
+    credits = get_credit_cache()
+    await credits.ensure_async(refresh_token)
+        
+    try:
+        result = await async_request(
+            "post",
+            "/mweb/v1/aigc_draft/generate",
+            refresh_token,
+            params=_build_generate_params(_model),
+            data=_build_generate_data(_model, prompt, width, height, sample_strength, negative_prompt)
+        )
+    except API_IMAGE_GENERATION_INSUFFICIENT_POINTS:
+        credits.invalidate(refresh_token)
+        raise
+    credits.consume(refresh_token)
+    return GenerationJob(_history_id(result), refresh_token, model, prompt)
+
+async def generate_images_async(
+    model: str,
+    prompt: str,
+    width: int = 1024,
+    height: int = 1024,
+    sample_strength: float = 0.5,
+    negative_prompt: str = "",
+    refresh_token: str = None
+) -> List[str]:
+    """异步生成图像
+    
+    参数与返回值同 generate_images，轮询由当前事件循环的集中轮询器完成，等待期间不占用线程。
+    """
+    job = await submit_generation_async(
+        model, prompt, width, height, sample_strength, negative_prompt, refresh_token
+    )
+    return await job.collect()
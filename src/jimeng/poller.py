@@ -0,0 +1,337 @@
+"""生成结果的集中轮询
+
+每次生成不再各自 `while status == 20: sleep(1)`：提交后登记 history_id 拿到一个 future，
+由单个轮询循环按 token 把所有未完成的 id 合并到一次 get_history_by_ids 请求中，
+记录离开 status=20（完成或 status=30 失败）时兑现对应的 future。
+
+轮询间隔自适应：刚提交时按预计耗时的一半等待（不会太早去问），
+越接近预计完成时间间隔越短，超过预计时间后按最小间隔轮询。
+预计耗时是已完成任务耗时的指数移动平均。
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .core import DEFAULT_ASSISTANT_ID, async_request, request
+from .exceptions import API_IMAGE_GENERATION_FAILED
+
+# 单次 get_history_by_ids 最多查询的 id 数
+POLL_BATCH_SIZE = int(os.getenv("JIMENG_POLL_BATCH_SIZE", "20"))
+# 轮询间隔上下限（秒）
+POLL_MIN_INTERVAL = float(os.getenv("JIMENG_POLL_MIN_INTERVAL", "1"))
+POLL_MAX_INTERVAL = float(os.getenv("JIMENG_POLL_MAX_INTERVAL", "5"))
+# 初始的预计生成耗时（秒），之后按实际完成耗时自动调整
+POLL_EXPECTED_SECONDS = float(os.getenv("JIMENG_POLL_EXPECTED_SECONDS", "10"))
+# 单个任务最长等待时间（秒），超时按生成失败处理
+POLL_TIMEOUT = float(os.getenv("JIMENG_POLL_TIMEOUT", "600"))
+# 同一任务连续请求失败多少次后放弃
+POLL_MAX_ERRORS = 3
+
+
+def _build_history_data(history_ids: List[str]) -> Dict:
+    """构造查询历史记录的请求体
+    
+    Args:
+        history_ids: 历史记录ID列表
+        
+    Returns:
+        Dict: 请求体
+    """
+    return {
+        "history_ids": list(history_ids),
+        "image_info": {
+            "width": 2048,
+            "height": 2048,
+            "format": "webp",
+            "image_scene_list": [
+                {"scene": "smart_crop", "width": 360, "height": 360, "uniq_key": "smart_crop-w:360-h:360", "format": "webp"},
+                {"scene": "smart_crop", "width": 480, "height": 480, "uniq_key": "smart_crop-w:480-h:480", "format": "webp"},
+                {"scene": "smart_crop", "width": 720, "height": 720, "uniq_key": "smart_crop-w:720-h:720", "format": "webp"},
+                {"scene": "smart_crop", "width": 720, "height": 480, "uniq_key": "smart_crop-w:720-h:480", "format": "webp"},
+                {"scene": "smart_crop", "width": 360, "height": 240, "uniq_key": "smart_crop-w:360-h:240", "format": "webp"},
+                {"scene": "smart_crop", "width": 240, "height": 320, "uniq_key": "smart_crop-w:240-h:320", "format": "webp"},
+                {"scene": "smart_crop", "width": 480, "height": 640, "uniq_key": "smart_crop-w:480-h:640", "format": "webp"},
+                {"scene": "normal", "width": 2400, "height": 2400, "uniq_key": "2400", "format": "webp"},
+                {"scene": "normal", "width": 1080, "height": 1080, "uniq_key": "1080", "format": "webp"},
+                {"scene": "normal", "width": 720, "height": 720, "uniq_key": "720", "format": "webp"},
+                {"scene": "normal", "width": 480, "height": 480, "uniq_key": "480", "format": "webp"},
+                {"scene": "normal", "width": 360, "height": 360, "uniq_key": "360", "format": "webp"}
+            ]
+        },
+        "http_common_info": {
+            "aid": int(DEFAULT_ASSISTANT_ID)
+        }
+    }
+
+
+def fetch_history(refresh_token: str, history_ids: List[str]) -> Dict[str, Any]:
+    """同步查询一批历史记录"""
+    return request(
+        "post",
+        "/mweb/v1/get_history_by_ids",
+        refresh_token,
+        data=_build_history_data(history_ids)
+    )
+
+
+async def fetch_history_async(refresh_token: str, history_ids: List[str]) -> Dict[str, Any]:
+    """异步查询一批历史记录"""
+    return await async_request(
+        "post",
+        "/mweb/v1/get_history_by_ids",
+        refresh_token,
+        data=_build_history_data(history_ids)
+    )
+
+
+class _Job:
+    __slots__ = ("history_id", "token", "future", "submitted", "next_poll", "errors")
+
+    def __init__(self, history_id: str, token: str, future, submitted: float, next_poll: float):
+        self.history_id = history_id
+        self.token = token
+        self.future = future
+        self.submitted = submitted
+        self.next_poll = next_poll
+        self.errors = 0
+
+
+class _PollSchedule:
+    """轮询调度：任务表、自适应间隔、按 token 分批，以及结果兑现（线程版与 asyncio 版共用）"""
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        min_interval: float = None,
+        max_interval: float = None,
+        expected: float = None,
+        timeout: float = None,
+    ):
+        # 未指定的参数取模块级配置（在创建时读取，便于测试与运行期调整）
+        self.batch_size = batch_size or POLL_BATCH_SIZE
+        self.min_interval = POLL_MIN_INTERVAL if min_interval is None else min_interval
+        self.max_interval = POLL_MAX_INTERVAL if max_interval is None else max_interval
+        self.expected = POLL_EXPECTED_SECONDS if expected is None else expected
+        self.timeout = POLL_TIMEOUT if timeout is None else timeout
+        self.jobs: Dict[str, _Job] = {}
+        self.requests = 0
+        self.ids_polled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _interval(self, elapsed: float) -> float:
+        remaining = self.expected - elapsed
+        return min(self.max_interval, max(self.min_interval, remaining / 2))
+
+    def _add(self, history_id: str, token: str, future) -> _Job:
+        now = time.time()
+        job = _Job(history_id, token, future, now, now + self._interval(0))
+        self.jobs[history_id] = job
+        return job
+
+    def _due_batches(self, now: float) -> List[Tuple[str, List[_Job]]]:
+        """有任务到期的 token 把它所有未完成的 id 一起查询（顺带查询未到期的 id 不增加请求数）"""
+        by_token: Dict[str, List[_Job]] = {}
+        for job in list(self.jobs.values()):
+            if job.future.done():  # 调用方已取消
+                del self.jobs[job.history_id]
+                continue
+            by_token.setdefault(job.token, []).append(job)
+
+        batches = []
+        for token, jobs in by_token.items():
+            jobs.sort(key=lambda j: j.next_poll)
+            for i in range(0, len(jobs), self.batch_size):
+                chunk = jobs[i : i + self.batch_size]
+                if chunk[0].next_poll <= now:
+                    batches.append((token, chunk))
+        return batches
+
+    def _next_wakeup(self) -> Optional[float]:
+        return min((job.next_poll for job in self.jobs.values()), default=None)
+
+    def _resolve(self, job: _Job, result=None, error: Exception = None):
+        self.jobs.pop(job.history_id, None)
+        if job.future.done():
+            return
+        if error is not None:
+            self.failed += 1
+            job.future.set_exception(error)
+        else:
+            self.completed += 1
+            job.future.set_result(result)
+
+    def _apply(self, batch: List[_Job], result: Dict[str, Any], now: float):
+        self.requests += 1
+        self.ids_polled += len(batch)
+        for job in batch:
+            record = (result or {}).get(job.history_id)
+            elapsed = now - job.submitted
+            if not record:
+                self._resolve(job, error=API_IMAGE_GENERATION_FAILED("记录不存在"))
+            elif record.get("status") == 20:
+                job.errors = 0
+                if elapsed > self.timeout:
+                    self._resolve(job, error=API_IMAGE_GENERATION_FAILED("生成超时"))
+                else:
+                    job.next_poll = now + self._interval(elapsed)
+            else:
+                # 预计耗时取完成耗时的指数移动平均
+                self.expected = 0.8 * self.expected + 0.2 * elapsed
+                self._resolve(job, result=record)
+
+    def _fail(self, batch: List[_Job], error: Exception, now: float):
+        self.requests += 1
+        for job in batch:
+            job.errors += 1
+            if job.errors >= POLL_MAX_ERRORS:
+                self._resolve(job, error=error)
+            else:
+                job.next_poll = now + self.min_interval * 2 ** job.errors
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "outstanding": len(self.jobs),
+            "requests": self.requests,
+            "ids_polled": self.ids_polled,
+            "avg_batch": round(self.ids_polled / self.requests, 2) if self.requests else 0.0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "expected_seconds": round(self.expected, 2),
+        }
+
+
+class HistoryPoller(_PollSchedule):
+    """线程版轮询器：submit() 返回 concurrent.futures.Future，单个后台线程负责所有轮询"""
+
+    def __init__(self, fetch=fetch_history, **kwargs):
+        super().__init__(**kwargs)
+        self._fetch = fetch
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, history_id: str, refresh_token: str) -> concurrent.futures.Future:
+        with self._cond:
+            job = self.jobs.get(history_id)
+            if job is None:
+                job = self._add(history_id, refresh_token, concurrent.futures.Future())
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="jimeng-poller", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return job.future
+
+    def wait(self, history_id: str, refresh_token: str) -> Dict[str, Any]:
+        """阻塞等待任务结束，返回最终的历史记录"""
+        return self.submit(history_id, refresh_token).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.time()
+                batches = self._due_batches(now)
+                if not batches:
+                    wakeup = self._next_wakeup()
+                    self._cond.wait(None if wakeup is None else max(0.0, wakeup - now))
+                    continue
+
+            for token, batch in batches:
+                try:
+                    result = self._fetch(token, [job.history_id for job in batch])
+                except Exception as e:
+                    with self._cond:
+                        self._fail(batch, e, time.time())
+                    continue
+                with self._cond:
+                    self._apply(batch, result, time.time())
+
+
+class AsyncHistoryPoller(_PollSchedule):
+    """asyncio 版轮询器：绑定一个事件循环，submit() 返回 asyncio.Future，批次之间并发请求"""
+
+    def __init__(self, fetch=fetch_history_async, **kwargs):
+        super().__init__(**kwargs)
+        self._fetch = fetch
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, history_id: str, refresh_token: str) -> asyncio.Future:
+        job = self.jobs.get(history_id)
+        if job is None:
+            job = self._add(history_id, refresh_token, self.loop.create_future())
+        if self._task is None or self._task.done():
+            self._task = self.loop.create_task(self._run())
+        self._wakeup.set()
+        return job.future
+
+    async def wait(self, history_id: str, refresh_token: str) -> Dict[str, Any]:
+        """等待任务结束，返回最终的历史记录"""
+        return await self.submit(history_id, refresh_token)
+
+    async def _run(self):
+        while self.jobs:
+            now = time.time()
+            batches = self._due_batches(now)
+            if not batches:
+                wakeup = self._next_wakeup()
+                if wakeup is None:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, wakeup - now))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            results = await asyncio.gather(
+                *(self._fetch(token, [job.history_id for job in batch]) for token, batch in batches),
+                return_exceptions=True,
+            )
+            now = time.time()
+            for (_, batch), result in zip(batches, results):
+                if isinstance(result, Exception):
+                    self._fail(batch, result, now)
+                else:
+                    self._apply(batch, result, now)
+
+
+_poller: Optional[HistoryPoller] = None
+_async_pollers: Dict[int, AsyncHistoryPoller] = {}
+_poller_lock = threading.Lock()
+
+
+def get_poller() -> HistoryPoller:
+    """进程内共享的线程版轮询器"""
+    global _poller
+    if _poller is None:
+        with _poller_lock:
+            if _poller is None:
+                _poller = HistoryPoller()
+    return _poller
+
+
+def get_async_poller() -> AsyncHistoryPoller:
+    """当前事件循环共享的 asyncio 版轮询器"""
+    loop = asyncio.get_running_loop()
+    poller = _async_pollers.get(id(loop))
+    if poller is None or poller.loop is not loop:
+        for key, old in list(_async_pollers.items()):
+            if old.loop.is_closed():
+                del _async_pollers[key]
+        poller = _async_pollers[id(loop)] = AsyncHistoryPoller()
+    return poller
+
+
+def poller_stats() -> Dict[str, Any]:
+    """线程版与各事件循环轮询器的统计"""
+    return {
+        "sync": get_poller().stats(),
+        "async": [p.stats() for p in _async_pollers.values() if not p.loop.is_closed()],
+    }
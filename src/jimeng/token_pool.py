@@ -0,0 +1,230 @@
+"""多账号 token 池
+
+JIMENG_API_TOKEN 可配置多个以逗号分隔的 token，生成任务按以下因素分摊到各账号：
+- 剩余积分（来自积分缓存，未知时按已知 token 的平均值估计）
+- 在途任务数（提交后到取回结果前都算在途）
+- 近期失败率（指数移动平均）
+
+返回登录失效（API_TOKEN_EXPIRES）的 token 被隔离到进程重启或手动恢复；
+返回积分不足的 token 隔离 TOKEN_QUARANTINE_SECONDS 秒，期间任务自动换下一个 token 重试。
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from .credits import get_credit_cache
+from .exceptions import (
+    API_IMAGE_GENERATION_INSUFFICIENT_POINTS,
+    API_REQUEST_FAILED,
+    API_TOKEN_EXPIRES,
+)
+from .utils import token_split
+
+# 积分不足的 token 隔离时长（秒）
+TOKEN_QUARANTINE_SECONDS = float(os.getenv("JIMENG_TOKEN_QUARANTINE_SECONDS", "3600"))
+# 失败率指数移动平均的权重
+FAILURE_ALPHA = 0.2
+
+T = TypeVar("T")
+
+# 会导致换 token 重试并隔离当前 token 的错误
+QUARANTINE_ERRORS = (API_TOKEN_EXPIRES, API_IMAGE_GENERATION_INSUFFICIENT_POINTS)
+
+
+def _mask(token: str) -> str:
+    return f"{token[:6]}..."
+
+
+class _TokenState:
+    __slots__ = ("inflight", "submitted", "failures", "failure_rate", "quarantined_until", "reason")
+
+    def __init__(self):
+        self.inflight = 0
+        self.submitted = 0
+        self.failures = 0
+        self.failure_rate = 0.0
+        self.quarantined_until = 0.0
+        self.reason: Optional[str] = None
+
+
+class TokenPool:
+    """按积分、在途数和失败率挑选 token（线程与协程共用同一份状态）"""
+
+    def __init__(
+        self,
+        tokens: Iterable[str],
+        balance: Callable[[str], Optional[int]] = None,
+        quarantine_seconds: float = None,
+    ):
+        self._tokens: List[str] = list(dict.fromkeys(tokens))
+        self._balance = balance or (lambda token: get_credit_cache().peek(token))
+        self.quarantine_seconds = (
+            TOKEN_QUARANTINE_SECONDS if quarantine_seconds is None else quarantine_seconds
+        )
+        self._states: Dict[str, _TokenState] = {t: _TokenState() for t in self._tokens}
+        self._lock = threading.Lock()
+        self._cursor = 0
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def _available(self, state: _TokenState, now: float) -> bool:
+        if state.quarantined_until and now >= state.quarantined_until:
+            state.quarantined_until = 0.0
+            state.reason = None
+        return not state.quarantined_until
+
+    def _scores(self, candidates: List[str]) -> Dict[str, float]:
+        balances = {t: self._balance(t) for t in candidates}
+        known = [b for b in balances.values() if b is not None]
+        default = sum(known) / len(known) if known else 1
+        scores = {}
+        for token in candidates:
+            state = self._states[token]
+            credit = balances[token] if balances[token] is not None else default
+            # 积分取对数：余额 1000 与 500 的账号差别不大，余额 0 的账号排到最后
+            scores[token] = (
+                math.log1p(max(credit, 0)) * (1 - state.failure_rate) / (1 + state.inflight)
+            )
+        return scores
+
+    def acquire(self, exclude: Iterable[str] = ()) -> str:
+        """挑选得分最高的可用 token 并计入在途；同分时轮转"""
+        exclude = set(exclude)
+        with self._lock:
+            now = time.time()
+            candidates = [
+                t
+                for t in self._tokens
+                if t not in exclude and self._available(self._states[t], now)
+            ]
+            if not candidates:
+                raise API_REQUEST_FAILED("即梦 token 池中没有可用的 token")
+            scores = self._scores(candidates)
+            # 从游标位置开始比较，得分相同的 token 依次轮到
+            start = self._cursor % len(candidates)
+            ordered = candidates[start:] + candidates[:start]
+            token = max(ordered, key=lambda t: scores[t])
+            self._cursor += 1
+            state = self._states[token]
+            state.inflight += 1
+            state.submitted += 1
+            return token
+
+    def release(self, token: str, error: BaseException = None):
+        """任务结束：扣减在途数，更新失败率，按错误类型隔离 token"""
+        with self._lock:
+            state = self._states.get(token)
+            if state is None:
+                return
+            state.inflight = max(0, state.inflight - 1)
+            failed = 1.0 if error is not None else 0.0
+            state.failure_rate += FAILURE_ALPHA * (failed - state.failure_rate)
+            if error is None:
+                return
+            state.failures += 1
+            if isinstance(error, API_TOKEN_EXPIRES):
+                state.quarantined_until = math.inf
+                state.reason = "expired"
+            elif isinstance(error, API_IMAGE_GENERATION_INSUFFICIENT_POINTS):
+                state.quarantined_until = time.time() + self.quarantine_seconds
+                state.reason = "insufficient_points"
+
+    def restore(self, token: str):
+        """解除隔离（如更新了登录态）"""
+        with self._lock:
+            state = self._states.get(token)
+            if state is not None:
+                state.quarantined_until = 0.0
+                state.reason = None
+
+    def _next(self, tried: List[tuple]) -> str:
+        """换下一个 token；全部不可用时抛出最后一次的隔离错误"""
+        try:
+            return self.acquire(exclude=[token for token, _ in tried])
+        except API_REQUEST_FAILED:
+            if tried:
+                raise tried[-1][1]
+            raise
+
+    def call(self, fn: Callable[[str], T]) -> T:
+        """用池中的 token 执行 fn(token)；token 被隔离时换下一个重试"""
+        tried: List[tuple] = []
+        while True:
+            token = self._next(tried)
+            try:
+                result = fn(token)
+            except QUARANTINE_ERRORS as e:
+                self.release(token, e)
+                tried.append((token, e))
+                continue
+            except BaseException as e:
+                self.release(token, e)
+                raise
+            self.release(token)
+            return result
+
+    async def call_async(self, fn: Callable[[str], Awaitable[T]]) -> T:
+        """call 的异步版本"""
+        tried: List[tuple] = []
+        while True:
+            token = self._next(tried)
+            try:
+                result = await fn(token)
+            except QUARANTINE_ERRORS as e:
+                self.release(token, e)
+                tried.append((token, e))
+                continue
+            except BaseException as e:
+                self.release(token, e)
+                raise
+            self.release(token)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            available = [t for t in self._tokens if self._available(self._states[t], now)]
+            scores = self._scores(available) if available else {}
+            tokens = {}
+            for token in self._tokens:
+                state = self._states[token]
+                until = state.quarantined_until
+                tokens[_mask(token)] = {
+                    "balance": self._balance(token),
+                    "inflight": state.inflight,
+                    "submitted": state.submitted,
+                    "failures": state.failures,
+                    "failure_rate": round(state.failure_rate, 4),
+                    "score": round(scores[token], 4) if token in scores else None,
+                    "quarantined": state.reason,
+                    "quarantine_remaining": (
+                        None if not until or until == math.inf else round(until - now, 1)
+                    ),
+                }
+        return {
+            "size": len(self._tokens),
+            "available": len(available),
+            "inflight": sum(s.inflight for s in self._states.values()),
+            "tokens": tokens,
+        }
+
+
+_token_pool: Optional[TokenPool] = None
+_token_pool_lock = threading.Lock()
+
+
+def get_token_pool() -> Optional[TokenPool]:
+    """由 JIMENG_API_TOKEN（逗号分隔）构建的进程内 token 池；未配置时返回 None"""
+    global _token_pool
+    if _token_pool is None:
+        with _token_pool_lock:
+            if _token_pool is None:
+                tokens = token_split(os.getenv("JIMENG_API_TOKEN", ""))
+                if not tokens:
+                    return None
+                _token_pool = TokenPool(tokens)
+    return _token_pool
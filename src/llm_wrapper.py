@@ -2,83 +2,150 @@ import os
 import sys
 import time
 import json
+import re
+import asyncio
+import concurrent.futures
 from datetime import datetime
-from typing import List, Dict, Any
+from email.utils import parsedate_to_datetime
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional
+from urllib.parse import urlparse
 
 # Add current directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except ImportError:
     OpenAI = None
+    AsyncOpenAI = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 import config
+from core.agent_schemas import get_capabilities, is_response_format_error
+from core.log_sink import get_log_sink
+from core.model_router import get_model_router
+from core.rate_limiter import RateLimitError, get_rate_limiter
+from core.singleflight import flight_key, get_async_singleflight, get_singleflight
+from core.usage import extract_usage, get_usage_tracker
 
 
-class RateLimitError(Exception):
-    """速率限制错误，需要切换模型"""
+STREAM_CONTINUE_PROMPT = (
+    "上一条回复在输出途中中断了。请从中断处紧接着继续输出剩余内容："
+    "不要重复已经输出的部分，不要添加任何说明或开场白，保持原有格式。"
+)
 
-    def __init__(self, message="Rate limit exceeded", retry_after: int = None):
-        self.message = message
-        self.retry_after = retry_after
-        super().__init__(message)
 
+class StreamStalledError(Exception):
+    """流式输出超过 LLM_STREAM_STALL_SECONDS 没有新内容（消息包含 timed out 以触发切换模型）"""
 
-class LLMService:
-    def __init__(self, api_key=None, base_url=None):
-        self.api_key = api_key or config.OPENAI_API_KEY
-        self.base_url = base_url or config.OPENAI_BASE_URL
-        self.client = None
 
-        # Initialize logs directory
-        self.log_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs"
-        )
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
-        self.log_file = os.path.join(self.log_dir, "llm_calls.jsonl")
+class _OverlapTrimmer:
+    """
+    续写时模型常会重复中断前的最后一段文本：缓冲续写开头，
+    去掉与已输出内容结尾重叠的部分后再放行。
+    """
 
-        # 只要有 API Key 就尝试初始化，不再检查前缀
-        if OpenAI and self.api_key:
-            try:
-                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-            except Exception as e:
-                print(f"Warning: Failed to initialize OpenAI client: {e}")
+    MIN_OVERLAP = 4
 
+    def __init__(self, received: str, window: int = 300):
+        self.tail = received[-window:]
+        self.window = window
+        self._buffer: List[str] = []
+        self._size = 0
+        self._done = False
+
+    def feed(self, text: str) -> str:
+        if self._done:
+            return text
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size < self.window:
+            return ""
+        return self.flush()
+
+    def flush(self) -> str:
+        if self._done:
+            return ""
+        self._done = True
+        head = "".join(self._buffer)
+        for size in range(min(len(self.tail), len(head)), self.MIN_OVERLAP - 1, -1):
+            if head.startswith(self.tail[-size:]):
+                return head[size:]
+        return head
+
+
+class BaseLLMService:
+    """同步 / 异步 LLM 服务共用的配置、日志与降级策略"""
 
-class LLMService:
     def __init__(self, api_key=None, base_url=None):
         self.api_key = api_key or config.OPENAI_API_KEY
         self.base_url = base_url or config.OPENAI_BASE_URL
         self.client = None
+        # 进程内共享的模型健康路由（熔断中的模型直接跳过）
+        self.router = get_model_router()
+
+        # 进程内（可选跨 worker）共享的令牌桶限流
+        self.limiter = get_rate_limiter()
 
-        # 速率限制跟踪
-        self.last_request_time = 0
-        self.min_request_interval = 0.5  # 最小请求间隔（秒）
+        # 按模型缓存的结构化输出（response_format）支持情况
+        self.capabilities = get_capabilities()
 
         # Initialize logs directory
-        self.log_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs"
-        )
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
-        self.log_file = os.path.join(self.log_dir, "llm_calls.jsonl")
+        self.log_file = config.LLM_LOG_PATH
+        self.log_dir = os.path.dirname(os.path.abspath(self.log_file))
+        os.makedirs(self.log_dir, exist_ok=True)
+        # 后台批量写入，记录日志不阻塞调用线程
+        self.log_sink = get_log_sink()
 
-        # 只要有 API Key 就尝试初始化，不再检查前缀
-        if OpenAI and self.api_key:
+    def _limit_key(self, model: str) -> str:
+        """限流键：provider（base_url 主机）+ 模型"""
+        provider = urlparse(self.base_url or "").netloc or "default"
+        return f"{provider}:{model}"
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        """从 429 响应头（Retry-After / retry-after-ms）或错误信息中提取建议等待秒数"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
             try:
-                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-            except Exception as e:
-                print(f"Warning: Failed to initialize OpenAI client: {e}")
+                if headers.get("retry-after-ms"):
+                    return float(headers["retry-after-ms"]) / 1000
+                value = headers.get("retry-after")
+                if value:
+                    try:
+                        return max(0.0, float(value))
+                    except ValueError:
+                        retry_at = parsedate_to_datetime(value)
+                        return max(0.0, retry_at.timestamp() - time.time())
+            except Exception:
+                pass
+        match = re.search(r"retry (?:in|after) ([\d.]+)\s*s", str(error), re.IGNORECASE)
+        return float(match.group(1)) if match else None
 
-    def _check_rate_limit(self):
-        """检查并实施速率限制"""
-        now = time.time()
-        elapsed = now - self.last_request_time
-        if elapsed < self.min_request_interval:
-            time.sleep(self.min_request_interval - elapsed)
-        self.last_request_time = time.time()
+    def _handle_rate_limit(self, model: str, error: Exception, retry_count: int) -> bool:
+        """
+        429 处理：把该模型的限流键整体冷却（所有线程/worker 都会等待），
+        返回 True 表示 Retry-After 足够短，应在冷却后重试同一模型。
+        没有 Retry-After 时按指数退避冷却该模型并切换到下一个模型。
+        """
+        if not self._is_rate_limit_error(error) or isinstance(error, RateLimitError):
+            return False
+        retry_after = self._retry_after(error)
+        should_retry, backoff = self._should_retry_with_backoff(
+            error, retry_count, max_retries=2
+        )
+        self.limiter.penalize(
+            self._limit_key(model), retry_after if retry_after is not None else backoff or 1
+        )
+        return (
+            should_retry
+            and retry_after is not None
+            and retry_after <= self.limiter.max_wait
+        )
 
     def _is_rate_limit_error(self, error: Exception) -> bool:
         """检查是否为速率限制错误 (429)"""
@@ -107,6 +174,173 @@ class LLMService:
         wait_time = min(2**retry_count, 60)  # 最多等待60秒
         return True, wait_time
 
+    def _candidate_models(self, model: str = None) -> List[str]:
+        """
+        确定模型尝试序列
+        1. 默认情况：使用 config 中的优先级列表
+        2. 指定情况：优先尝试指定模型，失败后尝试列表中剩余的模型
+        """
+        candidate_models = list(config.MODEL_PRIORITY_LIST)
+        requested_model = model or config.DEFAULT_MODEL
+
+        # 如果请求的模型不在列表中，把它加到最前面
+        if requested_model not in candidate_models:
+            candidate_models.insert(0, requested_model)
+        else:
+            # 如果在列表中，确保它排在第一个，并保持列表其余部分的相对顺序
+            candidate_models.remove(requested_model)
+            candidate_models.insert(0, requested_model)
+        return self.router.order(candidate_models)
+
+    def _record_attempt(self, model: str, started: float, error: Exception = None):
+        """把单个模型的调用结果计入路由健康统计"""
+        if error is None:
+            self.router.record_success(model, time.time() - started)
+        elif self._should_failover(error) and not self._is_rate_limit_error(error):
+            self.router.record_failure(model, error)
+        else:
+            # 限流（由限流器冷却）与认证失败等错误不计入熔断
+            self.router.release(model)
+
+    def _hedge_delay(self, model: str) -> float:
+        """对冲触发阈值：主模型历史延迟的分位数（样本不足时用默认值）"""
+        observed = self.router.latency_percentile(model, config.LLM_HEDGE_PERCENTILE)
+        if observed is None:
+            return config.LLM_HEDGE_DEFAULT_DELAY
+        return max(config.LLM_HEDGE_MIN_DELAY, observed)
+
+    def _thinking_params(self, model: str) -> tuple:
+        """Gemini Thinking 参数配置，返回 (extra_body, reasoning_effort)"""
+        disable_gemini_thinking = os.getenv("DISABLE_GEMINI_THINKING", "1") != "0"
+        if (
+            disable_gemini_thinking
+            and ("gemini-2.5-flash" in model)
+            and ("flash-lite" not in model)
+        ):
+            return {"google": {"thinking_config": {"thinking_budget": 0}}}, "none"
+        return None, None
+
+    def _build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        extra_body: Dict[str, Any] | None,
+        reasoning_effort: str | None,
+        stream: bool = False,
+        response_format: Dict[str, Any] | None = None,
+    ) -> Dict[str, Any]:
+        kwargs = {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.7,
+            "timeout": 60.0,
+        }
+        if stream:
+            kwargs["stream"] = True
+            # 流式读超时即卡顿检测：超过 N 秒没有新数据视为中断，切换模型续写
+            if httpx is not None:
+                kwargs["timeout"] = httpx.Timeout(
+                    60.0, read=config.LLM_STREAM_STALL_SECONDS
+                )
+        if reasoning_effort:
+            kwargs["reasoning_effort"] = reasoning_effort
+        if extra_body:
+            kwargs["extra_body"] = extra_body
+        if response_format:
+            kwargs["response_format"] = response_format
+        return kwargs
+
+    def _structured_request(
+        self, model: str, messages: List[Dict[str, str]], response_format
+    ) -> tuple:
+        """按模型能力决定实际发送的 (messages, response_format)，不支持时退回提示词约束"""
+        return self.capabilities.apply(self.base_url, model, messages, response_format)
+
+    def _downgrade_format(self, model: str, sent_format, error: Exception) -> bool:
+        """模型拒绝 response_format 时降级其能力等级并返回 True（调用方用同一模型重试）"""
+        if sent_format is None or not is_response_format_error(error):
+            return False
+        print(f"⚠️ [{model}] 不支持 {sent_format.get('type')}，降级结构化输出后重试...")
+        self.capabilities.downgrade(self.base_url, model)
+        return True
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        if chunk.choices and chunk.choices[0].delta.content:
+            return chunk.choices[0].delta.content
+        return ""
+
+    def _continuation_messages(
+        self, messages: List[Dict[str, str]], received: str
+    ) -> List[Dict[str, str]]:
+        """流中断后让下一个模型从已输出内容处续写"""
+        return list(messages) + [
+            {"role": "assistant", "content": received},
+            {"role": "user", "content": STREAM_CONTINUE_PROMPT},
+        ]
+
+    def _validate_content(self, model: str, raw_content) -> str:
+        if not raw_content:
+            raise ValueError(f"Model {model} returned empty response.")
+
+        result = str(raw_content).strip()
+
+        if len(result) < 5:
+            raise ValueError(f"Model {model} returned too short response.")
+        return result
+
+    def _check_response(self, model: str, result: str, validator) -> str:
+        """用调用方的 validator 校验响应（如被截断的 JSON），不通过时按无效响应切换模型"""
+        if validator is not None:
+            try:
+                validator(result)
+            except Exception as e:
+                raise ValueError(f"Model {model} returned empty/invalid response: {e}")
+        return result
+
+    def _should_failover(self, error: Exception) -> bool:
+        """判断是否值得切换模型（增加了 "empty/invalid response" 与超时/连接错误的检测）"""
+        error_msg = str(error).lower()
+        return any(
+            code in error_msg
+            for code in [
+                "404",
+                "429",
+                "500",
+                "502",
+                "503",
+                "not found",
+                "rate limit",
+                "overloaded",
+                "empty/invalid",
+                "empty response",
+                "too short response",
+                "timed out",
+                "timeout",
+                "connection error",
+            ]
+        )
+
+    def _is_param_error(self, error: Exception) -> bool:
+        """thinking 参数不被支持时的错误（只有这类错误才值得去掉 extra_body 重试）"""
+        error_msg = str(error).lower()
+        if any(code in error_msg for code in ("timed out", "timeout", "429", "503")):
+            return False
+        return any(
+            code in error_msg
+            for code in (
+                "400",
+                "invalid",
+                "unsupported",
+                "not supported",
+                "unrecognized",
+                "unknown",
+                "extra_body",
+                "reasoning",
+                "thinking",
+            )
+        )
+
     def _log_call(
         self,
         model: str,
@@ -114,9 +348,12 @@ class LLMService:
         response: str,
         duration: float,
         status: str = "success",
+        usage: Dict[str, int] = None,
+        tags: Dict[str, str] = None,
     ):
         """
         记录模型调用日志（不包含敏感信息）
+        usage: 供应商返回的 token 用量；tags: agent / project / run_id，用于按 Agent 与项目汇总
         """
         # 只记录消息数量和角色，不记录内容
         safe_messages = [{"role": msg["role"]} for msg in messages]
@@ -134,6 +371,24 @@ class LLMService:
             "duration_ms": int(duration * 1000),
             "status": status,
         }
+        tags = tags or {}
+        for name in ("agent", "project", "run_id"):
+            if tags.get(name):
+                log_entry[name] = tags[name]
+        if usage:
+            log_entry.update(usage)
+        # 失败的调用只要供应商返回了用量就已计费，同样计入用量统计
+        if status == "success" or usage:
+            cost = get_usage_tracker().record(
+                model,
+                usage,
+                duration,
+                prompt_chars=content_length,
+                status=status,
+                **tags,
+            )
+            if cost is not None:
+                log_entry["cost_usd"] = round(cost, 6)
 
         # 只在开发环境记录响应内容摘要
         if config.ENV == "development" and status == "success":
@@ -141,215 +396,861 @@ class LLMService:
                 response[:200] + "..." if len(response) > 200 else response
             )
 
-        try:
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        except Exception as e:
-            print(f"Failed to write LLM log: {e}")
+        self.log_sink.write(self.log_file, log_entry)
 
-    def chat_completion(self, messages: List[Dict[str, str]], model: str = None) -> str:
+    def _log_rejected(
+        self, model: str, messages, start_time: float, usage, tags, response: str = ""
+    ):
+        """
+        模型已返回但响应被拒绝（空、过短、被截断）或流中途失败：供应商照常计费，
+        按 rejected 记录调用日志，有用量时计入用量统计
+        """
+        self._log_call(
+            model,
+            messages,
+            response,
+            time.time() - start_time,
+            status="rejected",
+            usage=usage,
+            tags=tags,
+        )
+
+
+class LLMService(BaseLLMService):
+    def __init__(self, api_key=None, base_url=None):
+        super().__init__(api_key=api_key, base_url=base_url)
+
+        # 只要有 API Key 就尝试初始化，不再检查前缀
+        if OpenAI and self.api_key:
+            try:
+                self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            except Exception as e:
+                print(f"Warning: Failed to initialize OpenAI client: {e}")
+
+    def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        validator: Callable[[str], Any] = None,
+        hedge: bool = None,
+        response_format: Dict[str, Any] = None,
+        agent: str = None,
+        project: str = None,
+        run_id: str = None,
+    ) -> str:
         """
         调用 LLM 生成回复，支持自动模型降级 (Failover)。
         策略：优先尝试指定模型，失败后按优先级列表尝试其他模型。
+        validator: 判定响应是否可用（抛异常即视为无效并切换模型，如 LLMResponseProcessor.strict）
+        hedge: 是否对冲（默认取 config.LLM_HEDGE_ENABLED）——主模型超过其延迟分位数仍未返回时，
+               在另一个线程中同时请求下一个健康模型，取先通过 validator 校验的响应
+        response_format: 结构化输出 schema（见 core.agent_schemas），模型不支持时自动退回提示词约束
+        agent / project / run_id: 用量统计标签（见 core.usage），不影响请求内容
+        进行中的相同调用（模型 + 规范化消息）合并为一次请求，结果分发给所有调用方。
+        """
+        tags = {"agent": agent, "project": project, "run_id": run_id}
+        if not config.LLM_SINGLEFLIGHT_ENABLED:
+            return self._chat_completion(
+                messages, model, validator, hedge, response_format, tags
+            )
+        key = flight_key(
+            model,
+            messages,
+            response_format=response_format,
+            hedge=hedge,
+            validator=getattr(validator, "__qualname__", None),
+        )
+        return get_singleflight().do(
+            key,
+            lambda: self._chat_completion(
+                messages, model, validator, hedge, response_format, tags
+            ),
+        )
+
+    def _request_model(
+        self,
+        model: str,
+        messages,
+        extra_body=None,
+        reasoning_effort=None,
+        response_format=None,
+    ):
+        """
+        对单个模型发起请求：先取限流令牌（该模型处于 429 冷却中时在此等待，过长则抛出
+        RateLimitError 切换模型）；response_format 不被支持时降级后重试；
+        thinking 参数不兼容时去掉重试一次；429 带较短 Retry-After 时冷却后重试同一模型。
+        其余错误抛给调用方切换模型。
         """
+        param_retried = False
+        rate_retries = 0
+        while True:
+            request_messages, request_format = self._structured_request(
+                model, messages, response_format
+            )
+            self.limiter.acquire(self._limit_key(model))
+            try:
+                print(f"📡 Calling LLM ({model})...")
+                return self.client.chat.completions.create(
+                    **self._build_request(
+                        model,
+                        request_messages,
+                        extra_body,
+                        reasoning_effort,
+                        response_format=request_format,
+                    )
+                )
+            except Exception as e:
+                if self._downgrade_format(model, request_format, e):
+                    continue
+                # 参数错误重试逻辑（超时等错误直接切换模型，不再重复等待）
+                if (
+                    (extra_body is not None or reasoning_effort is not None)
+                    and not param_retried
+                    and self._is_param_error(e)
+                ):
+                    param_retried = True
+                    print(f"⚠️ [{model}] 参数不兼容，移除 extra_body 重试...")
+                    extra_body, reasoning_effort = None, None
+                    continue
+                if self._handle_rate_limit(model, e, rate_retries):
+                    rate_retries += 1
+                    print(f"⏳ [{model}] 429，按 Retry-After 冷却后重试...")
+                    continue
+                raise  # 抛出给外层处理（进行模型切换）
+
+    def _attempt(
+        self,
+        model: str,
+        messages,
+        validator,
+        start_time: float,
+        response_format=None,
+        tags=None,
+    ) -> str:
+        """单个模型的完整一次尝试（请求 + 内容校验 + 健康统计 + 调用日志）"""
+        extra_body, reasoning_effort = self._thinking_params(model)
+        attempt_start = time.time()
+        response = None
+        usage = None
+        try:
+            response = self._request_model(
+                model, messages, extra_body, reasoning_effort, response_format
+            )
+            usage = extract_usage(response)
+            result = self._check_response(
+                model,
+                self._validate_content(model, response.choices[0].message.content),
+                validator,
+            )
+        except Exception as e:
+            self._record_attempt(model, attempt_start, e)
+            if response is not None:
+                self._log_rejected(model, messages, start_time, usage, tags)
+            raise
+        self._record_attempt(model, attempt_start)
+        self._log_call(
+            model,
+            messages,
+            result,
+            time.time() - start_time,
+            usage=usage,
+            tags=tags,
+        )
+        return result
+
+    def _chat_completion(
+        self,
+        messages,
+        model=None,
+        validator=None,
+        hedge=None,
+        response_format=None,
+        tags=None,
+    ) -> str:
         start_time = time.time()
         if not self.client:
             error_msg = f"LLM Client not initialized. API_KEY: {'Set' if self.api_key else 'Missing'}, BASE_URL: {self.base_url}"
             print(f"❌ {error_msg}")
             raise ValueError(error_msg)
 
-        # 确定模型尝试序列
-        # 1. 默认情况：使用 config 中的优先级列表
-        # 2. 指定情况：优先尝试指定模型，失败后尝试列表中剩余的模型
-        candidate_models = list(config.MODEL_PRIORITY_LIST)
-        requested_model = model or config.DEFAULT_MODEL
+        if hedge is None:
+            hedge = config.LLM_HEDGE_ENABLED
+        candidates = self._candidate_models(model)
+        if hedge and len(candidates) > 1:
+            return self._hedged_completion(
+                candidates, messages, validator, start_time, response_format, tags
+            )
 
-        # 如果请求的模型不在列表中，把它加到最前面
-        if requested_model not in candidate_models:
-            candidate_models.insert(0, requested_model)
-        else:
-            # 如果在列表中，确保它排在第一个，并保持列表其余部分的相对顺序
-            candidate_models.remove(requested_model)
-            candidate_models.insert(0, requested_model)
+        last_error = None
+
+        for current_model in candidates:
+            try:
+                result = self._attempt(
+                    current_model,
+                    messages,
+                    validator,
+                    start_time,
+                    response_format,
+                    tags,
+                )
+                print(
+                    f"✅ LLM Response received from {current_model} ({time.time() - start_time:.2f}s)"
+                )
+                return result
 
+            except Exception as e:
+                last_error = e
+
+                if self._should_failover(e):
+                    print(
+                        f"⚠️ Model {current_model} failed: {str(e)[:100]}... -> Trying next model"
+                    )
+                    continue  # Try next model
+
+                # 如果是其他严重错误（如认证失败），直接终止
+                print(f"❌ Unrecoverable error on {current_model}: {e}")
+                raise e
+
+        # 所有模型都尝试失败
+        print("❌ All candidate models failed.")
+        raise last_error
+
+    def _hedged_completion(
+        self,
+        candidates: List[str],
+        messages,
+        validator,
+        start_time: float,
+        response_format=None,
+        tags=None,
+    ) -> str:
+        """
+        线程版对冲请求：主模型超过延迟阈值未返回时在另一个线程请求下一个候选模型，
+        先返回有效响应者胜出；某一路失败时继续补位下一个候选。
+        同步请求无法取消，输掉的一路在后台线程跑完后丢弃结果（用量与健康统计照常记录）。
+        """
+        queue = list(candidates)
+        running: Dict[concurrent.futures.Future, str] = {}
+        hedge_fired = False
         last_error = None
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(candidates), thread_name_prefix="llm-hedge"
+        )
 
-        for current_model in candidate_models:
+        def launch():
+            current_model = queue.pop(0)
+            print(f"📡 Calling LLM ({current_model}, hedged)...")
+            future = executor.submit(
+                self._attempt,
+                current_model,
+                messages,
+                validator,
+                start_time,
+                response_format,
+                tags,
+            )
+            running[future] = current_model
+
+        launch()
+        primary = candidates[0]
+        deadline = self._hedge_delay(primary)
+        try:
+            while running:
+                timeout = deadline if (queue and not hedge_fired) else None
+                done, _ = concurrent.futures.wait(
+                    running,
+                    timeout=timeout,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                if not done:
+                    # 主模型超过阈值仍未返回：对冲到下一个候选
+                    hedge_fired = True
+                    print(f"🔀 {primary} 超过 {deadline:.1f}s 未返回，对冲请求 {queue[0]}")
+                    launch()
+                    continue
+
+                for future in done:
+                    current_model = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        last_error = e
+                        if not self._should_failover(e):
+                            raise
+                        print(f"⚠️ Model {current_model} failed: {str(e)[:100]}")
+                        continue
+                    self.router.record_hedge(
+                        hedge_fired, backup_won=hedge_fired and current_model != primary
+                    )
+                    duration = time.time() - start_time
+                    print(
+                        f"✅ LLM Response received from {current_model} ({duration:.2f}s)"
+                    )
+                    return result
+
+                # 失败的一路由下一个候选补位，保持并发路数不变
+                if queue and len(running) < (2 if hedge_fired else 1):
+                    launch()
+        finally:
+            # 不等待仍在进行的一路，调用方立即拿到结果
+            executor.shutdown(wait=False)
+
+        self.router.record_hedge(hedge_fired)
+        print("❌ All candidate models failed.")
+        raise last_error
+
+    def _open_stream(
+        self, model: str, messages, extra_body, reasoning_effort, response_format=None
+    ):
+        """打开流式请求；response_format / thinking 参数不被支持时降级后重试"""
+        while True:
+            request_messages, request_format = self._structured_request(
+                model, messages, response_format
+            )
+            self.limiter.acquire(self._limit_key(model))
             try:
-                # 内部函数：执行单个模型的调用（含参数重试逻辑）
-                def _call(
-                    extra_body: Dict[str, Any] | None, reasoning_effort: str | None
-                ):
-                    kwargs = {
-                        "model": current_model,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "timeout": 60.0,
-                    }
-                    if reasoning_effort:
-                        kwargs["reasoning_effort"] = reasoning_effort
-                    if extra_body:
-                        kwargs["extra_body"] = extra_body
-                    return self.client.chat.completions.create(**kwargs)
-
-                # Gemini Thinking 参数配置
-                disable_gemini_thinking = (
-                    os.getenv("DISABLE_GEMINI_THINKING", "1") != "0"
+                return self.client.chat.completions.create(
+                    **self._build_request(
+                        model,
+                        request_messages,
+                        extra_body,
+                        reasoning_effort,
+                        stream=True,
+                        response_format=request_format,
+                    )
                 )
-                reasoning_effort = None
-                extra_body = None
+            except Exception as e:
+                if self._downgrade_format(model, request_format, e):
+                    continue
                 if (
-                    disable_gemini_thinking
-                    and ("gemini-2.5-flash" in current_model)
-                    and ("flash-lite" not in current_model)
-                ):
-                    reasoning_effort = "none"
-                    extra_body = {"google": {"thinking_config": {"thinking_budget": 0}}}
+                    extra_body is None and reasoning_effort is None
+                ) or not self._is_param_error(e):
+                    raise
+                print(f"⚠️ [{model}] 参数不兼容，移除 extra_body 重试...")
+                extra_body, reasoning_effort = None, None
+
+    def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        response_format: Dict[str, Any] = None,
+        agent: str = None,
+        project: str = None,
+        run_id: str = None,
+    ):
+        """
+        调用 LLM 生成流式回复，支持自动模型降级 (Failover)。
+        连接失败、流中途报错或卡顿（超过 LLM_STREAM_STALL_SECONDS 无新数据）时切换到下一个模型，
+        并用已输出的内容构造续写提示，调用方看到的是一条不中断的流。
+        续写请求不带 response_format（续写的是半个 JSON，不能再要求完整对象）。
+        供应商在最后一个 chunk 中返回 usage 时记录 token 用量。
+        """
+        start_time = time.time()
+        if not self.client:
+            raise ValueError("LLM Client not initialized")
+
+        last_error = None
+        received: List[str] = []
+        tags = {"agent": agent, "project": project, "run_id": run_id}
+
+        for current_model in self._candidate_models(model):
+            attempt_start = time.time()
+            extra_body, reasoning_effort = self._thinking_params(current_model)
+            request_messages = messages
+            request_format = response_format
+            trimmer = None
+            stream = None
+            if received:
+                text = "".join(received)
+                request_messages = self._continuation_messages(messages, text)
+                request_format = None
+                trimmer = _OverlapTrimmer(text)
+            attempt_received = len(received)
+            usage = None
+            try:
+                print(f"📡 Calling LLM Stream ({current_model})...")
+                stream = self._open_stream(
+                    current_model,
+                    request_messages,
+                    extra_body,
+                    reasoning_effort,
+                    request_format,
+                )
 
-                # 单个模型的重试循环（处理参数错误等）
-                max_retries = 1
-                retry_count = 0
+                for chunk in stream:
+                    usage = extract_usage(chunk) or usage
+                    content = self._chunk_text(chunk)
+                    if content and trimmer:
+                        content = trimmer.feed(content)
+                    if content:
+                        received.append(content)
+                        yield content
+                if trimmer:
+                    content = trimmer.flush()
+                    if content:
+                        received.append(content)
+                        yield content
 
-                while retry_count <= max_retries:
+                # 成功完成
+                duration = time.time() - start_time
+                self._log_call(
+                    current_model,
+                    messages,
+                    "".join(received),
+                    duration,
+                    usage=usage,
+                    tags=tags,
+                )
+                self._record_attempt(current_model, attempt_start)
+                print(f"✅ LLM Stream completed from {current_model} ({duration:.2f}s)")
+                return
+
+            except Exception as e:
+                last_error = e
+                self._record_attempt(current_model, attempt_start, e)
+                self._handle_rate_limit(current_model, e, 0)
+                print(f"⚠️ Model {current_model} stream failed: {str(e)[:100]}")
+                if stream is not None:
+                    # 中断前已输出的部分同样计费
+                    self._log_rejected(
+                        current_model,
+                        messages,
+                        start_time,
+                        usage,
+                        tags,
+                        "".join(received[attempt_received:]),
+                    )
+                if stream is not None and hasattr(stream, "close"):
                     try:
-                        print(f"📡 Calling LLM ({current_model})...")
-                        response = _call(
-                            extra_body=extra_body, reasoning_effort=reasoning_effort
-                        )
+                        stream.close()  # 释放中断的连接
+                    except Exception:
+                        pass
+                if received:
+                    print(f"   已输出 {sum(map(len, received))} 字，由下一个模型续写")
+                continue
 
-                        raw_content = response.choices[0].message.content
-                        if not raw_content:
-                            raise ValueError(
-                                f"Model {current_model} returned empty response."
-                            )
+        print("❌ All candidate models failed for stream.")
+        raise last_error
 
-                        result = str(raw_content).strip()
 
-                        if len(result) < 5:
-                            raise ValueError(
-                                f"Model {current_model} returned too short response."
-                            )
+class AsyncLLMService(BaseLLMService):
+    """
+    基于 AsyncOpenAI 的异步 LLM 服务。
+    等待网络 I/O 时不占用线程，供 async 工作流与 API 直接 await。
+    """
 
-                        duration = time.time() - start_time
-                        self._log_call(current_model, messages, result, duration)
-                        print(
-                            f"✅ LLM Response received from {current_model} ({duration:.2f}s)"
-                        )
-                        return result
+    def __init__(self, api_key=None, base_url=None):
+        super().__init__(api_key=api_key, base_url=base_url)
 
-                    except Exception as e:
-                        # 参数错误重试逻辑
-                        if (
-                            extra_body is not None or reasoning_effort is not None
-                        ) and retry_count == 0:
-                            retry_count += 1
-                            print(
-                                f"⚠️ [{current_model}] 参数不兼容，移除 extra_body 重试..."
-                            )
-                            reasoning_effort = None
-                            extra_body = None
-                            continue
-                        raise e  # 抛出给外层处理（进行模型切换）
+        if AsyncOpenAI and self.api_key:
+            try:
+                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+            except Exception as e:
+                print(f"Warning: Failed to initialize AsyncOpenAI client: {e}")
 
+    async def _request_model(
+        self,
+        model: str,
+        messages,
+        extra_body=None,
+        reasoning_effort=None,
+        response_format=None,
+    ):
+        """
+        对单个模型发起请求：先取限流令牌；response_format 不被支持时降级后重试；
+        thinking 参数不兼容时去掉重试一次；429 带较短 Retry-After 时冷却后重试同一模型。
+        其余错误抛给调用方切换模型。
+        """
+        param_retried = False
+        rate_retries = 0
+        while True:
+            request_messages, request_format = self._structured_request(
+                model, messages, response_format
+            )
+            await self.limiter.acquire_async(self._limit_key(model))
+            try:
+                print(f"📡 Calling LLM async ({model})...")
+                return await self.client.chat.completions.create(
+                    **self._build_request(
+                        model,
+                        request_messages,
+                        extra_body,
+                        reasoning_effort,
+                        response_format=request_format,
+                    )
+                )
             except Exception as e:
-                last_error = e
-                duration = time.time() - start_time
-                error_msg = str(e).lower()
-
-                # 判断是否值得切换模型
-                # 增加了 "empty/invalid response" 的检测
-                should_failover = any(
-                    code in error_msg
-                    for code in [
-                        "404",
-                        "429",
-                        "500",
-                        "not found",
-                        "rate limit",
-                        "overloaded",
-                        "empty/invalid",
-                    ]
+                if self._downgrade_format(model, request_format, e):
+                    continue
+                if (
+                    (extra_body is not None or reasoning_effort is not None)
+                    and not param_retried
+                    and self._is_param_error(e)
+                ):
+                    param_retried = True
+                    print(f"⚠️ [{model}] 参数不兼容，移除 extra_body 重试...")
+                    extra_body, reasoning_effort = None, None
+                    continue
+                if self._handle_rate_limit(model, e, rate_retries):
+                    rate_retries += 1
+                    print(f"⏳ [{model}] 429，按 Retry-After 冷却后重试...")
+                    continue
+                raise
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        validator: Callable[[str], Any] = None,
+        hedge: bool = None,
+        response_format: Dict[str, Any] = None,
+        agent: str = None,
+        project: str = None,
+        run_id: str = None,
+    ) -> str:
+        """
+        异步版 chat_completion，降级策略与 LLMService 一致。
+        hedge: 是否对冲（默认取 config.LLM_HEDGE_ENABLED）——主模型超过其延迟分位数仍未返回时，
+               同时请求下一个健康模型，取先通过 validator 校验的响应
+        validator: 判定响应是否可用（抛异常即视为无效并切换模型；对冲时取先通过校验的响应）
+        response_format: 结构化输出 schema（见 core.agent_schemas），模型不支持时自动退回提示词约束
+        agent / project / run_id: 用量统计标签（见 core.usage），不影响请求内容
+        进行中的相同调用（如 UI 重复提交）合并为一次请求，结果分发给所有等待者。
+        """
+        tags = {"agent": agent, "project": project, "run_id": run_id}
+        if not config.LLM_SINGLEFLIGHT_ENABLED:
+            return await self._chat_completion(
+                messages, model, validator, hedge, response_format, tags
+            )
+        key = flight_key(
+            model,
+            messages,
+            response_format=response_format,
+            hedge=hedge,
+            validator=getattr(validator, "__qualname__", None),
+        )
+        return await get_async_singleflight().do(
+            key,
+            lambda: self._chat_completion(
+                messages, model, validator, hedge, response_format, tags
+            ),
+        )
+
+    async def _chat_completion(
+        self,
+        messages,
+        model=None,
+        validator=None,
+        hedge=None,
+        response_format=None,
+        tags=None,
+    ) -> str:
+        start_time = time.time()
+        if not self.client:
+            error_msg = f"LLM Client not initialized. API_KEY: {'Set' if self.api_key else 'Missing'}, BASE_URL: {self.base_url}"
+            print(f"❌ {error_msg}")
+            raise ValueError(error_msg)
+
+        if hedge is None:
+            hedge = config.LLM_HEDGE_ENABLED
+        candidates = self._candidate_models(model)
+        if hedge and len(candidates) > 1:
+            return await self._hedged_completion(
+                candidates, messages, validator, start_time, response_format, tags
+            )
+
+        last_error = None
+
+        for current_model in candidates:
+            try:
+                result = await self._attempt(
+                    current_model,
+                    messages,
+                    validator,
+                    start_time,
+                    response_format,
+                    tags,
                 )
+                print(
+                    f"✅ LLM Response received from {current_model} ({time.time() - start_time:.2f}s)"
+                )
+                return result
 
-                if should_failover:
+            except Exception as e:
+                last_error = e
+
+                if self._should_failover(e):
                     print(
                         f"⚠️ Model {current_model} failed: {str(e)[:100]}... -> Trying next model"
                     )
-                    continue  # Try next model
+                    continue
 
-                # 如果是其他严重错误（如认证失败），直接终止
                 print(f"❌ Unrecoverable error on {current_model}: {e}")
                 raise e
 
-        # 所有模型都尝试失败
         print("❌ All candidate models failed.")
         raise last_error
 
-    def chat_completion_stream(self, messages: List[Dict[str, str]], model: str = None):
+    async def _attempt(
+        self,
+        model: str,
+        messages,
+        validator,
+        start_time: float,
+        response_format=None,
+        tags=None,
+    ) -> str:
+        """单个模型的完整一次尝试（请求 + 内容校验 + 健康统计 + 调用日志）"""
+        extra_body, reasoning_effort = self._thinking_params(model)
+        attempt_start = time.time()
+        response = None
+        usage = None
+        try:
+            response = await self._request_model(
+                model, messages, extra_body, reasoning_effort, response_format
+            )
+            usage = extract_usage(response)
+            result = self._check_response(
+                model,
+                self._validate_content(model, response.choices[0].message.content),
+                validator,
+            )
+        except asyncio.CancelledError:
+            # 输给另一路请求被取消，不计入健康统计
+            self.router.release(model)
+            raise
+        except Exception as e:
+            self._record_attempt(model, attempt_start, e)
+            if response is not None:
+                self._log_rejected(model, messages, start_time, usage, tags)
+            raise
+        self._record_attempt(model, attempt_start)
+        self._log_call(
+            model,
+            messages,
+            result,
+            time.time() - start_time,
+            usage=usage,
+            tags=tags,
+        )
+        return result
+
+    async def _hedged_completion(
+        self,
+        candidates: List[str],
+        messages,
+        validator,
+        start_time: float,
+        response_format=None,
+        tags=None,
+    ) -> str:
         """
-        调用 LLM 生成流式回复，支持自动模型降级 (Failover)。
+        对冲请求：主模型超过延迟阈值未返回时再请求下一个候选模型，
+        先返回有效响应者胜出，另一路被取消；某一路失败时继续补位下一个候选。
         """
-        start_time = time.time()
-        if not self.client:
-            raise ValueError("LLM Client not initialized")
+        queue = list(candidates)
+        running: Dict[asyncio.Task, str] = {}
+        hedge_fired = False
+        last_error = None
 
-        # 确定模型尝试序列 (同上)
-        candidate_models = list(config.MODEL_PRIORITY_LIST)
-        requested_model = model or config.DEFAULT_MODEL
-        if requested_model not in candidate_models:
-            candidate_models.insert(0, requested_model)
-        else:
-            candidate_models.remove(requested_model)
-            candidate_models.insert(0, requested_model)
+        def launch():
+            current_model = queue.pop(0)
+            print(f"📡 Calling LLM async ({current_model}, hedged)...")
+            task = asyncio.ensure_future(
+                self._attempt(
+                    current_model,
+                    messages,
+                    validator,
+                    start_time,
+                    response_format,
+                    tags,
+                )
+            )
+            running[task] = current_model
 
-        last_error = None
+        launch()
+        primary = candidates[0]
+        deadline = self._hedge_delay(primary)
+        try:
+            while running:
+                timeout = deadline if (queue and not hedge_fired) else None
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # 主模型超过阈值仍未返回：对冲到下一个候选
+                    hedge_fired = True
+                    print(f"🔀 {primary} 超过 {deadline:.1f}s 未返回，对冲请求 {queue[0]}")
+                    launch()
+                    continue
+
+                for task in done:
+                    current_model = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        if not self._should_failover(e):
+                            raise
+                        print(f"⚠️ Model {current_model} failed: {str(e)[:100]}")
+                        continue
+                    self.router.record_hedge(
+                        hedge_fired, backup_won=hedge_fired and current_model != primary
+                    )
+                    duration = time.time() - start_time
+                    print(
+                        f"✅ LLM Response received from {current_model} ({duration:.2f}s)"
+                    )
+                    return result
+
+                # 失败的一路由下一个候选补位，保持并发路数不变
+                if queue and len(running) < (2 if hedge_fired else 1):
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
 
-        for current_model in candidate_models:
+        self.router.record_hedge(hedge_fired)
+        print("❌ All candidate models failed.")
+        raise last_error
+
+    async def _open_stream(
+        self, model: str, messages, extra_body, reasoning_effort, response_format=None
+    ):
+        while True:
+            request_messages, request_format = self._structured_request(
+                model, messages, response_format
+            )
+            await self.limiter.acquire_async(self._limit_key(model))
             try:
+                return await self.client.chat.completions.create(
+                    **self._build_request(
+                        model,
+                        request_messages,
+                        extra_body,
+                        reasoning_effort,
+                        stream=True,
+                        response_format=request_format,
+                    )
+                )
+            except Exception as e:
+                if self._downgrade_format(model, request_format, e):
+                    continue
+                if (
+                    extra_body is None and reasoning_effort is None
+                ) or not self._is_param_error(e):
+                    raise
+                print(f"⚠️ [{model}] 参数不兼容，移除 extra_body 重试...")
+                extra_body, reasoning_effort = None, None
 
-                def _call_stream(extra_body, reasoning_effort):
-                    kwargs = {
-                        "model": current_model,
-                        "messages": messages,
-                        "temperature": 0.7,
-                        "timeout": 60.0,
-                        "stream": True,
-                    }
-                    if reasoning_effort:
-                        kwargs["reasoning_effort"] = reasoning_effort
-                    if extra_body:
-                        kwargs["extra_body"] = extra_body
-                    return self.client.chat.completions.create(**kwargs)
-
-                # Gemini 参数配置
-                reasoning_effort = None
-                extra_body = None
-                # ... (同样的参数配置逻辑) ...
-
-                # 执行流式调用
-                print(f"📡 Calling LLM Stream ({current_model})...")
-                full_response = ""
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        response_format: Dict[str, Any] = None,
+        agent: str = None,
+        project: str = None,
+        run_id: str = None,
+    ) -> AsyncIterator[str]:
+        """
+        异步流式回复，逐块产出文本。
+        中途报错或卡顿时切换模型续写，语义与 LLMService.chat_completion_stream 一致。
+        """
+        start_time = time.time()
+        if not self.client:
+            raise ValueError("LLM Client not initialized")
 
-                # 注意：流式调用在这里只是建立连接，如果在迭代过程中报错，很难在这里捕获并切换模型
-                # 所以我们主要捕获建立连接时的错误
-                stream = _call_stream(extra_body, reasoning_effort)
+        last_error = None
+        received: List[str] = []
+        stall_seconds = config.LLM_STREAM_STALL_SECONDS
+        tags = {"agent": agent, "project": project, "run_id": run_id}
 
-                for chunk in stream:
-                    if chunk.choices and chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        full_response += content
+        for current_model in self._candidate_models(model):
+            attempt_start = time.time()
+            extra_body, reasoning_effort = self._thinking_params(current_model)
+            request_messages = messages
+            request_format = response_format
+            trimmer = None
+            stream = None
+            if received:
+                text = "".join(received)
+                request_messages = self._continuation_messages(messages, text)
+                request_format = None
+                trimmer = _OverlapTrimmer(text)
+            attempt_received = len(received)
+            usage = None
+            try:
+                print(f"📡 Calling LLM Stream async ({current_model})...")
+                stream = await self._open_stream(
+                    current_model,
+                    request_messages,
+                    extra_body,
+                    reasoning_effort,
+                    request_format,
+                )
+                iterator = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            iterator.__anext__(), timeout=stall_seconds
+                        )
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise StreamStalledError(
+                            f"Stream from {current_model} timed out: "
+                            f"no data for {stall_seconds:.0f}s"
+                        )
+                    usage = extract_usage(chunk) or usage
+                    content = self._chunk_text(chunk)
+                    if content and trimmer:
+                        content = trimmer.feed(content)
+                    if content:
+                        received.append(content)
+                        yield content
+                if trimmer:
+                    content = trimmer.flush()
+                    if content:
+                        received.append(content)
                         yield content
 
-                # 成功完成
                 duration = time.time() - start_time
-                self._log_call(current_model, messages, full_response, duration)
+                self._log_call(
+                    current_model,
+                    messages,
+                    "".join(received),
+                    duration,
+                    usage=usage,
+                    tags=tags,
+                )
+                self._record_attempt(current_model, attempt_start)
                 print(f"✅ LLM Stream completed from {current_model} ({duration:.2f}s)")
                 return
 
             except Exception as e:
                 last_error = e
+                self._record_attempt(current_model, attempt_start, e)
+                self._handle_rate_limit(current_model, e, 0)
                 print(f"⚠️ Model {current_model} stream failed: {str(e)[:100]}")
-                # 简单判断是否继续尝试下一个模型
+                if stream is not None:
+                    # 中断前已输出的部分同样计费
+                    self._log_rejected(
+                        current_model,
+                        messages,
+                        start_time,
+                        usage,
+                        tags,
+                        "".join(received[attempt_received:]),
+                    )
+                if stream is not None and hasattr(stream, "close"):
+                    try:
+                        await stream.close()  # 释放中断的连接
+                    except Exception:
+                        pass
+                if received:
+                    print(f"   已输出 {sum(map(len, received))} 字，由下一个模型续写")
                 continue
 
         print("❌ All candidate models failed for stream.")
@@ -3,21 +3,32 @@ import sys
 import time
 import re
 import json
+import asyncio
+import uuid
 import concurrent.futures
 from datetime import datetime
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Optional
 
 # Add current directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from llm_wrapper import LLMService
+from llm_wrapper import LLMService, AsyncLLMService
 from image_gen import ImageGenService
 import config
+from core.agent_schemas import JSON_OUTPUT_INSTRUCTION, response_format_for
+from core.analysis_index import get_analysis_index
 from core.config_manager import config_manager
 from core.response_processor import LLMResponseProcessor
+from core.scheduler import StepGraph, RunReport
+from core.stream_parser import PromptStreamParser
+from core.step_cache import get_step_cache, make_cache_key
+from core.service_container import get_service_container
+from core.usage import get_usage_tracker, project_usage
 from config import logger
 from services.project_service import ProjectService
 from services import db_service
+from services.run_checkpoint import RunCheckpoint
+from services.state_writer import ProjectStateWriter
 
 
 class DesignWorkflowError(Exception):
@@ -31,9 +42,11 @@ class DesignWorkflowError(Exception):
 
 
 class DesignWorkflow:
-    def __init__(self, project_name=None, custom_config=None):
+    def __init__(self, project_name=None, custom_config=None, use_cache=True):
         self.project_name = project_name
         self.custom_config = custom_config or {}
+        # 用户主动重新生成时为 False：不读步骤缓存与相似需求复用，新结果仍写回缓存
+        self.use_cache = use_cache
 
         api_key = (
             self.custom_config.get("OPENAI_API_KEY") or config_manager.openai_api_key
@@ -41,31 +54,29 @@ class DesignWorkflow:
         base_url = (
             self.custom_config.get("OPENAI_BASE_URL") or config_manager.openai_base_url
         )
-        self.llm = LLMService(api_key=api_key, base_url=base_url)
+        self.llm = self._create_llm(api_key, base_url)
 
         jimeng_script = (
             self.custom_config.get("JIMENG_SERVER_SCRIPT")
             or config.JIMENG_SERVER_SCRIPT
         )
-        self.image_gen = ImageGenService(server_script_path=jimeng_script)
+        self.services = get_service_container()
+        self.image_gen = self.services.image_gen(jimeng_script, factory=ImageGenService)
 
         self.history = []
         self.generated_images = []
         self.output_dir = "MEMORY_ONLY"
         self.model = self.custom_config.get("DEFAULT_MODEL", config.DEFAULT_MODEL)
+        # 本次运行的标识（token 用量按 run_id 汇总），run_all 时由 run 设置
+        self.run_id = None
+        # 插图的本地输出目录，首次生成图片时才创建
         self.temp_dir = os.path.join(
             "/tmp", f"design_{self.project_name}_{int(time.time())}"
         )
-        os.makedirs(self.temp_dir, exist_ok=True)
-        self.knowledge_base = self._load_knowledge_base()
+        self.knowledge_base = self.services.knowledge_base()
 
-    def _load_knowledge_base(self):
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        kb_path = os.path.join(root_dir, "KNOWLEDGE.md")
-        if os.path.exists(kb_path):
-            with open(kb_path, "r", encoding="utf-8") as f:
-                return f.read()
-        return "暂无外部知识库。"
+    def _create_llm(self, api_key, base_url):
+        return get_service_container().llm(api_key, base_url, factory=LLMService)
 
     def log(self, message):
         logger.info(message)
@@ -75,13 +86,10 @@ class DesignWorkflow:
         if "{knowledge}" in template and "knowledge" not in kwargs:
             kwargs["knowledge"] = self.knowledge_base
 
+        # 启用结构化输出时由 response_format 约束格式，不再追加 JSON 指令；
+        # 降级到 json_object 或提示词约束的模型由 llm_wrapper 在发送前补回该指令
         system_instruction = (
-            "\n\nCRITICAL INSTRUCTION:\n"
-            "1. You are a specialized design assistant API. You MUST output ONLY valid raw JSON.\n"
-            "2. DO NOT include any conversational text, explanations, or 'Sure, I can help with that' style messages.\n"
-            "3. DO NOT wrap the output in markdown code blocks like ```json.\n"
-            "4. Start your response with '{' and end with '}'.\n"
-            "5. Strictly follow the JSON schema defined in your task instructions."
+            "" if config.LLM_STRUCTURED_OUTPUT else JSON_OUTPUT_INSTRUCTION
         )
 
         try:
@@ -89,6 +97,30 @@ class DesignWorkflow:
         except KeyError:
             return default_template.format(**kwargs) + system_instruction
 
+    @staticmethod
+    def _extract_prompt_text(item) -> str:
+        """Robust prompt extraction from a prompts/visuals item."""
+        if not isinstance(item, dict):
+            return ""
+        return (
+            item.get("prompt") or item.get("提示词") or item.get("drawing_prompt") or ""
+        )
+
+    @staticmethod
+    def _compose_markdown(data: Dict, image_urls: List[str]) -> str:
+        """Summary header + illustration images + body content."""
+        summary = data.get("summary", "")
+        # Support 'content' or fallback to empty if it's purely a list-based response
+        content = data.get("content", "")
+
+        final_content = ""
+        if summary:
+            final_content += f"> 💡 **核心摘要**: {summary}\n\n"
+        for img_url in image_urls:
+            final_content += f"\n![Concept]({img_url})\n"
+        final_content += content
+        return final_content
+
     def _process_llm_json_response(
         self, raw_response: str, processor_func
     ) -> Tuple[str, List[Dict], Dict]:
@@ -102,56 +134,118 @@ class DesignWorkflow:
             # 1. Process data using the specific processor (e.g., process_market_analysis)
             data = processor_func(raw_response)
 
-            # 2. Extract standard fields
-            summary = data.get("summary", "")
-            # Support 'content' or fallback to empty if it's purely a list-based response
-            content = data.get("content", "")
-
-            # 3. Extract prompts/visuals (handled polymorphically)
+            # 2. Extract prompts/visuals (handled polymorphically)
             prompts = data.get("prompts") or data.get("visuals") or []
 
-            # 4. Construct Markdown Content
-            final_content = ""
-            if summary:
-                final_content += f"> 💡 **核心摘要**: {summary}\n\n"
-
-            # 5. Generate Images if prompts exist
+            # 3. Generate Images if prompts exist
+            image_urls = []
             if prompts and self.project_name:
                 self.log(f"    - 生成 {len(prompts)} 个可视化插图...")
                 for item in prompts:
-                    if not isinstance(item, dict):
-                        continue
-
-                    # Robust prompt extraction
-                    p_text = (
-                        item.get("prompt")
-                        or item.get("提示词")
-                        or item.get("drawing_prompt")
-                        or ""
-                    )
-
+                    p_text = self._extract_prompt_text(item)
                     if p_text:
                         img_url = self.image_gen.generate_image(
                             p_text, self.temp_dir, project_name=self.project_name
                         )
                         if img_url:
-                            final_content += f"\n![Concept]({img_url})\n"
+                            image_urls.append(img_url)
                             item["image_path"] = img_url
                             self.generated_images.append(img_url)
 
-            final_content += content
-
-            return final_content, prompts, data
+            # 4. Construct Markdown Content
+            return self._compose_markdown(data, image_urls), prompts, data
 
         except Exception as e:
             logger.error(f"Processing failed: {e}")
             logger.error(f"Raw response: {raw_response[:500]}...")
             raise DesignWorkflowError(f"处理响应失败: {e}")
 
+    def _cache_lookup(self, agent: str, messages: List[Dict[str, str]]):
+        """查询步骤缓存，返回 (cache_key, cached_response)"""
+        cache = get_step_cache()
+        if not cache:
+            return None, None
+        key = make_cache_key(agent, self.model, messages, LLMResponseProcessor.VERSION)
+        if not self.use_cache:
+            return key, None
+        cached = cache.get(key)
+        if cached is not None:
+            self.log(f"    - ♻️ 命中步骤缓存 ({agent})，跳过 LLM 调用")
+        return key, cached
+
+    def _cache_store(self, key, agent: str, response: str, processor_func):
+        """只缓存完整且能被解析器正确处理的响应（被截断后补全的不缓存）"""
+        cache = get_step_cache()
+        if not cache or key is None:
+            return
+        try:
+            LLMResponseProcessor.strict(processor_func)(response)
+        except Exception:
+            return
+        cache.set(key, response, agent=agent, model=self.model)
+
+    @staticmethod
+    def _response_format(agent: str):
+        """Agent 的结构化输出 schema（LLM_STRUCTURED_OUTPUT=0 时不使用）"""
+        return response_format_for(agent) if config.LLM_STRUCTURED_OUTPUT else None
+
+    def _usage_tags(self, agent: str) -> Dict[str, str]:
+        """LLM 调用的用量统计标签"""
+        return {"agent": agent, "project": self.project_name, "run_id": self.run_id}
+
+    def _similar_analysis(self, brief) -> Optional[Dict[str, Any]]:
+        """查找其他项目中需求相似的市场分析（未启用或未命中时返回 None）"""
+        index = get_analysis_index()
+        if not index or not self.use_cache:
+            return None
+        match = index.lookup(
+            brief, config.ANALYSIS_REUSE_THRESHOLD, exclude=self.project_name
+        )
+        if match is not None:
+            self.log(
+                f"    - 🔁 相似需求命中 ({match['key']}, 相似度 {match['score']:.2f})，"
+                f"模式: {config.ANALYSIS_REUSE_MODE}"
+            )
+        return match
+
+    def _seed_prompt(self, match: Dict[str, Any]) -> str:
+        """seed 模式：把相似需求的既有分析作为参考附加到 prompt"""
+        reference = self._compose_markdown(match["analysis"], [])
+        return (
+            f"\n\n参考资料：以下是相似需求「{match['brief']}」的既有市场分析，"
+            f"请结合本次需求核对、修正并补充，不要照搬：\n{reference}\n"
+        )
+
+    def _index_analysis(self, brief, data: Dict):
+        """把本项目的需求与市场分析写入相似度索引，供后续相似需求复用"""
+        index = get_analysis_index()
+        if not index or not self.project_name:
+            return
+        try:
+            index.add(self.project_name, brief, data)
+        except Exception as e:
+            logger.error(f"写入市场分析索引失败: {e}")
+
+    def _complete(self, agent: str, messages: List[Dict[str, str]], processor_func):
+        key, cached = self._cache_lookup(agent, messages)
+        if cached is not None:
+            return cached
+        response = self.llm.chat_completion(
+            messages,
+            model=self.model,
+            validator=LLMResponseProcessor.strict(processor_func),
+            response_format=self._response_format(agent),
+            **self._usage_tags(agent),
+        )
+        self._cache_store(key, agent, response, processor_func)
+        return response
+
     def step_market_analysis(self, brief, stream=False):
         prompt = self._get_prompt("market_analyst", "请进行市场分析", brief=brief)
         messages = [{"role": "user", "content": prompt}]
-        response = self.llm.chat_completion(messages)
+        response = self._complete(
+            "market_analyst", messages, LLMResponseProcessor.process_market_analysis
+        )
         return self._process_llm_json_response(
             response, LLMResponseProcessor.process_market_analysis
         )
@@ -164,7 +258,9 @@ class DesignWorkflow:
             market_analysis=market_analysis,
         )
         messages = [{"role": "user", "content": prompt}]
-        response = self.llm.chat_completion(messages)
+        response = self._complete(
+            "visual_researcher", messages, LLMResponseProcessor.process_visual_research
+        )
         return self._process_llm_json_response(
             response, LLMResponseProcessor.process_visual_research
         )
@@ -188,7 +284,9 @@ class DesignWorkflow:
         )
         full_prompt = base_prompt + (f"\n视角：{persona}\n" if persona else "")
         messages = [{"role": "user", "content": full_prompt}]
-        response = self.llm.chat_completion(messages)
+        response = self._complete(
+            "product_designer", messages, LLMResponseProcessor.process_design_generation
+        )
 
         # Returns: (markdown_str, prompts_list, full_data_dict)
         md, prompts, data = self._process_llm_json_response(
@@ -226,7 +324,8 @@ class DesignWorkflow:
             for future in concurrent.futures.as_completed(future_to_index):
                 img_url = future.result()
                 if img_url:
-                    prompts_list[idx := future_to_index[future]]["image_path"] = img_url
+                    idx = future_to_index[future]
+                    prompts_list[idx]["image_path"] = img_url
                     self.generated_images.append(img_url)
 
         if not skip_json_update:
@@ -244,16 +343,14 @@ class DesignWorkflow:
         }
         field = mapping.get(filename)
         if field:
-            proj = db_service.db_get_project(self.project_name)
-            existing = proj.get("content", {}) if proj else {}
-            existing[field] = content
-            db_service.save_project_content(self.project_name, existing)
+            # 只发送变化的字段，由数据库原子合并
+            db_service.save_project_content(self.project_name, {field: content})
 
     def run(self, product_brief: str):
         self.log(f"🚀 启动 AI 设计工作流 (纯云端)，目标: {product_brief}")
-        ma, _ = self.step_market_analysis(product_brief)
+        ma, _, _ = self.step_market_analysis(product_brief)
         self._save_intermediate("1_Market_Analysis.md", ma)
-        vr, _ = self.step_visual_research(product_brief, ma)
+        vr, _, _ = self.step_visual_research(product_brief, ma)
         self._save_intermediate("2_Visual_Research.md", vr)
         dp_json, prompts = self.step_design_generation(product_brief, ma, vr)
         self._save_intermediate("3_Design_Proposals.json", dp_json)
@@ -264,6 +361,539 @@ class DesignWorkflow:
         self.log("📄 工作流完成，已同步至 Supabase")
 
 
+class AsyncDesignWorkflow(DesignWorkflow):
+    """
+    DesignWorkflow 的 async 版本：LLM、即梦与 Supabase 调用全部 await，
+    等待网络 I/O 时不占用线程，单个 uvicorn worker 即可驱动大量并发项目。
+    """
+
+    def __init__(self, project_name=None, custom_config=None, use_cache=True):
+        super().__init__(
+            project_name=project_name, custom_config=custom_config, use_cache=use_cache
+        )
+        # 整个工作流共享的图片并发上限（DAG 中多个插图节点可能同时运行）
+        self._image_semaphore = asyncio.Semaphore(config.MAX_CONCURRENT_IMAGES)
+        # run_all 的持久化检查点（由 run 设置），单步调用时为 None
+        self.checkpoint: Optional[RunCheckpoint] = None
+        # 运行期间的项目状态在内存中合并，步骤边界/定时器触发时才写库
+        self.state = ProjectStateWriter(project_name)
+        # 运行开始时项目中已保存的 token 用量（本次运行在其上累加）
+        self._stored_usage = None
+
+    def _create_llm(self, api_key, base_url):
+        return get_service_container().async_llm(
+            api_key, base_url, factory=AsyncLLMService
+        )
+
+    async def _generate_images_concurrently(
+        self, prompts: List[Dict], session_id=None
+    ) -> List[str]:
+        """
+        并发生成 prompts 中每一项的图片（受 MAX_CONCURRENT_IMAGES 限制），保持原顺序。
+        已有 image_path 的项（如从检查点恢复）直接复用，不重复生成。
+        """
+
+        async def generate_single(item):
+            if not isinstance(item, dict):
+                return None
+            if item.get("image_path"):
+                return item["image_path"]
+            p_text = self._extract_prompt_text(item)
+            if not p_text:
+                return None
+            async with self._image_semaphore:
+                img_url = await self.image_gen.generate_image_async(
+                    p_text,
+                    self.temp_dir,
+                    session_id=session_id,
+                    project_name=self.project_name,
+                )
+            if img_url:
+                item["image_path"] = img_url
+                self.generated_images.append(img_url)
+                await self._on_image_done()
+            return img_url
+
+        results = await asyncio.gather(*(generate_single(item) for item in prompts))
+        return [url for url in results if url]
+
+    async def _on_image_done(self):
+        """每张图片上传完成后更新检查点，由定时 flush 落库，重启后不会重复生成"""
+        if self.checkpoint is not None:
+            await self._persist({}, flush=False)
+
+    def _parse_llm_json_response(self, raw_response: str, processor_func) -> Dict:
+        """解析 LLM 响应（不生成插图），失败时抛出 DesignWorkflowError"""
+        logger.info(f"LLM Response processing. Length: {len(raw_response)}")
+        try:
+            return processor_func(raw_response)
+        except Exception as e:
+            logger.error(f"Processing failed: {e}")
+            logger.error(f"Raw response: {raw_response[:500]}...")
+            raise DesignWorkflowError(f"处理响应失败: {e}")
+
+    async def illustrate(self, data: Dict) -> str:
+        """为分析结果生成插图并拼装 Markdown（插图失败不影响正文）"""
+        prompts = data.get("prompts") or data.get("visuals") or []
+        image_urls = []
+        if prompts and self.project_name:
+            self.log(f"    - 生成 {len(prompts)} 个可视化插图...")
+            image_urls = await self._generate_images_concurrently(prompts)
+        return self._compose_markdown(data, image_urls)
+
+    async def _process_llm_json_response(
+        self, raw_response: str, processor_func
+    ) -> Tuple[str, List[Dict], Dict]:
+        data = self._parse_llm_json_response(raw_response, processor_func)
+        markdown = await self.illustrate(data)
+        return markdown, data.get("prompts") or data.get("visuals") or [], data
+
+    async def _complete(
+        self, agent: str, messages: List[Dict[str, str]], processor_func
+    ):
+        key, cached = self._cache_lookup(agent, messages)
+        if cached is not None:
+            return cached
+        # 以解析器校验结果：被截断的响应视为无效，切换模型重试；对冲时先返回完整响应的模型胜出
+        response = await self.llm.chat_completion(
+            messages,
+            model=self.model,
+            validator=LLMResponseProcessor.strict(processor_func),
+            response_format=self._response_format(agent),
+            **self._usage_tags(agent),
+        )
+        self._cache_store(key, agent, response, processor_func)
+        return response
+
+    async def analyze_market(self, brief) -> Dict:
+        match = self._similar_analysis(brief)
+        if match is not None and config.ANALYSIS_REUSE_MODE == "reuse":
+            return match["analysis"]
+        prompt = self._get_prompt("market_analyst", "请进行市场分析", brief=brief)
+        if match is not None:
+            prompt += self._seed_prompt(match)
+        messages = [{"role": "user", "content": prompt}]
+        response = await self._complete(
+            "market_analyst", messages, LLMResponseProcessor.process_market_analysis
+        )
+        data = self._parse_llm_json_response(
+            response, LLMResponseProcessor.process_market_analysis
+        )
+        self._index_analysis(brief, data)
+        return data
+
+    async def research_visuals(self, brief, market_analysis) -> Dict:
+        prompt = self._get_prompt(
+            "visual_researcher",
+            "请进行视觉调研",
+            brief=brief,
+            market_analysis=market_analysis,
+        )
+        messages = [{"role": "user", "content": prompt}]
+        response = await self._complete(
+            "visual_researcher", messages, LLMResponseProcessor.process_visual_research
+        )
+        return self._parse_llm_json_response(
+            response, LLMResponseProcessor.process_visual_research
+        )
+
+    async def step_market_analysis(self, brief, stream=False):
+        data = await self.analyze_market(brief)
+        markdown = await self.illustrate(data)
+        return markdown, data.get("visuals") or [], data
+
+    async def step_visual_research(self, brief, market_analysis, stream=False):
+        data = await self.research_visuals(brief, market_analysis)
+        markdown = await self.illustrate(data)
+        return markdown, data.get("visuals") or [], data
+
+    def _design_messages(
+        self, brief, market_analysis, visual_research, image_count=4, persona=""
+    ) -> List[Dict[str, str]]:
+        base_prompt = self._get_prompt(
+            "product_designer",
+            "请输出设计方案",
+            brief=brief,
+            market_analysis=market_analysis,
+            visual_research=visual_research,
+            image_count=image_count,
+        )
+        full_prompt = base_prompt + (f"\n视角：{persona}\n" if persona else "")
+        return [{"role": "user", "content": full_prompt}]
+
+    async def step_design_generation(
+        self,
+        brief,
+        market_analysis,
+        visual_research,
+        image_count=4,
+        persona="",
+        stream=False,
+    ):
+        messages = self._design_messages(
+            brief, market_analysis, visual_research, image_count, persona
+        )
+        response = await self._complete(
+            "product_designer", messages, LLMResponseProcessor.process_design_generation
+        )
+
+        # 设计方案的图片由 step_image_generation 统一生成，这里只解析
+        data = self._parse_llm_json_response(
+            response, LLMResponseProcessor.process_design_generation
+        )
+        return json.dumps(data, ensure_ascii=False), data.get("prompts") or []
+
+    async def stream_design_generation(
+        self, brief, market_analysis, visual_research, image_count=4, persona=""
+    ) -> Tuple[Dict, Dict[int, asyncio.Task]]:
+        """
+        流式生成设计方案：prompts[i] 一旦在流中闭合就立即送入图片池，
+        首张图片不必等待 LLM 输出最后一个 token。
+        返回 (解析后的完整方案, {方案在 prompts 中的下标: 图片任务})
+        """
+        messages = self._design_messages(
+            brief, market_analysis, visual_research, image_count, persona
+        )
+        parser = PromptStreamParser()
+        chunks: List[str] = []
+        image_tasks: Dict[int, asyncio.Task] = {}
+        start = time.time()
+
+        async def render(item: Dict):
+            p_text = self._extract_prompt_text(item)
+            if not p_text or not self.project_name:
+                return None
+            async with self._image_semaphore:
+                img_url = await self.image_gen.generate_image_async(
+                    p_text, self.temp_dir, project_name=self.project_name
+                )
+            if img_url:
+                self.generated_images.append(img_url)
+            return img_url
+
+        key, cached = self._cache_lookup("product_designer", messages)
+        if cached is not None:
+            pieces = _single_piece(cached)
+        else:
+            pieces = self.llm.chat_completion_stream(
+                messages,
+                model=self.model,
+                response_format=self._response_format("product_designer"),
+                **self._usage_tags("product_designer"),
+            )
+
+        try:
+            async for piece in pieces:
+                chunks.append(piece)
+                for index, item in parser.feed(piece):
+                    if not image_tasks:
+                        self.log(
+                            f"    - 首个方案在 {time.time() - start:.2f}s 到达，开始出图"
+                        )
+                    image_tasks[index] = asyncio.ensure_future(render(item))
+        except BaseException:
+            for task in image_tasks.values():
+                task.cancel()
+            raise
+
+        response = "".join(chunks)
+        data = self._parse_llm_json_response(
+            response, LLMResponseProcessor.process_design_generation
+        )
+        if cached is None:
+            self._cache_store(
+                key,
+                "product_designer",
+                response,
+                LLMResponseProcessor.process_design_generation,
+            )
+        return data, image_tasks
+
+    async def collect_streamed_images(
+        self, data: Dict, image_tasks: Dict[int, asyncio.Task]
+    ) -> List[Dict]:
+        """
+        等待流式阶段启动的图片任务，按数组下标把结果回填到方案中；未被流式覆盖的方案补生成
+        """
+        prompts = data.get("prompts") or []
+
+        async def attach(i, task):
+            try:
+                url = await task
+            except Exception as e:
+                logger.error(f"流式出图失败: {e}")
+                return
+            if url and i < len(prompts) and isinstance(prompts[i], dict):
+                prompts[i]["image_path"] = url
+                await self._on_image_done()
+
+        await asyncio.gather(*(attach(i, task) for i, task in image_tasks.items()))
+
+        # 流中未识别出的方案（或出图失败的方案）补生成
+        missing = [
+            item
+            for item in prompts
+            if isinstance(item, dict) and item.get("prompt") and not item.get("image_path")
+        ]
+        if missing:
+            await self._generate_images_concurrently(missing)
+        return prompts
+
+    async def step_image_generation(
+        self, prompts_list: List[Dict], session_id=None, skip_json_update=False
+    ):
+        if not prompts_list or not self.project_name:
+            return
+        valid_items = [item for item in prompts_list if item.get("prompt")]
+        await self._generate_images_concurrently(valid_items, session_id=session_id)
+
+        if not skip_json_update:
+            fixed_images = ProjectService.fix_image_urls(self.generated_images)
+            await db_service.db_update_project_async(
+                self.project_name, images=fixed_images
+            )
+
+    def build_graph(
+        self, product_brief: str, image_count=4, persona="", stream=False
+    ) -> StepGraph:
+        """
+        构建工作流依赖图：
+            market_analysis ──> market_images
+                  │
+                  └──> visual_research ──> visual_images
+                              │
+                              └──> design_generation ──> image_generation
+        插图渲染与下游 LLM 调用并行，不再阻塞下一步。
+        节点只负责计算，结果的持久化由 _on_node_finished 统一完成。
+        stream=True 时 design_generation 流式输出，方案图片边生成边出图，
+        image_generation 只负责等待并回填结果。
+        """
+        graph = StepGraph()
+
+        async def market_analysis():
+            return await self.analyze_market(product_brief)
+
+        async def market_images(market_analysis):
+            return await self.illustrate(market_analysis)
+
+        async def visual_research(market_analysis):
+            # 下游 LLM 只需要文字内容，插图链接不影响分析
+            return await self.research_visuals(
+                product_brief, self._compose_markdown(market_analysis, [])
+            )
+
+        async def visual_images(visual_research):
+            return await self.illustrate(visual_research)
+
+        async def design_generation(market_analysis, visual_research):
+            args = (
+                product_brief,
+                self._compose_markdown(market_analysis, []),
+                self._compose_markdown(visual_research, []),
+            )
+            if stream:
+                data, image_tasks = await self.stream_design_generation(
+                    *args, image_count=image_count, persona=persona
+                )
+            else:
+                dp_json, _ = await self.step_design_generation(
+                    *args, image_count=image_count, persona=persona
+                )
+                data, image_tasks = json.loads(dp_json), None
+            return {"data": data, "image_tasks": image_tasks}
+
+        async def image_generation(design_generation):
+            data = design_generation["data"]
+            if design_generation["image_tasks"] is not None:
+                prompts = await self.collect_streamed_images(
+                    data, design_generation["image_tasks"]
+                )
+            else:
+                prompts = data.get("prompts") or []
+                await self.step_image_generation(prompts, skip_json_update=True)
+            data["prompts"] = prompts
+            return data
+
+        graph.add("market_analysis", market_analysis)
+        graph.add("market_images", market_images, deps=["market_analysis"])
+        graph.add("visual_research", visual_research, deps=["market_analysis"])
+        graph.add("visual_images", visual_images, deps=["visual_research"])
+        graph.add(
+            "design_generation",
+            design_generation,
+            deps=["market_analysis", "visual_research"],
+        )
+        graph.add("image_generation", image_generation, deps=["design_generation"])
+        return graph
+
+    # DAG 节点完成后写入 content 的字段
+    NODE_CONTENT_FIELDS = {
+        "market_images": "market_analysis",
+        "visual_images": "visual_research",
+        "design_generation": "design_proposals",
+        "image_generation": "design_proposals",
+    }
+
+    @staticmethod
+    def _checkpoint_value(node: str, result):
+        # 图片任务不可序列化，检查点只保留方案数据（恢复时走非流式出图）
+        if node == "design_generation":
+            return result["data"]
+        return result
+
+    @staticmethod
+    def _restore_value(node: str, value):
+        if node == "design_generation":
+            return {"data": value, "image_tasks": None}
+        return value
+
+    async def _persist(self, fields: Dict[str, Any], flush=True):
+        """合并 content 字段与检查点到状态写入器；flush=True 时立即写库（步骤边界）"""
+        if not self.project_name:
+            return
+        patch = dict(fields)
+        if self.checkpoint is not None:
+            self.checkpoint.touch()
+            patch.update(self.checkpoint.to_content())
+        if self.run_id is not None:
+            patch["usage"] = project_usage(
+                self._stored_usage,
+                self.run_id,
+                get_usage_tracker().summary(run_id=self.run_id),
+            )
+        self.state.merge_content(patch)
+        if flush:
+            await self.state.flush()
+
+    async def _on_node_finished(self, node: str, result):
+        fields = {}
+        field = self.NODE_CONTENT_FIELDS.get(node)
+        if field:
+            value = self._checkpoint_value(node, result)
+            fields[field] = (
+                value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+            )
+        if self.checkpoint is not None:
+            self.checkpoint.record(node, self._checkpoint_value(node, result))
+        if fields or self.checkpoint is not None:
+            await self._persist(fields)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(config.RUN_HEARTBEAT_SECONDS)
+            await self._persist({})
+
+    @staticmethod
+    def _collect_images(results: Dict[str, Any]) -> List[str]:
+        images = []
+        for node, key in (
+            ("market_analysis", "visuals"),
+            ("visual_research", "visuals"),
+            ("image_generation", "prompts"),
+        ):
+            data = results.get(node) or {}
+            for item in data.get(key) or []:
+                if isinstance(item, dict) and item.get("image_path"):
+                    images.append(item["image_path"])
+        return images
+
+    async def run(
+        self,
+        product_brief: str,
+        image_count=4,
+        persona="",
+        on_step=None,
+        stream=None,
+        checkpoint: Optional[RunCheckpoint] = None,
+    ) -> RunReport:
+        """
+        按依赖图执行完整工作流，返回包含关键路径的运行报告。
+        on_step: 节点开始时的回调（async），用于更新 current_step
+        stream: 是否流式生成设计方案并边生成边出图（默认取 config.STREAM_DESIGN_IMAGES）
+        checkpoint: 持久化检查点；其中已完成的节点会被跳过（用于重启后续跑）
+        """
+        self.checkpoint = checkpoint
+        self.run_id = checkpoint.run_id if checkpoint is not None else uuid.uuid4().hex
+        if self.project_name:
+            project = await db_service.db_get_project_async(self.project_name)
+            content = (project or {}).get("content")
+            self._stored_usage = content.get("usage") if isinstance(content, dict) else None
+        skip = {}
+        if checkpoint is not None:
+            skip = {
+                node: self._restore_value(node, value)
+                for node, value in checkpoint.completed_nodes.items()
+            }
+        if skip:
+            self.log(f"♻️ 从检查点恢复，跳过已完成节点: {', '.join(skip)}")
+        else:
+            self.log(f"🚀 启动 AI 设计工作流 (async DAG)，目标: {product_brief}")
+
+        if stream is None:
+            stream = config.STREAM_DESIGN_IMAGES
+        graph = self.build_graph(
+            product_brief, image_count=image_count, persona=persona, stream=stream
+        )
+
+        self.state.start()
+        heartbeat = asyncio.ensure_future(self._heartbeat()) if checkpoint else None
+        try:
+            report = await graph.run(
+                on_start=on_step, skip=skip, on_finish=self._on_node_finished
+            )
+        except asyncio.CancelledError:
+            # 进程关闭或任务被取消不是运行失败：检查点保持 running 与最后一次心跳，
+            # 心跳过期后由 reaper 认领续跑
+            raise
+        except Exception:
+            if checkpoint is not None:
+                checkpoint.finish("failed")
+                await self._persist({}, flush=False)
+            raise
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+            await self.state.close()
+
+        if checkpoint is not None:
+            checkpoint.finish("completed")
+
+        # 插图节点可能晚于设计图完成，全部结束后统一写一次图片列表（含恢复前已上传的图片）
+        images = self._collect_images(report.results)
+        if images:
+            self.state.update(images=ProjectService.fix_image_urls(images))
+        await self._persist({})
+
+        self.log(
+            f"📄 工作流完成 ({report.wall_time:.2f}s)，关键路径: "
+            f"{' → '.join(report.critical_path)}"
+        )
+        return report
+
+
+def indexable_analysis(project: Dict[str, Any]) -> Optional[Tuple[str, str, Dict]]:
+    """
+    从已完成的项目记录中取出 (项目名, 需求, 市场分析)，用于启动时回填相似度索引。
+    优先用检查点里的结构化结果；旧项目只有 Markdown 时作为 content 复用。
+    """
+    content = project.get("content")
+    brief = project.get("brief")
+    if not brief or not isinstance(content, dict):
+        return None
+    checkpoint = RunCheckpoint.from_content(content)
+    data = checkpoint.completed_nodes.get("market_analysis") if checkpoint else None
+    if not isinstance(data, dict):
+        markdown = content.get("market_analysis")
+        if not isinstance(markdown, str) or not markdown.strip():
+            return None
+        data = {"summary": "", "content": markdown, "visuals": []}
+    return project["project_name"], brief, data
+
+
+async def _single_piece(text: str):
+    yield text
+
+
 def main():
     if len(sys.argv) > 1:
         brief = sys.argv[1]
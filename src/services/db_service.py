@@ -1,3 +1,7 @@
+import asyncio
+import json
+import os
+import threading
 import time
 import hashlib
 from typing import List, Dict, Any, Optional
@@ -5,6 +9,16 @@ from config import logger
 import config
 
 _supabase_client = None
+_async_supabase_client = None
+_local_store = None
+_local_store_lock = threading.Lock()
+# merge_project_content RPC 是否可用（未执行迁移时回退为读-改-写）
+_merge_rpc_available = True
+
+MERGE_CONTENT_RPC = "merge_project_content"
+CLAIM_RUN_RPC = "claim_project_run"
+# claim_project_run RPC 是否可用（未执行迁移时回退为带条件的 update）
+_claim_rpc_available = True
 
 
 def get_supabase_client():
@@ -23,6 +37,45 @@ def get_supabase_client():
     return _supabase_client if _supabase_client else None
 
 
+def get_local_store():
+    """未配置 Supabase 时的本地 SQLite 项目库；LOCAL_DB_PATH 为空或打开失败时返回 None"""
+    global _local_store
+    if _local_store is None:
+        with _local_store_lock:
+            if _local_store is None:
+                if not config.LOCAL_DB_PATH:
+                    _local_store = False
+                else:
+                    try:
+                        from services.local_store import LocalProjectStore
+
+                        directory = os.path.dirname(config.LOCAL_DB_PATH)
+                        if directory:
+                            os.makedirs(directory, exist_ok=True)
+                        _local_store = LocalProjectStore(config.LOCAL_DB_PATH)
+                    except Exception as e:
+                        logger.error(f"本地项目库打开失败: {e}")
+                        _local_store = False
+    return _local_store if _local_store else None
+
+
+def _local_call(method: str, *args, default=None, **kwargs):
+    """调用本地项目库的同名方法；本地库未启用或出错时返回 default"""
+    store = get_local_store()
+    if store is None:
+        return default
+    try:
+        return getattr(store, method)(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"本地数据库操作失败: {e}")
+        return default
+
+
+async def _local_call_async(method: str, *args, default=None, **kwargs):
+    """_local_call 的 async 版本（SQLite 调用放到线程中，不阻塞事件循环）"""
+    return await asyncio.to_thread(_local_call, method, *args, default=default, **kwargs)
+
+
 def get_project_id(project_name: str) -> str:
     """统一的项目 ID 生成逻辑 (MD5 12位)"""
     return hashlib.md5(project_name.encode()).hexdigest()[:12]
@@ -31,7 +84,7 @@ def get_project_id(project_name: str) -> str:
 def db_get_projects(limit: int = 50):
     client = get_supabase_client()
     if not client:
-        return []
+        return _local_call("list_projects", limit, default=[])
     try:
         result = (
             client.table("projects")
@@ -51,7 +104,7 @@ def db_get_projects(limit: int = 50):
 def db_get_project(project_name: str):
     client = get_supabase_client()
     if not client:
-        return None
+        return _local_call("get_project", project_name)
     try:
         result = (
             client.table("projects")
@@ -70,7 +123,7 @@ def db_create_project(
 ):
     client = get_supabase_client()
     if not client:
-        return None
+        return _local_call("create_project", project_name, brief, model_name, tags)
     try:
         data = {
             "project_name": project_name,
@@ -92,7 +145,7 @@ def db_create_project(
 def db_update_project(project_name: str, **kwargs):
     client = get_supabase_client()
     if not client:
-        return None
+        return _local_call("update_project", project_name, **kwargs)
     try:
         result = (
             client.table("projects")
@@ -106,7 +159,47 @@ def db_update_project(project_name: str, **kwargs):
         return None
 
 
+def _is_missing_rpc(error: Exception) -> bool:
+    text = str(error)
+    return "PGRST202" in text or "Could not find the function" in text
+
+
+def _disable_merge_rpc(error: Exception):
+    global _merge_rpc_available
+    _merge_rpc_available = False
+    logger.warning(
+        f"数据库缺少 {MERGE_CONTENT_RPC} 函数，回退为读-改-写（请运行 db_migrate.py）: {error}"
+    )
+
+
+def merge_project_content(project_name: str, patch: Dict[str, Any]):
+    """
+    原子合并 content 的顶层字段（content = content || patch），一次往返只发送修改的字段，
+    并发保存不会互相覆盖。返回 True 表示已写入，None 表示失败或项目不存在。
+    """
+    client = get_supabase_client()
+    if not client:
+        return _local_call("merge_project_content", project_name, patch)
+    if not _merge_rpc_available:
+        return _save_project_content_rmw(project_name, patch)
+    try:
+        result = client.rpc(
+            MERGE_CONTENT_RPC, {"p_project_name": project_name, "p_patch": patch}
+        ).execute()
+        return True if result.data else None
+    except Exception as e:
+        if _is_missing_rpc(e):
+            _disable_merge_rpc(e)
+            return _save_project_content_rmw(project_name, patch)
+        logger.error(f"数据库更新失败: {e}")
+        return None
+
+
 def save_project_content(project_name: str, new_content: Dict[str, Any]):
+    return merge_project_content(project_name, new_content)
+
+
+def _save_project_content_rmw(project_name: str, new_content: Dict[str, Any]):
     proj = db_get_project(project_name)
     existing_content = proj.get("content", {}) if proj else {}
     if not isinstance(existing_content, dict):
@@ -119,3 +212,162 @@ def save_project_content(project_name: str, new_content: Dict[str, Any]):
 def save_project_images(project_name: str, images: List[str]):
     """更新项目图片列表"""
     return db_update_project(project_name, images=images)
+
+
+# --- Async API（供 async 工作流直接 await，不占用线程池） ---
+
+
+async def get_async_supabase_client():
+    global _async_supabase_client
+    if _async_supabase_client is None:
+        if config.SUPABASE_URL and config.SUPABASE_KEY:
+            try:
+                from supabase import acreate_client
+
+                _async_supabase_client = await acreate_client(
+                    config.SUPABASE_URL, config.SUPABASE_KEY
+                )
+            except Exception as e:
+                logger.error(f"Supabase 异步连接失败: {e}")
+                _async_supabase_client = False
+    return _async_supabase_client if _async_supabase_client else None
+
+
+async def db_get_project_async(project_name: str):
+    client = await get_async_supabase_client()
+    if not client:
+        return await _local_call_async("get_project", project_name)
+    try:
+        result = (
+            await client.table("projects")
+            .select("*")
+            .eq("project_name", project_name)
+            .execute()
+        )
+        return result.data[0] if result.data else None
+    except Exception as e:
+        logger.error(f"数据库查询失败: {e}")
+        return None
+
+
+async def db_get_projects_by_status_async(status: str, limit: int = 100):
+    client = await get_async_supabase_client()
+    if not client:
+        return await _local_call_async("get_projects_by_status", status, limit, default=[])
+    try:
+        result = (
+            await client.table("projects")
+            .select("project_name, status, brief, content")
+            .eq("status", status)
+            .limit(limit)
+            .execute()
+        )
+        return result.data or []
+    except Exception as e:
+        logger.error(f"数据库查询失败: {e}")
+        return []
+
+
+async def db_update_project_async(project_name: str, **kwargs):
+    client = await get_async_supabase_client()
+    if not client:
+        return await _local_call_async("update_project", project_name, **kwargs)
+    try:
+        result = (
+            await client.table("projects")
+            .update(kwargs)
+            .eq("project_name", project_name)
+            .execute()
+        )
+        return result.data[0] if result.data else None
+    except Exception as e:
+        logger.error(f"数据库更新失败: {e}")
+        return None
+
+
+async def merge_project_content_async(project_name: str, patch: Dict[str, Any]):
+    """merge_project_content 的 async 版本"""
+    client = await get_async_supabase_client()
+    if not client:
+        return await _local_call_async("merge_project_content", project_name, patch)
+    if not _merge_rpc_available:
+        return await _save_project_content_rmw_async(project_name, patch)
+    try:
+        result = await client.rpc(
+            MERGE_CONTENT_RPC, {"p_project_name": project_name, "p_patch": patch}
+        ).execute()
+        return True if result.data else None
+    except Exception as e:
+        if _is_missing_rpc(e):
+            _disable_merge_rpc(e)
+            return await _save_project_content_rmw_async(project_name, patch)
+        logger.error(f"数据库更新失败: {e}")
+        return None
+
+
+async def save_project_content_async(project_name: str, new_content: Dict[str, Any]):
+    return await merge_project_content_async(project_name, new_content)
+
+
+async def _save_project_content_rmw_async(
+    project_name: str, new_content: Dict[str, Any]
+):
+    proj = await db_get_project_async(project_name)
+    existing_content = proj.get("content", {}) if proj else {}
+    if not isinstance(existing_content, dict):
+        existing_content = {}
+
+    existing_content.update(new_content)
+    return await db_update_project_async(project_name, content=existing_content)
+
+
+def _disable_claim_rpc(error: Exception):
+    global _claim_rpc_available
+    _claim_rpc_available = False
+    logger.warning(
+        f"数据库缺少 {CLAIM_RUN_RPC} 函数，回退为带条件的 update（请运行 db_migrate.py）: {error}"
+    )
+
+
+async def claim_run_async(
+    project_name: str, expected: Dict[str, Any], state: Dict[str, Any]
+) -> bool:
+    """
+    原子认领中断的 run_all：仅当 content.run_state 的 owner 与 heartbeat 仍等于 expected
+    时写入新的 run_state。多个 worker 同时认领同一个运行，只有一个能改到这一行，返回 True。
+    """
+    client = await get_async_supabase_client()
+    if not client:
+        return await _local_call_async(
+            "claim_run", project_name, expected, state, default=False
+        )
+    try:
+        if _claim_rpc_available:
+            try:
+                result = await client.rpc(
+                    CLAIM_RUN_RPC,
+                    {"p_project_name": project_name, "p_expected": expected, "p_state": state},
+                ).execute()
+                return bool(result.data)
+            except Exception as e:
+                if not _is_missing_rpc(e):
+                    raise
+                _disable_claim_rpc(e)
+
+        # PostgREST 不能只改 JSON 的一个键：读出 content 后整体写回，由过滤条件保证原子性
+        proj = await db_get_project_async(project_name)
+        content = proj.get("content") if proj else None
+        if not isinstance(content, dict):
+            return False
+        result = (
+            await client.table("projects")
+            .update({"content": {**content, "run_state": state}})
+            .eq("project_name", project_name)
+            .eq("content->run_state->>owner", expected.get("owner"))
+            .eq("content->run_state->>heartbeat", json.dumps(expected.get("heartbeat")))
+            .execute()
+        )
+        return len(result.data or []) == 1
+    except Exception as e:
+        logger.error(f"认领运行失败: {e}")
+        return False
@@ -0,0 +1,161 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class LocalProjectStore:
+    """
+    projects 表的本地 SQLite 实现，与 Supabase 侧的契约一致
+    （未配置 Supabase 时 db_service 以它为后端，见 LOCAL_DB_PATH）：
+    - merge_project_content 原子合并 content 的顶层字段（对应 content = content || patch）
+    - update_project 只更新传入的列
+    合并在 BEGIN IMMEDIATE 事务内完成，多个线程/进程并发合并不会丢字段。
+    """
+
+    JSON_COLUMNS = ("tags", "images", "content")
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=5, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS projects (
+                project_name TEXT PRIMARY KEY,
+                brief TEXT,
+                model_name TEXT,
+                creation_time REAL,
+                status TEXT DEFAULT 'pending',
+                current_step TEXT DEFAULT '',
+                tags TEXT DEFAULT '[]',
+                images TEXT DEFAULT '[]',
+                content TEXT DEFAULT '{}'
+            )
+            """
+        )
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        project = dict(row)
+        for column in self.JSON_COLUMNS:
+            if project.get(column) is not None:
+                project[column] = json.loads(project[column])
+        return project
+
+    def create_project(
+        self, project_name: str, brief: str, model_name: str, tags: List[str] = None
+    ):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO projects (project_name, brief, model_name, creation_time, tags)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (project_name, brief, model_name, time.time(), json.dumps(tags or [])),
+            )
+        return self.get_project(project_name)
+
+    def _select(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.row_factory = None
+        return [self._row_to_dict(row) for row in rows]
+
+    def get_project(self, project_name: str) -> Optional[Dict[str, Any]]:
+        rows = self._select(
+            "SELECT * FROM projects WHERE project_name = ?", (project_name,)
+        )
+        return rows[0] if rows else None
+
+    def list_projects(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """按创建时间倒序列出项目（不含 content/images）"""
+        return self._select(
+            """
+            SELECT project_name, creation_time, status, current_step, tags, model_name, brief
+            FROM projects ORDER BY creation_time DESC LIMIT ?
+            """,
+            (limit,),
+        )
+
+    def get_projects_by_status(self, status: str, limit: int = 100) -> List[Dict[str, Any]]:
+        return self._select(
+            """
+            SELECT project_name, status, brief, content
+            FROM projects WHERE status = ? LIMIT ?
+            """,
+            (status, limit),
+        )
+
+    def update_project(self, project_name: str, **kwargs):
+        if not kwargs:
+            return None
+        columns = ", ".join(f"{key} = ?" for key in kwargs)
+        values = [
+            json.dumps(value, ensure_ascii=False) if key in self.JSON_COLUMNS else value
+            for key, value in kwargs.items()
+        ]
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE projects SET {columns} WHERE project_name = ?",
+                (*values, project_name),
+            )
+        return self.get_project(project_name) if cur.rowcount else None
+
+    def merge_project_content(self, project_name: str, patch: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT content FROM projects WHERE project_name = ?",
+                    (project_name,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                content = json.loads(row[0] or "{}")
+                if not isinstance(content, dict):
+                    content = {}
+                content.update(patch)
+                self._conn.execute(
+                    "UPDATE projects SET content = ? WHERE project_name = ?",
+                    (json.dumps(content, ensure_ascii=False), project_name),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def claim_run(
+        self, project_name: str, expected: Dict[str, Any], state: Dict[str, Any]
+    ) -> bool:
+        """条件写入 content.run_state（对应 claim_project_run）：owner 与 heartbeat 不变才认领成功"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT content FROM projects WHERE project_name = ?",
+                    (project_name,),
+                ).fetchone()
+                content = json.loads(row[0] or "{}") if row else None
+                current = content.get("run_state") if isinstance(content, dict) else None
+                if not isinstance(current, dict) or any(
+                    current.get(key) != value for key, value in expected.items()
+                ):
+                    self._conn.execute("ROLLBACK")
+                    return False
+                content["run_state"] = state
+                self._conn.execute(
+                    "UPDATE projects SET content = ? WHERE project_name = ?",
+                    (json.dumps(content, ensure_ascii=False), project_name),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
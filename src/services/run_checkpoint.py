@@ -0,0 +1,102 @@
+import os
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# 每个进程的唯一标识，用于判断检查点由哪个 worker 持有
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class RunCheckpoint:
+    """
+    run_all 的持久化检查点，保存在项目 content 的 run_state 字段中：
+    运行参数、每个已完成 DAG 节点的输出、持有者与心跳时间。
+    进程重启后可据此跳过已完成的节点（已付费的 LLM 调用、已上传的图片）继续执行。
+    """
+
+    FIELD = "run_state"
+
+    def __init__(self, state: Dict[str, Any]):
+        self.state = state
+
+    @classmethod
+    def new(cls, request: Dict[str, Any]) -> "RunCheckpoint":
+        now = time.time()
+        return cls(
+            {
+                "run_id": uuid.uuid4().hex,
+                "status": "running",
+                "owner": WORKER_ID,
+                "started_at": now,
+                "heartbeat": now,
+                "request": request,
+                "nodes": {},
+            }
+        )
+
+    @classmethod
+    def from_content(cls, content: Any) -> Optional["RunCheckpoint"]:
+        if not isinstance(content, dict):
+            return None
+        state = content.get(cls.FIELD)
+        if not isinstance(state, dict) or "request" not in state:
+            return None
+        state.setdefault("nodes", {})
+        return cls(state)
+
+    @property
+    def run_id(self) -> str:
+        return self.state["run_id"]
+
+    @property
+    def request(self) -> Dict[str, Any]:
+        return self.state["request"]
+
+    @property
+    def status(self) -> str:
+        return self.state.get("status", "")
+
+    @property
+    def owner(self) -> str:
+        return self.state.get("owner", "")
+
+    @property
+    def completed_nodes(self) -> Dict[str, Any]:
+        return dict(self.state["nodes"])
+
+    def lease(self) -> Dict[str, Any]:
+        """当前持有者与心跳，认领时作为条件更新的期望值"""
+        return {"owner": self.owner, "heartbeat": self.state.get("heartbeat")}
+
+    def record(self, node: str, result: Any):
+        self.state["nodes"][node] = result
+        self.touch()
+
+    def touch(self):
+        self.state["owner"] = WORKER_ID
+        self.state["heartbeat"] = time.time()
+
+    def finish(self, status: str):
+        self.state["status"] = status
+        self.touch()
+
+    def is_stale(self, stale_after: float, now: float = None) -> bool:
+        now = now or time.time()
+        return now - float(self.state.get("heartbeat") or 0) > stale_after
+
+    def is_resumable(self, stale_after: float) -> bool:
+        return self.status == "running" and self.is_stale(stale_after)
+
+    def to_content(self) -> Dict[str, Any]:
+        return {self.FIELD: self.state}
+
+
+def find_resumable(projects: List[Dict[str, Any]], stale_after: float):
+    """从 in_progress 项目中筛选检查点心跳已过期（持有进程已退出）的运行"""
+    resumable = []
+    for project in projects:
+        checkpoint = RunCheckpoint.from_content(project.get("content"))
+        if checkpoint and checkpoint.is_resumable(stale_after):
+            resumable.append((project["project_name"], checkpoint))
+    return resumable
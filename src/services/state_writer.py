@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import config
+from services import db_service
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectStateWriter:
+    """
+    单次运行的项目状态写入器：在内存中合并 status / current_step / images 与
+    content 字段的多次修改，只在步骤边界或定时器触发时写库。
+
+    - 列修改合并为一次 update，只写发生变化的列
+    - content 只发送变化的顶层字段，经 merge_project_content 原子合并，
+      不需要先读取整行，也不会覆盖其他请求（如 run_step）写入的字段
+    """
+
+    def __init__(self, project_name: str, flush_interval: float = None):
+        self.project_name = project_name
+        self.flush_interval = (
+            config.STATE_FLUSH_SECONDS if flush_interval is None else flush_interval
+        )
+        self.flushes = 0
+        self._columns: Dict[str, Any] = {}
+        self._content_patch: Dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._columns) or bool(self._content_patch)
+
+    def update(self, **columns):
+        """缓冲项目列（status、current_step、images 等）的修改"""
+        self._columns.update(columns)
+
+    def merge_content(self, patch: Dict[str, Any]):
+        """缓冲 content 字段的修改"""
+        self._content_patch.update(patch)
+
+    async def flush(self):
+        """把缓冲的修改合并写库（列一次 update，content 一次原子合并）"""
+        if not self.project_name:
+            return
+        async with self._lock:
+            if not self.dirty:
+                return
+            columns, self._columns = self._columns, {}
+            patch, self._content_patch = self._content_patch, {}
+
+            # db_service 写入失败时记录日志并返回 None：恢复未写入的修改等待下次重试
+            # （写入期间产生的新值优先）
+            if columns:
+                result = await db_service.db_update_project_async(
+                    self.project_name, **columns
+                )
+                if result is None:
+                    self._columns = {**columns, **self._columns}
+            if patch:
+                result = await db_service.merge_project_content_async(
+                    self.project_name, patch
+                )
+                if result is None:
+                    self._content_patch = {**patch, **self._content_patch}
+            if not self.dirty:
+                self.flushes += 1
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """启动定时 flush（步骤内的进度更新最多延迟 flush_interval 秒落库）"""
+        if self._timer is None and self.flush_interval > 0:
+            self._timer = asyncio.ensure_future(self._flush_periodically())
+
+    async def close(self):
+        """停止定时器并写入剩余修改"""
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        await self.flush()
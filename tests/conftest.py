@@ -9,6 +9,8 @@ import os
 # 添加项目根目录到 Python 路径
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, root_dir)
+# src 内模块使用顶层导入（import config / from services import ...）
+sys.path.insert(1, os.path.join(root_dir, "src"))
 
 # 设置测试环境变量
 os.environ["ENV"] = "test"
@@ -26,3 +28,36 @@ def pytest_collection_modifyitems(config, items):
     """修改测试收集"""
     # 按文件分组测试
     items.sort(key=lambda item: (item.fspath, item.name))
+
+
+@pytest.fixture(autouse=True)
+def llm_log_path(tmp_path, monkeypatch):
+    """LLM 调用日志写到临时目录，测试不再写入仓库中的 logs/llm_calls.jsonl"""
+    import config
+
+    path = str(tmp_path / "llm_calls.jsonl")
+    monkeypatch.setenv("LLM_LOG_PATH", path)
+    monkeypatch.setattr(config, "LLM_LOG_PATH", path)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def reset_llm_shared_state():
+    """每个测试使用独立的 LLM 进程级单例（路由、限流、结构化输出能力、调用合并、用量统计、分析索引）"""
+    from core import (
+        agent_schemas,
+        analysis_index,
+        model_router,
+        rate_limiter,
+        singleflight,
+        usage,
+    )
+
+    model_router._router = None
+    rate_limiter._rate_limiter = None
+    agent_schemas._capabilities = None
+    singleflight._singleflight = None
+    singleflight._async_singleflight = None
+    usage._usage_tracker = None
+    analysis_index._analysis_index = None
+    yield
@@ -0,0 +1,135 @@
+"""
+Agent 结构化输出 schema 与模型能力降级测试
+"""
+
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _response(content):
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    return response
+
+
+class TestAgentSchemas:
+    """测试各 Agent 的 response_format"""
+
+    def test_schema_matches_processors(self):
+        """测试符合 schema 的输出能被对应解析器直接处理"""
+        from src.core.agent_schemas import response_format_for
+        from src.core.response_processor import LLMResponseProcessor
+
+        fmt = response_format_for("product_designer")
+        assert fmt["type"] == "json_schema"
+        assert fmt["json_schema"]["strict"] is True
+        assert fmt["json_schema"]["schema"]["required"] == ["summary", "prompts"]
+
+        design = {
+            "summary": "摘要",
+            "prompts": [
+                {"scheme": "A", "inspiration": "灵感", "description": "描述", "prompt": "p"}
+            ],
+        }
+        data = LLMResponseProcessor.process_design_generation(json.dumps(design))
+        assert data["prompts"][0]["prompt"] == "p"
+
+        report = {"summary": "摘要", "content": "## 正文", "visuals": []}
+        for agent in ("market_analyst", "visual_researcher"):
+            assert response_format_for(agent)["json_schema"]["name"] == agent
+        data = LLMResponseProcessor.process_market_analysis(json.dumps(report))
+        assert data["content"] == "## 正文"
+
+    def test_unknown_agent_has_no_schema(self):
+        """测试没有 schema 的 Agent 不发送 response_format"""
+        from src.core.agent_schemas import response_format_for
+
+        assert response_format_for("tag_generator") is None
+
+    def test_capabilities_downgrade(self):
+        """测试能力逐级降级，最终把 JSON 指令写回提示词"""
+        from src.core.agent_schemas import (
+            JSON_OUTPUT_INSTRUCTION,
+            StructuredOutputCapabilities,
+            response_format_for,
+        )
+
+        caps = StructuredOutputCapabilities()
+        messages = [{"role": "user", "content": "分析"}]
+        fmt = response_format_for("market_analyst")
+
+        assert caps.apply("u", "m", messages, fmt) == (messages, fmt)
+        caps.downgrade("u", "m")
+        # json_object 模式要求消息中包含 "JSON"，同样补回指令
+        sent, sent_format = caps.apply("u", "m", messages, fmt)
+        assert sent_format == {"type": "json_object"}
+        assert sent[0]["content"] == "分析" + JSON_OUTPUT_INSTRUCTION
+        assert "JSON" in sent[0]["content"]
+        caps.downgrade("u", "m")
+        sent, sent_format = caps.apply("u", "m", messages, fmt)
+        assert sent_format is None
+        assert sent[0]["content"] == "分析" + JSON_OUTPUT_INSTRUCTION
+        assert messages[0]["content"] == "分析"
+        # 其他模型不受影响
+        assert caps.apply("u", "other", messages, fmt) == (messages, fmt)
+
+
+class TestStructuredOutputFallback:
+    """测试 LLM 服务在模型不支持 response_format 时的降级"""
+
+    @pytest.fixture
+    def async_llm_service(self):
+        """创建异步 LLM 服务实例（使用模拟客户端）"""
+        with patch("src.llm_wrapper.AsyncOpenAI"):
+            from src.llm_wrapper import AsyncLLMService
+
+            service = AsyncLLMService(api_key="test-key", base_url="http://test.local")
+            service.client = MagicMock()
+            yield service
+
+    def test_unsupported_schema_is_cached(self, async_llm_service, tmp_path):
+        """测试 json_schema 被拒绝后同一模型改用 json_object 重试，且后续调用不再试错"""
+        from src.core.agent_schemas import response_format_for
+
+        async_llm_service.log_file = str(tmp_path / "calls.jsonl")
+        create = AsyncMock(
+            side_effect=[
+                Exception("400 Invalid parameter: response_format json_schema is not supported"),
+                _response('{"summary": "a", "content": "b", "visuals": []}'),
+                _response('{"summary": "c", "content": "d", "visuals": []}'),
+            ]
+        )
+        async_llm_service.client.chat.completions.create = create
+        fmt = response_format_for("market_analyst")
+        messages = [{"role": "user", "content": "分析"}]
+
+        async def run():
+            first = await async_llm_service.chat_completion(
+                messages, model="test-model", response_format=fmt
+            )
+            second = await async_llm_service.chat_completion(
+                messages, model="test-model", response_format=fmt
+            )
+            return first, second
+
+        first, second = asyncio.run(run())
+
+        assert json.loads(first)["summary"] == "a"
+        assert json.loads(second)["summary"] == "c"
+        calls = create.call_args_list
+        assert [c.kwargs["model"] for c in calls] == ["test-model"] * 3
+        assert calls[0].kwargs["response_format"]["type"] == "json_schema"
+        assert calls[1].kwargs["response_format"] == {"type": "json_object"}
+        assert calls[2].kwargs["response_format"] == {"type": "json_object"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,167 @@
+"""
+跨项目市场分析相似度索引测试
+"""
+
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+
+class TestAnalysisIndex:
+    """测试 AnalysisIndex"""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        from src.core.analysis_index import AnalysisIndex
+
+        return AnalysisIndex(str(tmp_path / "index.sqlite3"), max_entries=3)
+
+    def test_near_duplicate_briefs_are_similar(self):
+        """测试只差编号的需求相似度高，不同品类的需求相似度低"""
+        from src.core.analysis_index import ngram_vector
+
+        a = ngram_vector("咖啡机概念设计2：面向小户型的胶囊咖啡机")
+        b = ngram_vector("咖啡机概念设计3：面向小户型的胶囊咖啡机")
+        c = ngram_vector("户外露营折叠椅，轻量化铝合金")
+        assert float(a @ b) > 0.9
+        assert float(a @ c) < 0.3
+
+    def test_lookup_threshold_exclude_and_hit_rate(self, index):
+        """测试达到阈值才命中、排除当前项目，并统计命中率"""
+        index.add("coffee2", "咖啡机概念设计2", {"summary": "咖啡机市场"})
+        index.add("chair", "户外露营折叠椅", {"summary": "露营市场"})
+
+        match = index.lookup("咖啡机概念设计3", threshold=0.8)
+        assert match["key"] == "coffee2"
+        assert match["analysis"] == {"summary": "咖啡机市场"}
+        assert index.lookup("咖啡机概念设计2", threshold=0.8, exclude="coffee2") is None
+        assert index.lookup("儿童学习桌", threshold=0.8) is None
+
+        stats = index.stats()
+        assert stats["lookups"] == 3
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-3)
+
+    def test_default_threshold_matches_request_example(self, tmp_path):
+        """测试默认阈值下只差编号的短需求命中，只换了产品的需求不命中"""
+        from src.config import ANALYSIS_REUSE_THRESHOLD
+        from src.core.analysis_index import AnalysisIndex
+
+        index = AnalysisIndex(str(tmp_path / "index.sqlite3"))
+        index.add("coffee2", "咖啡机概念设计2", {"summary": "咖啡机市场"})
+        index.add("earbuds", "蓝牙耳机设计，主打运动防水", {"summary": "耳机市场"})
+        index.add("coffee-long", "面向小户型年轻用户的胶囊咖啡机，强调一键操作与低噪音", {})
+
+        assert index.lookup("咖啡机概念设计3", ANALYSIS_REUSE_THRESHOLD)["key"] == "coffee2"
+        assert index.lookup("蓝牙音箱设计，主打运动防水", ANALYSIS_REUSE_THRESHOLD) is None
+        assert (
+            index.lookup("面向小户型年轻用户的空气净化器，强调一键操作与低噪音", ANALYSIS_REUSE_THRESHOLD)
+            is None
+        )
+
+    def test_backfill_from_projects(self, tmp_path):
+        """测试从已完成项目回填索引：优先检查点中的结构化结果，不覆盖已有条目"""
+        from src.core.analysis_index import AnalysisIndex
+        from src.main import indexable_analysis
+        from src.services.run_checkpoint import RunCheckpoint
+
+        checkpoint = RunCheckpoint.new({"project_name": "coffee2"})
+        checkpoint.record("market_analysis", {"summary": "结构化", "visuals": []})
+        projects = [
+            {"project_name": "coffee2", "brief": "咖啡机概念设计2", "content": checkpoint.to_content()},
+            {"project_name": "lamp", "brief": "护眼台灯", "content": {"market_analysis": "## 台灯市场"}},
+            {"project_name": "empty", "brief": "加湿器", "content": {}},
+            {"project_name": "chair", "brief": "露营椅", "content": {"market_analysis": "旧"}},
+        ]
+        items = [item for item in map(indexable_analysis, projects) if item]
+        assert [key for key, _, _ in items] == ["coffee2", "lamp", "chair"]
+
+        path = str(tmp_path / "index.sqlite3")
+        index = AnalysisIndex(path)
+        index.add("chair", "露营椅", {"summary": "新"})
+        assert index.backfill(items) == 2
+        assert index.backfill(items) == 0
+
+        reloaded = AnalysisIndex(path)
+        assert len(reloaded) == 3
+        assert reloaded.lookup("咖啡机概念设计3", 0.8)["analysis"]["summary"] == "结构化"
+        assert reloaded.lookup("护眼台灯", 0.99)["analysis"]["content"] == "## 台灯市场"
+        assert reloaded.lookup("露营椅", 0.99)["analysis"] == {"summary": "新"}
+
+    def test_persists_and_evicts(self, tmp_path, index):
+        """测试重建实例后条目仍在，超过上限时淘汰最早写入的条目"""
+        from src.core.analysis_index import AnalysisIndex
+
+        for i, brief in enumerate(["咖啡机", "露营椅", "台灯", "加湿器"]):
+            index.add(f"p{i}", brief, {"summary": brief})
+        index.add("p1", "露营椅", {"summary": "更新"})
+
+        reloaded = AnalysisIndex(index.path, max_entries=3)
+        assert len(reloaded) == 3
+        assert [key for key, _, _ in reloaded.search("咖啡机", top_k=3)][0] != "p0"
+        assert reloaded.lookup("露营椅", threshold=0.99)["analysis"] == {"summary": "更新"}
+
+
+BRIEF = "咖啡机概念设计{}：面向小户型年轻用户的胶囊咖啡机，强调一键操作与低噪音"
+
+
+class TestMarketAnalysisReuse:
+    """测试 analyze_market 复用 / 参考相似需求的分析"""
+
+    def _workflow(self, index):
+        from src.main import AsyncDesignWorkflow
+
+        workflow = AsyncDesignWorkflow.__new__(AsyncDesignWorkflow)
+        workflow.project_name = "coffee3"
+        workflow.model = "test-model"
+        workflow.knowledge_base = ""
+        workflow.run_id = None
+        workflow.use_cache = True
+        workflow.llm = AsyncMock()
+        workflow.llm.chat_completion.return_value = '{"summary": "新分析", "visuals": []}'
+        return workflow
+
+    def test_reuse_mode_skips_llm(self, tmp_path):
+        """测试 reuse 模式命中时直接返回历史分析，不调用 LLM"""
+        from src.core.analysis_index import AnalysisIndex
+
+        index = AnalysisIndex(str(tmp_path / "index.sqlite3"))
+        index.add("coffee2", BRIEF.format(2), {"summary": "旧分析", "visuals": []})
+        workflow = self._workflow(index)
+
+        with patch("src.main.get_analysis_index", return_value=index), patch(
+            "src.main.config.ANALYSIS_REUSE_MODE", "reuse"
+        ):
+            data = asyncio.run(workflow.analyze_market(BRIEF.format(3)))
+
+        assert data["summary"] == "旧分析"
+        workflow.llm.chat_completion.assert_not_called()
+
+    def test_seed_mode_adds_reference_and_indexes_result(self, tmp_path):
+        """测试 seed 模式把历史分析附加到 prompt，并把新结果写入索引"""
+        from src.core.analysis_index import AnalysisIndex
+
+        index = AnalysisIndex(str(tmp_path / "index.sqlite3"))
+        index.add("coffee2", BRIEF.format(2), {"summary": "旧分析", "visuals": []})
+        workflow = self._workflow(index)
+
+        with patch("src.main.get_analysis_index", return_value=index), patch(
+            "src.main.config.ANALYSIS_REUSE_MODE", "seed"
+        ):
+            data = asyncio.run(workflow.analyze_market(BRIEF.format(3)))
+
+        assert data["summary"] == "新分析"
+        prompt = workflow.llm.chat_completion.call_args[0][0][0]["content"]
+        assert "旧分析" in prompt
+        assert index.lookup(BRIEF.format(3), threshold=0.99)["key"] == "coffee3"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,243 @@
+"""
+db_service 测试：merge_project_content 的 RPC 与读-改-写回退路径、本地项目库后端
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _FakeQuery:
+    """Supabase 查询构造器的替身：select / update + eq + execute，sync 与 async 通用"""
+
+    def __init__(self, client):
+        self.client = client
+        self.payload = None
+        self.filters = {}
+
+    def select(self, *_):
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def _run(self):
+        rows = [
+            row
+            for row in self.client.rows
+            if all(row.get(k) == v for k, v in self.filters.items())
+        ]
+        if self.payload is not None:
+            self.client.updates.append(self.payload)
+            for row in rows:
+                row.update(self.payload)
+        return _Result([dict(row) for row in rows])
+
+    def execute(self):
+        if self.client.is_async:
+
+            async def run():
+                return self._run()
+
+            return run()
+        return self._run()
+
+
+class _FakeClient:
+    """模拟 projects 表与 merge_project_content RPC；has_rpc=False 时返回函数不存在错误"""
+
+    def __init__(self, rows, has_rpc=True, is_async=False):
+        self.rows = rows
+        self.has_rpc = has_rpc
+        self.is_async = is_async
+        self.rpc_calls = []
+        self.updates = []
+
+    def table(self, name):
+        return _FakeQuery(self)
+
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        client = self
+
+        class _Call:
+            def _run(self):
+                if not client.has_rpc:
+                    raise Exception("PGRST202 Could not find the function merge_project_content")
+                for row in client.rows:
+                    if row["project_name"] == params["p_project_name"]:
+                        row["content"] = {**row["content"], **params["p_patch"]}
+                        return _Result(True)
+                return _Result(None)
+
+            def execute(self):
+                if client.is_async:
+
+                    async def run():
+                        return self._run()
+
+                    return run()
+                return self._run()
+
+        return _Call()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """db_service 模块：RPC 可用标记复位，本地项目库关闭"""
+    from src.services import db_service
+
+    monkeypatch.setattr(db_service, "_merge_rpc_available", True)
+    monkeypatch.setattr(db_service, "_local_store", None)
+    monkeypatch.setattr(db_service.config, "LOCAL_DB_PATH", "")
+    return db_service
+
+
+def _install(monkeypatch, db, client):
+    async def get_async_client():
+        return client
+
+    monkeypatch.setattr(db, "get_supabase_client", lambda: client)
+    monkeypatch.setattr(db, "get_async_supabase_client", get_async_client)
+
+
+def _rows():
+    return [{"project_name": "p", "content": {"market_analysis": "m"}}]
+
+
+class TestMergeProjectContent:
+    """测试 content 合并：有 RPC 时一次调用只发送 patch，缺少 RPC 时回退为读-改-写"""
+
+    def test_rpc_path(self, monkeypatch, db):
+        """测试 RPC 可用时只发送修改的字段，不读整行"""
+        client = _FakeClient(_rows())
+        _install(monkeypatch, db, client)
+
+        assert db.merge_project_content("p", {"visual_research": "v"}) is True
+        assert client.rpc_calls == [
+            ("merge_project_content", {"p_project_name": "p", "p_patch": {"visual_research": "v"}})
+        ]
+        assert client.updates == []
+        assert client.rows[0]["content"] == {"market_analysis": "m", "visual_research": "v"}
+
+    def test_rpc_missing_project(self, monkeypatch, db):
+        """测试项目不存在时返回 None"""
+        _install(monkeypatch, db, _FakeClient(_rows()))
+
+        assert db.merge_project_content("missing", {"a": 1}) is None
+
+    def test_fallback_read_modify_write(self, monkeypatch, db):
+        """测试缺少 RPC 时回退为读-改-写，之后不再尝试 RPC"""
+        client = _FakeClient(_rows(), has_rpc=False)
+        _install(monkeypatch, db, client)
+
+        assert db.merge_project_content("p", {"visual_research": "v"})
+        assert db.merge_project_content("p", {"design_proposals": "d"})
+
+        assert len(client.rpc_calls) == 1
+        assert db._merge_rpc_available is False
+        assert client.rows[0]["content"] == {
+            "market_analysis": "m",
+            "visual_research": "v",
+            "design_proposals": "d",
+        }
+
+    def test_async_rpc_path(self, monkeypatch, db):
+        """测试 async 版本的 RPC 路径"""
+        client = _FakeClient(_rows(), is_async=True)
+        _install(monkeypatch, db, client)
+
+        result = asyncio.run(db.merge_project_content_async("p", {"visual_research": "v"}))
+
+        assert result is True
+        assert [name for name, _ in client.rpc_calls] == ["merge_project_content"]
+        assert client.updates == []
+        assert client.rows[0]["content"]["visual_research"] == "v"
+
+    def test_async_fallback_read_modify_write(self, monkeypatch, db):
+        """测试 async 版本缺少 RPC 时回退为读-改-写"""
+        client = _FakeClient(_rows(), has_rpc=False, is_async=True)
+        _install(monkeypatch, db, client)
+
+        async def flow():
+            await db.merge_project_content_async("p", {"visual_research": "v"})
+            return await db.merge_project_content_async("p", {"design_proposals": "d"})
+
+        assert asyncio.run(flow())
+        assert len(client.rpc_calls) == 1
+        assert client.rows[0]["content"] == {
+            "market_analysis": "m",
+            "visual_research": "v",
+            "design_proposals": "d",
+        }
+
+
+class TestLocalBackend:
+    """测试未配置 Supabase 时以本地 SQLite 项目库为后端"""
+
+    def _local(self, monkeypatch, db, tmp_path):
+        async def no_async_client():
+            return None
+
+        monkeypatch.setattr(db, "get_supabase_client", lambda: None)
+        monkeypatch.setattr(db, "get_async_supabase_client", no_async_client)
+        monkeypatch.setattr(
+            db.config, "LOCAL_DB_PATH", str(tmp_path / "data" / "projects.sqlite3")
+        )
+
+    def test_sync_roundtrip(self, monkeypatch, db, tmp_path):
+        """测试创建、更新、合并与列表都落到本地库"""
+        self._local(monkeypatch, db, tmp_path)
+
+        assert db.db_create_project("p", brief="b", model_name="m")["status"] == "pending"
+        db.db_update_project("p", status="in_progress", images=["a.png"])
+        db.save_project_content("p", {"market_analysis": "m"})
+        db.merge_project_content("p", {"visual_research": "v"})
+
+        project = db.db_get_project("p")
+        assert project["status"] == "in_progress"
+        assert project["images"] == ["a.png"]
+        assert project["content"] == {"market_analysis": "m", "visual_research": "v"}
+        assert [p["project_name"] for p in db.db_get_projects()] == ["p"]
+
+    def test_async_roundtrip(self, monkeypatch, db, tmp_path):
+        """测试 async 接口同样使用本地库"""
+        self._local(monkeypatch, db, tmp_path)
+        db.db_create_project("p", brief="b", model_name="m")
+
+        async def flow():
+            await db.db_update_project_async("p", status="in_progress")
+            await db.merge_project_content_async("p", {"market_analysis": "m"})
+            return (
+                await db.db_get_project_async("p"),
+                await db.db_get_projects_by_status_async("in_progress"),
+            )
+
+        project, in_progress = asyncio.run(flow())
+        assert project["content"] == {"market_analysis": "m"}
+        assert [p["project_name"] for p in in_progress] == ["p"]
+
+    def test_disabled_without_path(self, monkeypatch, db):
+        """测试 LOCAL_DB_PATH 为空时保持原有行为（不保存）"""
+        monkeypatch.setattr(db, "get_supabase_client", lambda: None)
+
+        assert db.db_create_project("p", brief="b", model_name="m") is None
+        assert db.db_get_projects() == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+"""
+本地假 LLM 服务测试（scripts/fake_llm_server.py）
+"""
+
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAST = {"latency_ms": 0, "chunk_delay_ms": 0, "distribution": "fixed"}
+
+
+def _client(**settings):
+    from scripts.fake_llm_server import FakeLLM, create_app
+
+    fake = FakeLLM({**FAST, **settings}, seed=1)
+    return TestClient(create_app(fake)), fake
+
+
+class TestFakeLLMServer:
+    """测试假服务的响应与故障注入"""
+
+    def test_agent_shaped_json(self):
+        """测试按 response_format 的 schema 名称返回对应 Agent 的 JSON"""
+        from src.core.agent_schemas import response_format_for
+
+        client, _ = _client()
+        resp = client.post(
+            "/v1/chat/completions",
+            json={
+                "model": "m",
+                "messages": [{"role": "user", "content": "露营椅"}],
+                "response_format": response_format_for("product_designer"),
+            },
+        )
+        data = json.loads(resp.json()["choices"][0]["message"]["content"])
+        assert set(data) == {"summary", "prompts"}
+        assert resp.json()["usage"]["completion_tokens"] > 0
+
+    def test_injected_429_and_model_faults(self):
+        """测试 429 带 Retry-After，按模型覆盖的 500 只影响该模型"""
+        client, fake = _client(error_429=1.0)
+        resp = client.post("/chat/completions", json={"model": "m", "messages": []})
+        assert resp.status_code == 429
+        assert resp.headers["retry-after"] == "1.0"
+
+        client.post(
+            "/_fake/config",
+            json={"settings": {"error_429": 0}, "model_faults": {"bad": {"error_500": 1}}},
+        )
+        assert client.post("/chat/completions", json={"model": "bad", "messages": []}).status_code == 500
+        assert client.post("/chat/completions", json={"model": "ok", "messages": []}).status_code == 200
+        assert client.get("/_fake/stats").json()["500"] == 1
+
+    def test_streaming_reassembles_to_valid_json(self):
+        """测试流式 chunk 拼接后是完整 JSON，并在最后一个 chunk 返回用量"""
+        client, _ = _client()
+        body = {
+            "model": "m",
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "messages": [{"role": "user", "content": "请进行市场分析：咖啡机"}],
+        }
+        with client.stream("POST", "/v1/chat/completions", json=body) as resp:
+            lines = [l[6:] for l in resp.iter_lines() if l.startswith("data: ")]
+        assert lines[-1] == "[DONE]"
+        chunks = [json.loads(l) for l in lines[:-1]]
+        text = "".join(c["choices"][0]["delta"].get("content") or "" for c in chunks)
+        assert set(json.loads(text)) == {"summary", "content", "visuals"}
+        assert chunks[-1]["usage"]["prompt_tokens"] > 0
+
+
+class TestLLMServiceAgainstFakeServer:
+    """测试真实的 AsyncLLMService 故障切换逻辑"""
+
+    def test_failover_to_next_model(self, tmp_path):
+        """测试首选模型持续 500 时切换到下一个模型并返回可解析的结果"""
+        from openai import AsyncOpenAI
+        from scripts.fake_llm_server import FakeLLM, create_app
+        from src.llm_wrapper import AsyncLLMService
+
+        fake = FakeLLM(FAST, model_faults={"bad": {"error_500": 1.0}}, seed=1)
+        service = AsyncLLMService(api_key="fake", base_url="http://fake.local/v1")
+        service.log_file = str(tmp_path / "calls.jsonl")
+        service.client = AsyncOpenAI(
+            api_key="fake",
+            base_url="http://fake.local/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(fake))),
+        )
+
+        with patch("src.llm_wrapper.config.MODEL_PRIORITY_LIST", ["bad", "good"]):
+            result = asyncio.run(
+                service.chat_completion(
+                    [{"role": "user", "content": "请进行市场分析：咖啡机"}],
+                    model="bad",
+                    hedge=False,
+                )
+            )
+
+        assert "summary" in json.loads(result)
+        assert fake.stats["500"] == 1
+        assert fake.stats["ok"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,131 @@
+"""
+即梦积分缓存测试
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _FakeBenefits:
+    """模拟 user_credit / credit_receive，记录调用次数"""
+
+    def __init__(self, balance=10, gift=5, delay=0.0):
+        self.balance = balance
+        self.gift = gift
+        self.delay = delay
+        self.fetches = 0
+        self.receives = 0
+
+    def fetch(self, token):
+        self.fetches += 1
+        return {"totalCredit": self.balance}
+
+    def receive(self, token):
+        self.receives += 1
+        self.balance += self.gift
+
+    async def fetch_async(self, token):
+        await asyncio.sleep(self.delay)
+        return self.fetch(token)
+
+    async def receive_async(self, token):
+        self.receive(token)
+
+    def cache(self, **kwargs):
+        from src.jimeng.credits import CreditCache
+
+        kwargs.setdefault("ttl", 60)
+        kwargs.setdefault("refresh_interval", 0)
+        return CreditCache(
+            self.fetch, self.receive, self.fetch_async, self.receive_async, **kwargs
+        )
+
+
+class TestCreditCache:
+    """测试 CreditCache"""
+
+    def test_ttl_hit_and_consume(self):
+        """测试缓存有效期内不重复查询，提交后本地扣减"""
+        benefits = _FakeBenefits(balance=3)
+        cache = benefits.cache()
+
+        for _ in range(3):
+            cache.ensure("tok")
+            cache.consume("tok")
+        assert benefits.fetches == 1
+        assert cache.stats()["hits"] == 2
+
+        # 本地余额耗尽后重新查询
+        cache.ensure("tok")
+        assert benefits.fetches == 2
+
+    def test_ttl_expiry(self):
+        """测试缓存过期后重新查询"""
+        benefits = _FakeBenefits()
+        cache = benefits.cache(ttl=0.05)
+
+        cache.ensure("tok")
+        time.sleep(0.06)
+        cache.ensure("tok")
+        assert benefits.fetches == 2
+
+    def test_invalidate_forces_refetch(self):
+        """测试积分不足错误作废缓存"""
+        benefits = _FakeBenefits(balance=100)
+        cache = benefits.cache()
+
+        cache.ensure("tok")
+        cache.invalidate("tok")
+        cache.ensure("tok")
+        assert benefits.fetches == 2
+        assert cache.stats()["invalidations"] == 1
+
+    def test_receive_once_per_day(self):
+        """测试余额为 0 时每天只领取一次每日积分"""
+        benefits = _FakeBenefits(balance=0, gift=0)
+        cache = benefits.cache()
+
+        for _ in range(3):
+            cache.ensure("tok")
+        assert benefits.receives == 1
+
+    def test_ensure_async_coalesces(self):
+        """测试同一 token 的并发异步查询合并为一次"""
+        benefits = _FakeBenefits(delay=0.05)
+        cache = benefits.cache()
+
+        async def flow():
+            return await asyncio.gather(*(cache.ensure_async("tok") for _ in range(20)))
+
+        assert asyncio.run(flow()) == [10] * 20
+        assert benefits.fetches == 1
+
+    def test_refresh_all_claims_daily_credit(self):
+        """测试后台刷新为每个已知 token 每天领取一次积分"""
+        benefits = _FakeBenefits(balance=10, gift=5)
+        cache = benefits.cache()
+
+        cache.ensure("a")
+        cache.ensure("b")
+        cache.refresh_all()
+        cache.refresh_all()
+        assert benefits.receives == 2
+        assert cache.stats()["tokens"]["a..."]["received_today"] is True
+
+    def test_stats_mask_tokens(self):
+        """测试统计中不暴露完整 token"""
+        benefits = _FakeBenefits()
+        cache = benefits.cache()
+
+        cache.ensure("secret-refresh-token")
+        assert list(cache.stats()["tokens"]) == ["secret..."]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
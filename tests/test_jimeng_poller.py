@@ -0,0 +1,118 @@
+"""
+即梦生成结果集中轮询测试
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAST = {"min_interval": 0.01, "max_interval": 0.05, "expected": 0.05}
+
+
+class _FakeHistory:
+    """每个 id 被查询 polls_needed 次后完成；记录每次请求的 (token, ids)"""
+
+    def __init__(self, polls_needed=3, outcomes=None):
+        self.polls_needed = polls_needed
+        self.outcomes = outcomes or {}
+        self.calls = []
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, token, ids):
+        with self.lock:
+            self.calls.append((token, list(ids)))
+            result = {}
+            for history_id in ids:
+                self.seen[history_id] = self.seen.get(history_id, 0) + 1
+                outcome = self.outcomes.get(history_id, "ok")
+                if outcome == "missing":
+                    continue
+                if self.seen[history_id] < self.polls_needed:
+                    result[history_id] = {"status": 20}
+                elif outcome == "filtered":
+                    result[history_id] = {"status": 30, "fail_code": "2038"}
+                else:
+                    result[history_id] = {"status": 50, "item_list": [history_id]}
+            return result
+
+
+class TestHistoryPoller:
+    """测试线程版与 asyncio 版轮询器"""
+
+    def test_batches_ids_per_token(self):
+        """测试同一 token 的任务合并到一次请求，不同 token 分开请求"""
+        from src.jimeng.poller import HistoryPoller
+
+        fetch = _FakeHistory()
+        poller = HistoryPoller(fetch=fetch, **FAST)
+        futures = [poller.submit(f"a{i}", "token-a") for i in range(6)]
+        futures += [poller.submit(f"b{i}", "token-b") for i in range(2)]
+
+        records = [f.result(timeout=5) for f in futures]
+        assert all(r["status"] == 50 for r in records)
+        assert {token for token, _ in fetch.calls} == {"token-a", "token-b"}
+        assert all(len(ids) <= 6 for _, ids in fetch.calls)
+        # 8 个任务各需 3 次查询，逐个轮询需要 24 次请求
+        assert len(fetch.calls) < 12
+        assert poller.stats()["outstanding"] == 0
+
+    def test_status_30_missing_and_errors(self):
+        """测试 status=30 作为结果返回，记录缺失或连续请求失败时抛出异常"""
+        from src.jimeng.exceptions import API_IMAGE_GENERATION_FAILED
+        from src.jimeng.poller import HistoryPoller
+
+        fetch = _FakeHistory(polls_needed=1, outcomes={"f": "filtered", "m": "missing"})
+        poller = HistoryPoller(fetch=fetch, **FAST)
+        assert poller.wait("f", "t")["fail_code"] == "2038"
+        with pytest.raises(API_IMAGE_GENERATION_FAILED):
+            poller.wait("m", "t")
+
+        def broken(token, ids):
+            raise ConnectionError("boom")
+
+        poller = HistoryPoller(fetch=broken, **FAST)
+        with pytest.raises(ConnectionError):
+            poller.submit("x", "t").result(timeout=5)
+        assert poller.stats()["failed"] == 1
+
+    def test_adaptive_interval(self):
+        """测试刚提交时间隔长，接近并超过预计完成时间后按最小间隔轮询"""
+        from src.jimeng.poller import HistoryPoller
+
+        poller = HistoryPoller(min_interval=1, max_interval=5, expected=12)
+        assert poller._interval(0) == 5
+        assert poller._interval(8) == 2
+        assert poller._interval(30) == 1
+
+        job = poller._add("x", "t", concurrent.futures.Future())
+        poller._apply([job], {"x": {"status": 50}}, job.submitted + 2)
+        assert job.future.result() == {"status": 50}
+        assert poller.expected == pytest.approx(0.8 * 12 + 0.2 * 2)
+
+    def test_async_poller_shares_requests(self):
+        """测试 asyncio 版轮询器合并并发任务的查询"""
+        from src.jimeng.poller import AsyncHistoryPoller
+
+        fetch = _FakeHistory()
+
+        async def afetch(token, ids):
+            return fetch(token, ids)
+
+        async def run():
+            poller = AsyncHistoryPoller(fetch=afetch, **FAST)
+            return await asyncio.gather(*(poller.wait(f"id{i}", "t") for i in range(5)))
+
+        records = asyncio.run(run())
+        assert [r["item_list"] for r in records] == [[f"id{i}"] for i in range(5)]
+        assert len(fetch.calls) < 8
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,100 @@
+"""
+即梦 API keep-alive 连接池测试
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ret": "0", "data": {"cookie": self.headers.get("Cookie")}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "sessionid=leaked; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def core(monkeypatch, server):
+    from src.jimeng import core
+
+    monkeypatch.setattr(core, "_session", None)
+    monkeypatch.setattr(core, "BASE_URL", server)
+    return core
+
+
+class TestJimengPool:
+    """测试共享会话的连接复用"""
+
+    def test_connections_are_reused_across_threads(self, core):
+        """测试多线程的请求复用少量 keep-alive 连接"""
+
+        def worker():
+            for _ in range(10):
+                core.request("POST", "/mweb/v1/get_history_by_ids", "token", data={})
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = core.pool_stats()
+        assert stats["requests"] == 40
+        assert stats["connections"] <= 4
+        assert stats["reuse_rate"] >= 0.9
+
+    def test_tokens_do_not_share_cookies(self, core):
+        """测试响应的 Set-Cookie 不会保存到共享会话里，每个请求只带自己的 token"""
+        first = core.request("POST", "/commerce/v1/benefits/user_credit", "token-a", data={})
+        second = core.request("POST", "/commerce/v1/benefits/user_credit", "token-b", data={})
+
+        assert "sessionid=token-a" in first["cookie"]
+        assert "token-a" not in second["cookie"] and "leaked" not in second["cookie"]
+        assert len(core.get_session().cookies) == 0
+
+    def test_async_client_per_event_loop(self, core):
+        """测试每个事件循环使用自己的异步客户端，循环退出后客户端随之关闭"""
+
+        async def call():
+            result = await core.async_request("POST", "/commerce/v1/benefits/user_credit", "token")
+            return result, core.get_async_client()
+
+        first, first_client = asyncio.run(call())
+        # 第二个 asyncio.run 不能复用绑定在已关闭循环上的客户端
+        second, second_client = asyncio.run(call())
+
+        assert "sessionid=token" in first["cookie"] and "sessionid=token" in second["cookie"]
+        assert first_client is not second_client
+        assert first_client.is_closed and second_client.is_closed
+        assert core._async_clients == {}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
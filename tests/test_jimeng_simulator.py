@@ -0,0 +1,177 @@
+"""
+即梦后端模拟器测试（scripts/jimeng_simulator.py）
+"""
+
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAST = {"queue_ms": 0, "api_latency_ms": 0, "cdn_latency_ms": 0}
+
+
+@pytest.fixture(autouse=True)
+def fast_poller(monkeypatch):
+    """模拟器几乎立即出图，轮询器不必按真实的预计耗时等待"""
+    from src.jimeng import poller
+
+    monkeypatch.setattr(poller, "POLL_MIN_INTERVAL", 0.01)
+    monkeypatch.setattr(poller, "POLL_EXPECTED_SECONDS", 0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_credit_cache(monkeypatch):
+    """每个测试使用新的模拟器，积分缓存不能沿用上一个测试的余额"""
+    from src.jimeng import credits
+
+    monkeypatch.setattr(credits, "_credit_cache", None)
+    monkeypatch.setattr(credits, "CREDIT_REFRESH_SECONDS", 0)
+
+
+def _run(sim, coro_factory):
+    """把 jimeng 客户端的请求路由到进程内的模拟器"""
+    from scripts.jimeng_simulator import create_app
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(sim)))
+
+    async def run():
+        async with client:
+            return await coro_factory(client)
+
+    with patch("src.jimeng.core.BASE_URL", "http://sim.local"), patch(
+        "src.jimeng.core.get_async_client", return_value=client
+    ):
+        return asyncio.run(run())
+
+
+class TestJimengSimulator:
+    """测试真实 jimeng 客户端在模拟器上的行为"""
+
+    @pytest.mark.parametrize("encoding", ["gzip", "br"])
+    def test_generate_and_download(self, encoding):
+        """测试生成 → 轮询 → 下载完整链路，以及压缩响应的解码"""
+        from scripts.jimeng_simulator import JimengSimulator
+        from src.jimeng.images import generate_images_async
+
+        sim = JimengSimulator({**FAST, "encoding": encoding}, seed=1)
+
+        async def flow(client):
+            urls = await generate_images_async("jimeng-2.1", "露营椅", refresh_token="t1")
+            image = await client.get(urls[0])
+            return urls, image
+
+        urls, image = _run(sim, flow)
+        assert len(urls) == 4
+        assert image.content.startswith(b"\x89PNG")
+        assert sim.credits["t1"] == sim.settings["credits"] - 1
+
+    def test_content_filter_and_insufficient_credits(self):
+        """测试 2038 映射为内容过滤异常，积分耗尽映射为积分不足异常"""
+        from scripts.jimeng_simulator import JimengSimulator
+        from src.jimeng.exceptions import (
+            API_CONTENT_FILTERED,
+            API_IMAGE_GENERATION_INSUFFICIENT_POINTS,
+        )
+        from src.jimeng.images import generate_images_async
+
+        sim = JimengSimulator({**FAST, "filtered": 1.0}, seed=1)
+        with pytest.raises(API_CONTENT_FILTERED):
+            _run(sim, lambda _: generate_images_async("jimeng-2.1", "x", refresh_token="t"))
+
+        # 换一个 token：上一个模拟器里 "t" 的余额已被积分缓存记住
+        sim = JimengSimulator({**FAST, "credits": 0, "daily_gift": 0}, seed=1)
+        with pytest.raises(API_IMAGE_GENERATION_INSUFFICIENT_POINTS):
+            _run(sim, lambda _: generate_images_async("jimeng-2.1", "x", refresh_token="t2"))
+        assert sim.stats["credit_receive"] == 1
+
+    def test_pending_jobs_report_status_20(self):
+        """测试排队中的任务返回 status=20，不消耗生成结果"""
+        from scripts.jimeng_simulator import JimengSimulator
+
+        sim = JimengSimulator({**FAST, "queue_ms": 60000}, seed=1)
+        job = sim.submit("t", "露营椅")
+        assert sim.record(job.history_id, "http://sim.local")["status"] == 20
+        assert sim.record("missing", "http://sim.local") is None
+
+
+
+class TestJimengJobAPI:
+    """测试 submit_generation / collect 任务接口"""
+
+    def test_many_jobs_share_polls(self):
+        """测试大量在途任务只占用协程，轮询按 token 合并"""
+        from scripts.jimeng_simulator import JimengSimulator
+        from src.jimeng import submit_generation_async
+
+        sim = JimengSimulator({**FAST, "queue_ms": 200, "jitter_ms": 0}, seed=1)
+
+        async def flow(client):
+            jobs = await asyncio.gather(
+                *(submit_generation_async("jimeng-2.1", f"方案{i}", refresh_token="t") for i in range(30))
+            )
+            return await asyncio.gather(*jobs)
+
+        results = _run(sim, flow)
+        assert len(results) == 30 and all(len(urls) == 4 for urls in results)
+        # 每次查询请求合并了多个任务（批量上限 20）
+        assert sim.stats["polls"] / sim.stats["history_requests"] >= 10
+
+    def test_chat_completion_is_async(self):
+        """测试对话补全走异步生成接口，返回 Markdown 图片"""
+        from scripts.jimeng_simulator import JimengSimulator
+        from src.jimeng import create_completion
+
+        sim = JimengSimulator(FAST, seed=1)
+        result = _run(
+            sim,
+            lambda _: create_completion([{"role": "user", "content": "露营椅"}], "t"),
+        )
+        assert result["choices"][0]["message"]["content"].count("![image_") == 4
+
+
+class TestJimengTokenPool:
+    """测试多账号 token 池在模拟器上的分摊与隔离"""
+
+    def test_pool_skips_expired_and_empty_accounts(self):
+        """测试登录失效和积分耗尽的账号被隔离，任务由其余账号完成"""
+        from scripts.jimeng_simulator import JimengSimulator
+        from src.jimeng.images import generate_images_async
+        from src.jimeng.token_pool import TokenPool
+
+        sim = JimengSimulator(
+            {
+                **FAST,
+                "daily_gift": 0,
+                "token_credits": {"poor-token": 0},
+                "expired_tokens": ["dead-token"],
+            },
+            seed=1,
+        )
+        pool = TokenPool(["dead-token", "poor-token", "rich-token", "spare-token"])
+
+        async def flow(_):
+            return await asyncio.gather(
+                *(
+                    pool.call_async(
+                        lambda t, i=i: generate_images_async("jimeng-2.1", f"方案{i}", refresh_token=t)
+                    )
+                    for i in range(12)
+                )
+            )
+
+        results = _run(sim, flow)
+        assert all(len(urls) == 4 for urls in results)
+        stats = pool.stats()
+        assert stats["tokens"]["dead-t..."]["quarantined"] == "expired"
+        assert stats["tokens"]["poor-t..."]["quarantined"] == "insufficient_points"
+        assert stats["available"] == 2 and stats["inflight"] == 0
+        assert sim.credits["rich-token"] < 1000 and sim.credits["spare-token"] < 1000
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,118 @@
+"""
+即梦多账号 token 池测试
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _pool(tokens, balances=None, **kwargs):
+    from src.jimeng.token_pool import TokenPool
+
+    balances = balances or {}
+    return TokenPool(tokens, balance=balances.get, **kwargs)
+
+
+class TestTokenPool:
+    """测试 TokenPool 的选择、隔离与重试"""
+
+    def test_prefers_richer_account(self):
+        """测试优先分配积分更多的账号"""
+        pool = _pool(["a", "b"], {"a": 2, "b": 500})
+        assert pool.acquire() == "b"
+
+    def test_spreads_by_inflight(self):
+        """测试积分相同时按在途数分摊到各账号"""
+        pool = _pool(["a", "b", "c"], {"a": 100, "b": 100, "c": 100})
+        picked = [pool.acquire() for _ in range(6)]
+        assert sorted(picked) == ["a", "a", "b", "b", "c", "c"]
+
+        pool.release("a")
+        assert pool.acquire() == "a"
+
+    def test_failure_rate_penalty(self):
+        """测试近期失败率高的账号得分降低"""
+        pool = _pool(["a", "b"], {"a": 100, "b": 100})
+        for _ in range(3):
+            pool.acquire(exclude=["b"])
+            pool.release("a", RuntimeError("boom"))
+            pool.acquire(exclude=["a"])
+            pool.release("b")
+        assert pool.acquire() == "b"
+
+    def test_expired_token_quarantined_until_restore(self):
+        """测试登录失效的账号一直隔离，直到手动恢复"""
+        from src.jimeng.exceptions import API_TOKEN_EXPIRES
+
+        pool = _pool(["a", "b"], quarantine_seconds=0)
+        pool.acquire(exclude=["b"])
+        pool.release("a", API_TOKEN_EXPIRES("login error"))
+        assert [pool.acquire() for _ in range(3)] == ["b", "b", "b"]
+        assert pool.stats()["tokens"]["a..."]["quarantined"] == "expired"
+
+        pool.restore("a")
+        assert pool.stats()["available"] == 2
+
+    def test_insufficient_points_quarantine_expires(self):
+        """测试积分不足的账号隔离到期后重新参与分配"""
+        from src.jimeng.exceptions import API_IMAGE_GENERATION_INSUFFICIENT_POINTS
+
+        pool = _pool(["a"], quarantine_seconds=0.05)
+        pool.release(pool.acquire(), API_IMAGE_GENERATION_INSUFFICIENT_POINTS("no credit"))
+        assert pool.stats()["available"] == 0
+        time.sleep(0.06)
+        assert pool.acquire() == "a"
+
+    def test_call_retries_on_next_token(self):
+        """测试 call 遇到隔离类错误时换账号重试，其它错误直接抛出"""
+        from src.jimeng.exceptions import API_TOKEN_EXPIRES
+
+        pool = _pool(["a", "b"], {"a": 500, "b": 100})
+        used = []
+
+        def fn(token):
+            used.append(token)
+            if token == "a":
+                raise API_TOKEN_EXPIRES("login error")
+            return token
+
+        assert pool.call(fn) == "b"
+        assert used == ["a", "b"]
+        assert pool.stats()["inflight"] == 0
+
+        def bad_prompt(token):
+            raise ValueError("bad prompt")
+
+        with pytest.raises(ValueError):
+            pool.call(bad_prompt)
+        assert pool.stats()["inflight"] == 0
+
+    def test_all_quarantined_raises_last_error(self):
+        """测试所有账号都不可用时抛出最后一次的隔离错误"""
+        from src.jimeng.exceptions import API_IMAGE_GENERATION_INSUFFICIENT_POINTS
+
+        pool = _pool(["a", "b"])
+
+        async def fn(token):
+            raise API_IMAGE_GENERATION_INSUFFICIENT_POINTS(f"{token} no credit")
+
+        with pytest.raises(API_IMAGE_GENERATION_INSUFFICIENT_POINTS):
+            asyncio.run(pool.call_async(fn))
+        assert pool.stats()["available"] == 0
+
+    def test_stats_mask_tokens(self):
+        """测试统计中不暴露完整 token"""
+        pool = _pool(["secret-refresh-token"], {"secret-refresh-token": 7})
+        stats = pool.stats()
+        assert list(stats["tokens"]) == ["secret..."]
+        assert stats["tokens"]["secret..."]["balance"] == 7
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,141 @@
+"""
+容错 JSON 修复解析器测试
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestJsonRepair:
+    """测试常见 LLM 输出问题的修复"""
+
+    @pytest.mark.parametrize(
+        "raw, expected, repair",
+        [
+            ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}, "trailing_comma"),
+            ('{"a": "第一行\n第二行"}', {"a": "第一行\n第二行"}, "escaped_control_chars"),
+            ('{"a": "他说"你好"。"}', {"a": '他说"你好"。'}, "escaped_inner_quote"),
+            ("{“a”: “中文”}", {"a": "中文"}, "smart_quotes"),
+            ('{"a": True, "b": None}', {"a": True, "b": None}, "python_literal"),
+            ('[{"a": 1}\n{"a": 2}]', [{"a": 1}, {"a": 2}], "inserted_comma"),
+            ('{"a": 1 // 注释\n}', {"a": 1}, "removed_comment"),
+        ],
+    )
+    def test_repairs(self, raw, expected, repair):
+        """测试各类问题都能修复并报告修复类型"""
+        from src.core.json_repair import parse_json
+
+        result = parse_json(raw)
+        assert result.value == expected
+        assert repair in result.repairs
+
+    def test_truncated_response(self):
+        """测试截断的响应：补齐字符串与括号，丢弃只有半个键的成员"""
+        from src.core.json_repair import parse_json
+
+        result = parse_json('{"summary": "摘要", "content": "被截断的正')
+        assert result.value == {"summary": "摘要", "content": "被截断的正"}
+        assert "closed_string" in result.repairs
+
+        result = parse_json('{"prompts": [{"prompt": "p1"}, {"scheme": "B", "pro')
+        assert result.value == {"prompts": [{"prompt": "p1"}, {"scheme": "B"}]}
+        assert "dropped_incomplete_member" in result.repairs
+
+    def test_strips_prose_and_fences(self):
+        """测试忽略 JSON 前后的说明文字与代码块围栏"""
+        from src.core.json_repair import parse_json
+
+        result = parse_json('好的：\n```json\n{"a": [1, 2]}\n```\n希望有帮助')
+        assert result.value == {"a": [1, 2]}
+        assert result.repairs == {"stripped_prefix": 1, "stripped_suffix": 1}
+
+    def test_valid_json_has_no_repairs(self):
+        """测试合法 JSON 不报告修复"""
+        from src.core.json_repair import parse_json
+
+        assert not parse_json('{"path": "C:\\\\new", "n": 1.5}').repaired
+
+    def test_no_json_raises(self):
+        """测试没有 JSON 结构时抛出 JsonRepairError"""
+        from src.core.json_repair import JsonRepairError, parse_json
+
+        with pytest.raises(JsonRepairError):
+            parse_json("抱歉，我无法完成这个请求")
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 7, 64])
+    def test_incremental_matches_one_shot(self, chunk_size):
+        """测试任意分块喂入与一次性解析结果一致"""
+        from src.core.json_repair import JsonRepairParser, parse_json
+
+        raw = '说明\n{"a": "他说"好"\n换行", "b": [1, 2.5e3, True,], "c": {“d”: "\\u4e2d'
+        parser = JsonRepairParser()
+        for i in range(0, len(raw), chunk_size):
+            parser.feed(raw[i : i + chunk_size])
+        result = parser.finish()
+        assert result.value == parse_json(raw).value
+        assert result.value["b"] == [1, 2500.0, True]
+        assert result.value["c"] == {"d": "中"}
+
+    def test_peek_previews_partial_stream(self):
+        """测试 peek 返回当前部分补齐后的结果且不影响后续输入"""
+        from src.core.json_repair import JsonRepairParser
+
+        parser = JsonRepairParser()
+        parser.feed('{"prompts": [{"prompt": "p1"}, {"prompt": "p')
+        assert parser.peek().value == {"prompts": [{"prompt": "p1"}, {"prompt": "p"}]}
+        parser.feed('2"}]}')
+        assert parser.finish().value == {"prompts": [{"prompt": "p1"}, {"prompt": "p2"}]}
+        assert parser.done
+
+
+class TestResponseProcessorRepair:
+    """测试 LLMResponseProcessor 在解析失败时走修复路径"""
+
+    def test_truncated_design_response(self):
+        """测试截断的设计方案仍能解析出已完成的方案"""
+        from src.core.response_processor import LLMResponseProcessor
+
+        raw = '```json\n{"summary": "摘要", "prompts": [{"scheme": "A", "prompt": "p1"},'
+        data = LLMResponseProcessor.process_design_generation(raw)
+        assert data["summary"] == "摘要"
+        assert [p["prompt"] for p in data["prompts"]] == ["p1"]
+
+    def test_unrecoverable_response_raises(self):
+        """测试完全不是 JSON 的响应仍然报错"""
+        from src.core.response_processor import LLMResponseProcessor
+
+        with pytest.raises(json.JSONDecodeError):
+            LLMResponseProcessor.process_market_analysis("抱歉，我无法完成这个请求")
+
+    def test_repairs_are_reported(self):
+        """测试修复列表返回给调用方，截断类修复在 strict 校验中失败"""
+        from src.core.json_repair import CLOSED_BRACKETS
+        from src.core.response_processor import (
+            LLMResponseProcessor,
+            TruncatedResponseError,
+        )
+
+        raw = '{"summary": "摘要", "prompts": [{"scheme": "A", "prompt": "p1"}'
+        data, repairs = LLMResponseProcessor.parse_response_with_repairs(raw)
+        assert data["summary"] == "摘要" and CLOSED_BRACKETS in repairs
+
+        validate = LLMResponseProcessor.strict(LLMResponseProcessor.process_design_generation)
+        with pytest.raises(TruncatedResponseError):
+            validate(raw)
+
+    def test_cosmetic_repairs_pass_strict(self):
+        """测试尾逗号等非截断修复仍然通过 strict 校验"""
+        from src.core.response_processor import LLMResponseProcessor
+
+        validate = LLMResponseProcessor.strict(LLMResponseProcessor.process_market_analysis)
+        data = validate('{"summary": "s", "content": "c", "visuals": [],}')
+        assert data["summary"] == "s"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
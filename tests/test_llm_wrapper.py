@@ -74,6 +74,8 @@ class TestLLMWrapper:
 
         messages = [{"role": "user", "content": "测试"}]
         llm_service.chat_completion(messages, model="test-model")
+        # 日志由后台线程批量写入
+        assert llm_service.log_sink.flush()
 
         # 验证日志文件已创建
         assert os.path.exists(llm_service.log_file)
@@ -97,6 +99,197 @@ class TestLLMWrapper:
 
         assert "API Error" in str(exc_info.value)
 
+    def test_sync_validator_fails_over(self, llm_service, mock_openai_client):
+        """测试同步调用的 validator 拒绝被截断的响应并切换模型"""
+        from src.core.response_processor import LLMResponseProcessor
+
+        create = mock_openai_client.return_value.chat.completions.create
+        create.side_effect = [
+            MockResponse('{"summary": "s", "prompts": [{"prompt": "p1"'),
+            MockResponse('{"summary": "s", "prompts": [{"prompt": "p1"}]}'),
+        ]
+        llm_service.client = mock_openai_client.return_value
+
+        result = llm_service.chat_completion(
+            [{"role": "user", "content": "测试"}],
+            model="test-model",
+            validator=LLMResponseProcessor.strict(
+                LLMResponseProcessor.process_design_generation
+            ),
+        )
+        assert result.endswith("}]}")
+        assert create.call_count == 2
+
+    def test_sync_hedged_completion_backup_wins(self, llm_service, tmp_path):
+        """测试同步调用的对冲：主模型超过阈值未返回时在另一个线程请求备用模型，备用先返回则胜出"""
+        import threading
+        import time
+
+        llm_service.log_file = str(tmp_path / "calls.jsonl")
+        release = threading.Event()
+
+        def create(**kwargs):
+            if kwargs["model"] == "test-model":
+                release.wait(5)
+            return MockResponse(f"来自 {kwargs['model']} 的回复")
+
+        llm_service.client = MagicMock()
+        llm_service.client.chat.completions.create = create
+
+        start = time.time()
+        with patch("src.llm_wrapper.config.LLM_HEDGE_DEFAULT_DELAY", 0.05):
+            result = llm_service.chat_completion(
+                [{"role": "user", "content": "测试"}], model="test-model", hedge=True
+            )
+        release.set()
+
+        assert "test-model" not in result
+        assert time.time() - start < 2
+        stats = llm_service.router.hedge_stats()
+        assert stats["hedges_fired"] == 1
+        assert stats["backup_wins"] == 1
+
+    def test_sync_hedged_completion_skips_invalid_response(self, llm_service, tmp_path):
+        """测试同步对冲时未通过 validator 校验的响应不会胜出"""
+        import json
+
+        llm_service.log_file = str(tmp_path / "calls.jsonl")
+
+        def create(**kwargs):
+            if kwargs["model"] == "test-model":
+                return MockResponse("这不是 JSON 格式")
+            return MockResponse('{"ok": true}')
+
+        llm_service.client = MagicMock()
+        llm_service.client.chat.completions.create = create
+
+        result = llm_service.chat_completion(
+            [{"role": "user", "content": "测试"}],
+            model="test-model",
+            validator=json.loads,
+            hedge=True,
+        )
+        assert result == '{"ok": true}'
+
+
+class TestAsyncLLMService:
+    """测试异步 LLM 服务"""
+
+    @pytest.fixture
+    def async_llm_service(self):
+        """创建异步 LLM 服务实例（使用模拟客户端）"""
+        with patch("src.llm_wrapper.AsyncOpenAI") as mock_client:
+            from src.llm_wrapper import AsyncLLMService
+
+            service = AsyncLLMService(api_key="test-key", base_url="http://test.local")
+            service.client = MagicMock()
+            yield service
+
+    def test_chat_completion_failover(self, async_llm_service, tmp_path):
+        """测试 429 时切换到下一个模型"""
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        async_llm_service.log_file = str(tmp_path / "calls.jsonl")
+        async_llm_service.client.chat.completions.create = AsyncMock(
+            side_effect=[Exception("429 Too Many Requests"), MockResponse("异步测试回复")]
+        )
+
+        result = asyncio.run(
+            async_llm_service.chat_completion(
+                [{"role": "user", "content": "测试"}], model="test-model"
+            )
+        )
+
+        assert result == "异步测试回复"
+        calls = async_llm_service.client.chat.completions.create.call_args_list
+        assert calls[0].kwargs["model"] == "test-model"
+        assert calls[1].kwargs["model"] != "test-model"
+
+    def test_hedged_completion_backup_wins(self, async_llm_service, tmp_path):
+        """测试主模型超过阈值未返回时对冲到备用模型，备用先返回则胜出并取消主模型"""
+        import asyncio
+
+        async_llm_service.log_file = str(tmp_path / "calls.jsonl")
+        cancelled = []
+
+        async def create(**kwargs):
+            if kwargs["model"] == "test-model":
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(kwargs["model"])
+                    raise
+            return MockResponse(f"来自 {kwargs['model']} 的回复")
+
+        async_llm_service.client.chat.completions.create = create
+
+        with patch("src.llm_wrapper.config.LLM_HEDGE_DEFAULT_DELAY", 0.05):
+            result = asyncio.run(
+                async_llm_service.chat_completion(
+                    [{"role": "user", "content": "测试"}], model="test-model", hedge=True
+                )
+            )
+
+        assert "test-model" not in result
+        assert cancelled == ["test-model"]
+        stats = async_llm_service.router.hedge_stats()
+        assert stats["hedges_fired"] == 1
+        assert stats["backup_wins"] == 1
+
+    def test_hedged_completion_skips_invalid_response(self, async_llm_service, tmp_path):
+        """测试未通过 validator 校验的响应不会胜出"""
+        import asyncio
+
+        async_llm_service.log_file = str(tmp_path / "calls.jsonl")
+
+        async def create(**kwargs):
+            if kwargs["model"] == "test-model":
+                return MockResponse("这不是 JSON 格式")
+            await asyncio.sleep(0.01)
+            return MockResponse('{"ok": true}')
+
+        async_llm_service.client.chat.completions.create = create
+
+        import json
+
+        result = asyncio.run(
+            async_llm_service.chat_completion(
+                [{"role": "user", "content": "测试"}],
+                model="test-model",
+                validator=json.loads,
+                hedge=True,
+            )
+        )
+        assert result == '{"ok": true}'
+
+    def test_truncated_response_fails_over(self, async_llm_service, tmp_path):
+        """测试不对冲时被截断的响应也不被采用，切换到下一个模型"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from src.core.response_processor import LLMResponseProcessor
+
+        async_llm_service.log_file = str(tmp_path / "calls.jsonl")
+        async_llm_service.client.chat.completions.create = AsyncMock(
+            side_effect=[
+                MockResponse('{"summary": "s", "content": "半个回'),
+                MockResponse('{"summary": "s", "content": "完整", "visuals": []}'),
+            ]
+        )
+
+        result = asyncio.run(
+            async_llm_service.chat_completion(
+                [{"role": "user", "content": "测试"}],
+                model="test-model",
+                validator=LLMResponseProcessor.strict(
+                    LLMResponseProcessor.process_market_analysis
+                ),
+                hedge=False,
+            )
+        )
+        assert "完整" in result
+        assert async_llm_service.client.chat.completions.create.call_count == 2
+
 
 class TestLLMWrapperStream:
     """测试 LLM 流式响应"""
@@ -119,6 +312,44 @@ class TestLLMWrapperStream:
         """测试流式完成（跳过）"""
         pass
 
+    def test_stream_resumes_on_next_model(self, llm_service_stream, tmp_path):
+        """测试流中途断开时由下一个模型续写，调用方看到一条完整的流"""
+        llm_service_stream.log_file = str(tmp_path / "calls.jsonl")
+
+        def chunk(text):
+            item = Mock()
+            item.choices = [Mock()]
+            item.choices[0].delta.content = text
+            return item
+
+        def broken_stream():
+            yield chunk("第一段内容，")
+            yield chunk("第二段内容")
+            raise Exception("Connection error.")
+
+        requests = []
+
+        def create(**kwargs):
+            requests.append(kwargs)
+            if len(requests) == 1:
+                return broken_stream()
+            # 续写时模型重复了中断前的结尾
+            return iter([chunk("第二段内容"), chunk("，第三段内容。")])
+
+        llm_service_stream.client = MagicMock()
+        llm_service_stream.client.chat.completions.create.side_effect = create
+
+        text = "".join(
+            llm_service_stream.chat_completion_stream(
+                [{"role": "user", "content": "写三段"}], model="test-model"
+            )
+        )
+
+        assert text == "第一段内容，第二段内容，第三段内容。"
+        assert requests[1]["model"] != "test-model"
+        continuation = requests[1]["messages"]
+        assert continuation[-2] == {"role": "assistant", "content": "第一段内容，第二段内容"}
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
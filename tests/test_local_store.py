@@ -0,0 +1,60 @@
+"""
+本地 SQLite 项目存储测试（与 Supabase merge_project_content 契约一致）
+"""
+
+import pytest
+import sys
+import os
+import threading
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestLocalProjectStore:
+    """测试 content 原子合并"""
+
+    def test_merge_only_touches_patched_fields(self):
+        """测试合并只覆盖 patch 中的顶层字段"""
+        from src.services.local_store import LocalProjectStore
+
+        store = LocalProjectStore()
+        store.create_project("p", brief="b", model_name="m")
+        store.merge_project_content("p", {"market_analysis": "m", "extra": {"a": 1}})
+        store.merge_project_content("p", {"extra": {"b": 2}})
+
+        content = store.get_project("p")["content"]
+        # 与 Postgres jsonb || 一致：顶层替换，不做深合并
+        assert content == {"market_analysis": "m", "extra": {"b": 2}}
+
+    def test_merge_missing_project(self):
+        """测试项目不存在时返回 None"""
+        from src.services.local_store import LocalProjectStore
+
+        assert LocalProjectStore().merge_project_content("missing", {"a": 1}) is None
+
+    def test_concurrent_merges_do_not_drop_fields(self, tmp_path):
+        """测试多个连接并发合并不同字段，互不覆盖"""
+        from src.services.local_store import LocalProjectStore
+
+        path = str(tmp_path / "projects.sqlite3")
+        LocalProjectStore(path).create_project("p", brief="b", model_name="m")
+
+        def writer(index):
+            # 每个线程独立连接，模拟 run_step 与 run_all 并发保存
+            store = LocalProjectStore(path)
+            for i in range(20):
+                store.merge_project_content("p", {f"field_{index}_{i}": i})
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        content = LocalProjectStore(path).get_project("p")["content"]
+        assert len(content) == 80
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
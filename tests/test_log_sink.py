@@ -0,0 +1,80 @@
+"""
+LLM 调用日志后台写入器测试
+"""
+
+import gzip
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestLogSink:
+    """测试 LogSink"""
+
+    def test_concurrent_writes_do_not_interleave(self, tmp_path):
+        """测试多线程并发写入的每一行都是完整的 JSON"""
+        from src.core.log_sink import LogSink
+
+        sink = LogSink(batch_size=50)
+        path = str(tmp_path / "calls.jsonl")
+
+        def worker(n):
+            for i in range(200):
+                sink.write(path, {"worker": n, "i": i, "text": "中文" * 50})
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sink.flush()
+        sink.close()
+
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 800
+        assert sink.stats()["written"] == 800
+
+    def test_full_queue_drops_and_counts(self, tmp_path):
+        """测试队列满时丢弃记录而不是阻塞调用方"""
+        from src.core.log_sink import LogSink
+
+        sink = LogSink(max_queue=1)
+        blocker = threading.Event()
+        # 让写线程卡在第一批上，后续记录只能堆在队列里
+        original = sink._write_batch
+        sink._write_batch = lambda batch: (blocker.wait(), original(batch))
+
+        path = str(tmp_path / "calls.jsonl")
+        results = [sink.write(path, {"i": i}) for i in range(5)]
+        blocker.set()
+        sink.close()
+
+        assert not all(results)
+        assert sink.stats()["dropped"] == results.count(False)
+
+    def test_rotation_gzips_segments(self, tmp_path):
+        """测试超过大小上限后轮转并压缩旧段，只保留最近的备份"""
+        from src.core.log_sink import LogSink
+
+        sink = LogSink(batch_size=1, max_bytes=200, backups=2)
+        path = str(tmp_path / "calls.jsonl")
+        for i in range(20):
+            sink.write(path, {"i": i, "pad": "x" * 100})
+            sink.flush()
+        sink.close()
+
+        archives = sorted(p for p in os.listdir(tmp_path) if p.endswith(".gz"))
+        assert len(archives) == 2
+        assert sink.stats()["rotations"] >= 10
+        with gzip.open(tmp_path / archives[-1], "rt", encoding="utf-8") as f:
+            assert json.loads(f.readline())["pad"] == "x" * 100
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,69 @@
+"""
+模型健康路由测试
+"""
+
+import pytest
+import sys
+import os
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestModelRouter:
+    """测试熔断与健康排序"""
+
+    def test_circuit_opens_and_skips_model(self):
+        """测试连续失败后熔断，冷却期内跳过该模型"""
+        from src.core.model_router import ModelRouter
+
+        router = ModelRouter(failure_threshold=2, cooldown_seconds=30)
+        router.record_failure("a", Exception("timed out"))
+        assert router.order(["a", "b"]) == ["a", "b"]
+        router.record_failure("a", Exception("timed out"))
+
+        assert router.order(["a", "b"]) == ["b"]
+        assert router.snapshot()["a"]["state"] == "open"
+
+    def test_half_open_probe_recovers(self):
+        """测试冷却期后只放行一个探测请求，成功后恢复"""
+        import time
+        from src.core.model_router import ModelRouter
+
+        router = ModelRouter(failure_threshold=1, cooldown_seconds=30)
+        router.record_failure("a", Exception("503"))
+
+        later = time.time() + 31
+        assert router.order(["a", "b"], now=later) == ["a", "b"]
+        # 探测进行中，其他调用不再发往该模型
+        assert router.order(["a", "b"], now=later) == ["b"]
+
+        router.record_success("a", 0.5)
+        assert router.snapshot()["a"]["state"] == "closed"
+        assert router.order(["a", "b"]) == ["a", "b"]
+
+    def test_degraded_model_moves_to_end(self):
+        """测试错误率高或明显偏慢的模型排到末尾"""
+        from src.core.model_router import ModelRouter
+
+        router = ModelRouter(failure_threshold=10)
+        router.record_success("a", 9.0)
+        router.record_success("b", 1.0)
+        assert router.order(["a", "b"]) == ["b", "a"]
+
+        router.record_failure("c", Exception("500"))
+        router.record_failure("c", Exception("500"))
+        assert router.order(["c", "b"]) == ["b", "c"]
+
+    def test_all_open_falls_back_to_priority(self):
+        """测试全部熔断时按原优先级返回"""
+        from src.core.model_router import ModelRouter
+
+        router = ModelRouter(failure_threshold=1, cooldown_seconds=30)
+        router.record_failure("a")
+        router.record_failure("b")
+        assert router.order(["a", "b"]) == ["a", "b"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
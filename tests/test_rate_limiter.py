@@ -0,0 +1,145 @@
+"""
+LLM 令牌桶限流测试
+"""
+
+import pytest
+import sys
+import os
+import time
+from unittest.mock import Mock, MagicMock, patch
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestRateLimiter:
+    """测试令牌桶与 Retry-After 冷却"""
+
+    def test_burst_then_wait(self):
+        """测试突发额度用完后需要等待补充令牌"""
+        from src.core.rate_limiter import MemoryBucketBackend
+
+        backend = MemoryBucketBackend()
+        now = 1000.0
+        assert backend.try_acquire("k", rate=1.0, capacity=2, now=now) == 0
+        assert backend.try_acquire("k", rate=1.0, capacity=2, now=now) == 0
+        assert backend.try_acquire("k", rate=1.0, capacity=2, now=now) == pytest.approx(1.0)
+        assert backend.try_acquire("k", rate=1.0, capacity=2, now=now + 1) == 0
+
+    def test_penalize_exceeding_max_wait_raises(self):
+        """测试冷却时间超过 max_wait 时立即抛出，调用方可切换模型"""
+        from src.core.rate_limiter import RateLimiter, RateLimitError
+
+        limiter = RateLimiter(max_wait=1)
+        limiter.penalize("k", 30)
+        with pytest.raises(RateLimitError) as exc_info:
+            limiter.acquire("k")
+        assert exc_info.value.retry_after > 1
+        # 其他键不受影响
+        limiter.acquire("other")
+
+    def test_sqlite_backend_shared_between_instances(self, tmp_path):
+        """测试 SQLite 后端在多个限流器（模拟多个 worker）之间共享冷却"""
+        from src.core.rate_limiter import RateLimiter, SQLiteBucketBackend, RateLimitError
+
+        path = str(tmp_path / "limits.sqlite3")
+        worker_a = RateLimiter(SQLiteBucketBackend(path), max_wait=0.5)
+        worker_b = RateLimiter(SQLiteBucketBackend(path), max_wait=0.5)
+
+        worker_a.penalize("provider:model", 10)
+        with pytest.raises(RateLimitError):
+            worker_b.acquire("provider:model")
+
+    def test_zero_rate_only_honors_cooldown(self):
+        """测试未配置速率时不主动限流，429 冷却仍然生效"""
+        from src.core.rate_limiter import RateLimiter, RateLimitError
+
+        limiter = RateLimiter(rate_per_minute=0, burst=1, max_wait=0.5)
+        for _ in range(100):
+            limiter.acquire("k")
+        assert limiter.waits == 0
+
+        limiter.penalize("k", 10)
+        with pytest.raises(RateLimitError):
+            limiter.acquire("k")
+
+    def test_sqlite_acquire_async_runs_off_event_loop(self, tmp_path):
+        """测试 SQLite 后端的 acquire_async 在线程中执行事务，不阻塞事件循环"""
+        import asyncio
+        import threading
+        from src.core.rate_limiter import RateLimiter, SQLiteBucketBackend
+
+        backend = SQLiteBucketBackend(str(tmp_path / "limits.sqlite3"))
+        threads = []
+        original = backend.try_acquire
+
+        def try_acquire(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return original(*args, **kwargs)
+
+        backend.try_acquire = try_acquire
+        limiter = RateLimiter(backend)
+
+        asyncio.run(limiter.acquire_async("k"))
+        assert threads and threads[0] is not threading.main_thread()
+
+
+class TestLLMServiceRateLimit:
+    """测试 LLMService 对 429 的处理"""
+
+    @pytest.fixture
+    def llm_service(self, tmp_path):
+        with patch("src.llm_wrapper.OpenAI"):
+            from src.llm_wrapper import LLMService
+
+            service = LLMService(api_key="test-key", base_url="http://test.local")
+            service.client = MagicMock()
+            service.log_file = str(tmp_path / "calls.jsonl")
+            yield service
+
+    def _rate_limit_error(self, retry_after):
+        error = Exception("429 Too Many Requests")
+        error.response = Mock(headers={"retry-after": retry_after})
+        return error
+
+    def test_short_retry_after_retries_same_model(self, llm_service):
+        """测试 Retry-After 较短时冷却后重试同一模型"""
+        from tests.test_llm_wrapper import MockResponse
+
+        llm_service.client.chat.completions.create.side_effect = [
+            self._rate_limit_error("0.1"),
+            MockResponse("限流后重试成功"),
+        ]
+
+        start = time.time()
+        result = llm_service.chat_completion(
+            [{"role": "user", "content": "测试"}], model="test-model"
+        )
+
+        assert result == "限流后重试成功"
+        assert time.time() - start >= 0.1
+        calls = llm_service.client.chat.completions.create.call_args_list
+        assert [c.kwargs["model"] for c in calls] == ["test-model", "test-model"]
+
+    def test_long_retry_after_switches_model(self, llm_service):
+        """测试 Retry-After 过长时切换模型，且该模型保持冷却"""
+        from tests.test_llm_wrapper import MockResponse
+
+        llm_service.client.chat.completions.create.side_effect = [
+            self._rate_limit_error("120"),
+            MockResponse("备用模型回复"),
+        ]
+
+        result = llm_service.chat_completion(
+            [{"role": "user", "content": "测试"}], model="test-model"
+        )
+
+        assert result == "备用模型回复"
+        calls = llm_service.client.chat.completions.create.call_args_list
+        assert calls[1].kwargs["model"] != "test-model"
+        blocked = llm_service.limiter.stats()["buckets"]["test.local:test-model"]
+        assert blocked["blocked_until"] > time.time() + 100
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,273 @@
+"""
+run_all 检查点测试
+"""
+
+import asyncio
+import copy
+import json
+import re
+import pytest
+import sys
+import os
+import threading
+import time
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestRunCheckpoint:
+    """测试检查点状态与续跑判定"""
+
+    def test_roundtrip_through_content(self):
+        """测试检查点写入 content 后可还原"""
+        from src.services.run_checkpoint import RunCheckpoint
+
+        checkpoint = RunCheckpoint.new({"project_name": "p", "brief": "b"})
+        checkpoint.record("market_analysis", {"summary": "x"})
+
+        restored = RunCheckpoint.from_content(checkpoint.to_content())
+        assert restored.run_id == checkpoint.run_id
+        assert restored.request["brief"] == "b"
+        assert restored.completed_nodes == {"market_analysis": {"summary": "x"}}
+
+    def test_from_content_without_state(self):
+        """测试没有检查点的 content 返回 None"""
+        from src.services.run_checkpoint import RunCheckpoint
+
+        assert RunCheckpoint.from_content({}) is None
+        assert RunCheckpoint.from_content(None) is None
+        assert RunCheckpoint.from_content({"run_state": "bad"}) is None
+
+    def test_find_resumable_only_stale_running(self):
+        """测试只续跑心跳过期且仍在运行中的检查点"""
+        from src.services.run_checkpoint import RunCheckpoint, find_resumable
+
+        stale = RunCheckpoint.new({"project_name": "stale"})
+        stale.state["heartbeat"] = time.time() - 600
+        fresh = RunCheckpoint.new({"project_name": "fresh"})
+        done = RunCheckpoint.new({"project_name": "done"})
+        done.finish("completed")
+        done.state["heartbeat"] = time.time() - 600
+
+        projects = [
+            {"project_name": "stale", "content": stale.to_content()},
+            {"project_name": "fresh", "content": fresh.to_content()},
+            {"project_name": "done", "content": done.to_content()},
+            {"project_name": "legacy", "content": {"market_analysis": "..."}},
+        ]
+        resumable = find_resumable(projects, stale_after=180)
+        assert [name for name, _ in resumable] == ["stale"]
+
+
+class _FakeQuery:
+    """Supabase 查询构造器的最小替身：支持 select / update + eq(JSON 路径) + execute"""
+
+    def __init__(self, db):
+        self.db = db
+        self.payload = None
+        self.filters = []
+
+    def select(self, *_):
+        return self
+
+    def update(self, payload):
+        self.payload = payload
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def _matches(self, row):
+        for column, expected in self.filters:
+            value = row
+            for part in re.split(r"->>?", column):
+                value = value.get(part) if isinstance(value, dict) else None
+            text = value if isinstance(value, str) else json.dumps(value)
+            if text != expected:
+                return False
+        return True
+
+    async def execute(self):
+        await asyncio.sleep(0)
+        rows = [row for row in self.db.rows if self._matches(row)]
+        if self.payload is not None:
+            for row in rows:
+                row.update(copy.deepcopy(self.payload))
+        return type("Result", (), {"data": copy.deepcopy(rows)})()
+
+
+class _FakeAsyncClient:
+    """模拟 projects 表；has_rpc=False 时 rpc 返回 PostgREST 的函数不存在错误"""
+
+    def __init__(self, rows, has_rpc=True):
+        self.rows = rows
+        self.has_rpc = has_rpc
+        self.rpc_calls = []
+
+    def table(self, name):
+        return _FakeQuery(self)
+
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        client = self
+
+        class _Call:
+            async def execute(self):
+                if not client.has_rpc:
+                    raise Exception("PGRST202 Could not find the function claim_project_run")
+                await asyncio.sleep(0)
+                for row in client.rows:
+                    state = row["content"].get("run_state") or {}
+                    if row["project_name"] == params["p_project_name"] and all(
+                        state.get(k) == v for k, v in params["p_expected"].items()
+                    ):
+                        row["content"]["run_state"] = copy.deepcopy(params["p_state"])
+                        return type("Result", (), {"data": True})()
+                return type("Result", (), {"data": None})()
+
+        return _Call()
+
+
+def _stale_checkpoint():
+    from src.services.run_checkpoint import RunCheckpoint
+
+    checkpoint = RunCheckpoint.new({"project_name": "p", "brief": "b"})
+    checkpoint.state["owner"] = "dead-worker"
+    checkpoint.state["heartbeat"] = time.time() - 600
+    return checkpoint
+
+
+class TestRunClaim:
+    """测试中断运行的认领是原子的：并发认领恰好一个成功"""
+
+    def _race(self, monkeypatch, has_rpc):
+        from src.services import db_service
+        from src.services.run_checkpoint import RunCheckpoint
+
+        checkpoint = _stale_checkpoint()
+        client = _FakeAsyncClient(
+            [{"project_name": "p", "content": {"market_analysis": "m", **checkpoint.to_content()}}],
+            has_rpc=has_rpc,
+        )
+
+        async def get_client():
+            return client
+
+        monkeypatch.setattr(db_service, "get_async_supabase_client", get_client)
+        monkeypatch.setattr(db_service, "_claim_rpc_available", True)
+
+        async def claimer(name):
+            # 每个 worker 各自扫描到同一个过期检查点
+            mine = RunCheckpoint(copy.deepcopy(checkpoint.state))
+            expected = mine.lease()
+            mine.touch()
+            mine.state["owner"] = name
+            return await db_service.claim_run_async("p", expected, mine.state)
+
+        async def race():
+            return await asyncio.gather(claimer("worker-a"), claimer("worker-b"))
+
+        results = asyncio.run(race())
+        return results, client
+
+    def test_rpc_claim_race(self, monkeypatch):
+        """测试通过 RPC 认领时两个 worker 只有一个成功"""
+        results, client = self._race(monkeypatch, has_rpc=True)
+        assert sorted(results) == [False, True]
+        assert [name for name, _ in client.rpc_calls] == ["claim_project_run"] * 2
+        winner = "worker-a" if results[0] else "worker-b"
+        assert client.rows[0]["content"]["run_state"]["owner"] == winner
+
+    def test_fallback_claim_race(self, monkeypatch):
+        """测试缺少 RPC 时回退为带条件的 update，仍然只有一个成功且保留其它字段"""
+        results, client = self._race(monkeypatch, has_rpc=False)
+        assert sorted(results) == [False, True]
+        assert client.rows[0]["content"]["market_analysis"] == "m"
+
+    def test_local_store_claim_race(self, tmp_path):
+        """测试本地存储的认领：多个连接并发认领同一个运行只有一个成功"""
+        from src.services.local_store import LocalProjectStore
+
+        path = str(tmp_path / "projects.sqlite3")
+        checkpoint = _stale_checkpoint()
+        store = LocalProjectStore(path)
+        store.create_project("p", brief="b", model_name="m")
+        store.merge_project_content("p", checkpoint.to_content())
+
+        barrier = threading.Barrier(4)
+        results = {}
+
+        def claimer(name):
+            state = {**checkpoint.state, "owner": name, "heartbeat": time.time()}
+            local = LocalProjectStore(path)
+            barrier.wait()
+            results[name] = local.claim_run("p", checkpoint.lease(), state)
+
+        threads = [threading.Thread(target=claimer, args=(f"w{i}",)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        winners = [name for name, ok in results.items() if ok]
+        assert len(winners) == 1
+        assert store.get_project("p")["content"]["run_state"]["owner"] == winners[0]
+
+
+class TestRunCancellation:
+    """测试运行被取消（进程关闭）时检查点保持可续跑"""
+
+    def test_cancelled_run_stays_resumable(self, monkeypatch, tmp_path):
+        """测试 run() 中途被取消后检查点仍为 running，心跳过期后可被续跑"""
+        from src import main
+        from src.services.run_checkpoint import RunCheckpoint, find_resumable
+
+        db_service = main.db_service
+
+        async def no_async_client():
+            return None
+
+        monkeypatch.setattr(db_service, "get_async_supabase_client", no_async_client)
+        monkeypatch.setattr(db_service, "_local_store", None)
+        monkeypatch.setattr(db_service.config, "LOCAL_DB_PATH", str(tmp_path / "projects.sqlite3"))
+        store = db_service.get_local_store()
+        store.create_project("p", brief="b", model_name="m")
+        store.update_project("p", status="in_progress")
+
+        reached = None
+
+        class _StuckGraph:
+            async def run(self, on_start=None, skip=None, on_finish=None):
+                await on_finish("market_analysis", {"summary": "s", "visuals": []})
+                reached.set()
+                await asyncio.Event().wait()
+
+        workflow = main.AsyncDesignWorkflow(project_name="p")
+        monkeypatch.setattr(workflow, "build_graph", lambda *args, **kwargs: _StuckGraph())
+        checkpoint = RunCheckpoint.new({"project_name": "p", "brief": "b"})
+
+        async def scenario():
+            nonlocal reached
+            reached = asyncio.Event()
+            task = asyncio.create_task(workflow.run("b", checkpoint=checkpoint))
+            await reached.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+
+        project = store.get_project("p")
+        assert project["status"] == "in_progress"
+        state = project["content"]["run_state"]
+        assert state["status"] == "running"
+        assert "market_analysis" in state["nodes"]
+        # 心跳过期后 reaper 能再次认领
+        later = [{**project, "content": {"run_state": {**state, "heartbeat": time.time() - 600}}}]
+        assert [name for name, _ in find_resumable(later, stale_after=180)] == ["p"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
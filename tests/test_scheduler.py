@@ -0,0 +1,166 @@
+"""
+DAG 步骤调度器测试
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestStepGraph:
+    """测试步骤依赖图"""
+
+    def test_independent_nodes_overlap(self):
+        """测试无依赖关系的节点并行执行"""
+        from src.core.scheduler import StepGraph
+
+        async def slow(**_):
+            await asyncio.sleep(0.1)
+            return "ok"
+
+        graph = StepGraph()
+        graph.add("root", slow)
+        graph.add("a", slow, deps=["root"])
+        graph.add("b", slow, deps=["root"])
+
+        start = time.time()
+        report = asyncio.run(graph.run())
+        elapsed = time.time() - start
+
+        # 串行需要 0.3s，a 与 b 并行后约 0.2s
+        assert elapsed < 0.28
+        assert report.results == {"root": "ok", "a": "ok", "b": "ok"}
+
+    def test_dependency_results_passed_as_kwargs(self):
+        """测试依赖结果以参数形式传入"""
+        from src.core.scheduler import StepGraph
+
+        async def one():
+            return 1
+
+        async def two(one):
+            return one + 1
+
+        async def total(one, two):
+            return one + two
+
+        graph = StepGraph()
+        graph.add("one", one)
+        graph.add("two", two, deps=["one"])
+        graph.add("total", total, deps=["one", "two"])
+
+        report = asyncio.run(graph.run())
+        assert report.results["total"] == 3
+
+    def test_critical_path(self):
+        """测试关键路径沿最晚完成的依赖回溯"""
+        from src.core.scheduler import StepGraph
+
+        def sleeper(delay):
+            async def _run(**_):
+                await asyncio.sleep(delay)
+
+            return _run
+
+        graph = StepGraph()
+        graph.add("start", sleeper(0.01))
+        graph.add("fast", sleeper(0.01), deps=["start"])
+        graph.add("slow", sleeper(0.1), deps=["start"])
+        graph.add("end", sleeper(0.01), deps=["fast", "slow"])
+
+        report = asyncio.run(graph.run())
+        assert report.critical_path == ["start", "slow", "end"]
+        assert set(report.to_dict()["nodes"]) == {"start", "fast", "slow", "end"}
+
+    def test_failure_cancels_pending_nodes(self):
+        """测试节点失败时抛出异常并取消下游"""
+        from src.core.scheduler import StepGraph
+
+        executed = []
+
+        async def boom():
+            raise RuntimeError("boom")
+
+        async def downstream(boom):
+            executed.append("downstream")
+
+        graph = StepGraph()
+        graph.add("boom", boom)
+        graph.add("downstream", downstream, deps=["boom"])
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(graph.run())
+        assert executed == []
+
+    def test_skip_uses_existing_result(self):
+        """测试跳过已完成节点"""
+        from src.core.scheduler import StepGraph
+
+        async def first():
+            raise AssertionError("should be skipped")
+
+        async def second(first):
+            return first * 2
+
+        graph = StepGraph()
+        graph.add("first", first)
+        graph.add("second", second, deps=["first"])
+
+        report = asyncio.run(graph.run(skip={"first": 21}))
+        assert report.results["second"] == 42
+        assert "first" not in report.timings
+
+    def test_cycle_detection(self):
+        """测试依赖环检测"""
+        from src.core.scheduler import StepGraph, StepGraphError
+
+        async def noop(**_):
+            return None
+
+        graph = StepGraph()
+        graph.add("a", noop, deps=["b"])
+        graph.add("b", noop, deps=["a"])
+
+        with pytest.raises(StepGraphError):
+            graph.validate()
+
+    def test_unknown_dependency(self):
+        """测试未知依赖"""
+        from src.core.scheduler import StepGraph, StepGraphError
+
+        async def noop(**_):
+            return None
+
+        graph = StepGraph().add("a", noop, deps=["missing"])
+        with pytest.raises(StepGraphError):
+            graph.validate()
+
+    def test_on_finish_before_downstream(self):
+        """测试 on_finish 回调在下游节点启动前完成"""
+        from src.core.scheduler import StepGraph
+
+        events = []
+
+        async def first():
+            return 1
+
+        async def second(first):
+            events.append("second")
+            return first + 1
+
+        async def on_finish(name, result):
+            events.append(f"finish:{name}")
+
+        graph = StepGraph().add("first", first).add("second", second, deps=["first"])
+        asyncio.run(graph.run(on_finish=on_finish))
+
+        assert events == ["finish:first", "second", "finish:second"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,96 @@
+"""
+进程级服务容器测试
+"""
+
+import pytest
+import sys
+import os
+import threading
+from unittest.mock import Mock
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestServiceContainer:
+    """测试服务只构建一次并按配置区分"""
+
+    def test_llm_reused_per_config(self):
+        """测试相同配置复用实例，不同配置各自构建"""
+        from src.core.service_container import ServiceContainer
+
+        factory = Mock(side_effect=lambda **kwargs: object())
+        container = ServiceContainer()
+
+        a = container.llm("key-a", "https://a", factory=factory)
+        assert container.llm("key-a", "https://a", factory=factory) is a
+        b = container.llm("key-b", "https://a", factory=factory)
+
+        assert b is not a
+        assert factory.call_count == 2
+
+    def test_concurrent_get_builds_once(self):
+        """测试多线程并发获取时只构建一次"""
+        from src.core.service_container import ServiceContainer
+
+        factory = Mock(side_effect=lambda **kwargs: object())
+        container = ServiceContainer()
+        results = []
+
+        def worker():
+            results.append(container.image_gen("script.py", factory=factory))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert factory.call_count == 1
+        assert all(r is results[0] for r in results)
+
+    def test_async_llm_per_loop_released_on_exit(self):
+        """测试异步服务按事件循环区分，循环退出后从容器移除并关闭客户端"""
+        import asyncio
+        from unittest.mock import AsyncMock
+        from src.core.service_container import ServiceContainer
+
+        def factory(**kwargs):
+            service = Mock()
+            service.client = AsyncMock()
+            return service
+
+        container = ServiceContainer()
+
+        async def get():
+            service = container.async_llm("key", "https://a", factory=factory)
+            assert container.async_llm("key", "https://a", factory=factory) is service
+            return service
+
+        first = asyncio.run(get())
+        second = asyncio.run(get())
+
+        assert first is not second
+        first.client.close.assert_awaited_once()
+        second.client.close.assert_awaited_once()
+        assert container.stats()["services"] == {}
+        assert container._loops == {}
+
+    def test_knowledge_base_reloads_on_change(self, tmp_path):
+        """测试知识库按 mtime 缓存，文件修改后重新读取"""
+        from src.core.service_container import ServiceContainer, DEFAULT_KNOWLEDGE
+
+        kb = tmp_path / "KNOWLEDGE.md"
+        container = ServiceContainer()
+        assert container.knowledge_base(str(kb)) == DEFAULT_KNOWLEDGE
+
+        kb.write_text("v1", encoding="utf-8")
+        assert container.knowledge_base(str(kb)) == "v1"
+
+        kb.write_text("v2", encoding="utf-8")
+        os.utime(kb, (os.path.getmtime(kb) + 10, os.path.getmtime(kb) + 10))
+        assert container.knowledge_base(str(kb)) == "v2"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,157 @@
+"""
+相同 LLM 调用合并（singleflight）测试
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _response(content):
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = content
+    return response
+
+
+class TestFlightKey:
+    """测试合并键"""
+
+    def test_normalizes_whitespace(self):
+        """测试只差空白的消息得到同一个键，模型或选项不同则不同"""
+        from src.core.singleflight import flight_key
+
+        a = flight_key("m", [{"role": "user", "content": "扩展需求：\n  露营椅 "}])
+        b = flight_key("m", [{"role": "user", "content": "扩展需求： 露营椅"}])
+        assert a == b
+        assert a != flight_key("other", [{"role": "user", "content": "扩展需求： 露营椅"}])
+        assert a != flight_key(
+            "m", [{"role": "user", "content": "扩展需求： 露营椅"}], hedge=True
+        )
+
+
+class TestSingleFlight:
+    """测试线程版与 asyncio 版合并器"""
+
+    def test_threads_share_one_call(self):
+        """测试并发线程的相同调用只执行一次，结果分发给所有调用方"""
+        from src.core.singleflight import SingleFlight
+
+        flights = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def fn():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return "结果"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flights.do("k", fn)))
+            for _ in range(4)
+        ]
+        threads[0].start()
+        started.wait()
+        for t in threads[1:]:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == ["结果"] * 4
+        assert len(calls) == 1
+        assert flights.stats()["coalesced"] == 3
+        assert flights.stats()["in_flight"] == 0
+
+    def test_async_error_fans_out(self):
+        """测试请求失败时所有等待者都收到同一个异常，之后的新调用重新执行"""
+        from src.core.singleflight import AsyncSingleFlight
+
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            results = await asyncio.gather(
+                flights.do("k", fail), flights.do("k", fail), return_exceptions=True
+            )
+            again = await asyncio.gather(flights.do("k", fail), return_exceptions=True)
+            return results, again
+
+        results, again = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in results + again)
+        assert len(calls) == 2
+
+    def test_async_cancelled_waiter_does_not_cancel_others(self):
+        """测试某个等待者被取消时，其余等待者仍拿到结果"""
+        from src.core.singleflight import AsyncSingleFlight
+
+        flights = AsyncSingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async def run():
+            first = asyncio.ensure_future(flights.do("k", slow))
+            second = asyncio.ensure_future(flights.do("k", slow))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first
+
+        result, first = asyncio.run(run())
+        assert result == "ok"
+        assert first.cancelled()
+
+
+class TestLLMServiceCoalescing:
+    """测试 AsyncLLMService 合并相同的并发调用"""
+
+    def test_duplicate_requests_share_provider_call(self, tmp_path):
+        """测试两个相同的并发请求只调用一次模型"""
+        with patch("src.llm_wrapper.AsyncOpenAI"):
+            from src.llm_wrapper import AsyncLLMService
+
+            service = AsyncLLMService(api_key="test-key", base_url="http://test.local")
+        service.client = MagicMock()
+        service.log_file = str(tmp_path / "calls.jsonl")
+        calls = []
+
+        async def create(**kwargs):
+            calls.append(kwargs)
+            await asyncio.sleep(0.05)
+            return _response("#简约 #科技")
+
+        service.client.chat.completions.create = create
+        messages = [{"role": "user", "content": "提取标签：露营椅"}]
+
+        async def run():
+            return await asyncio.gather(
+                service.chat_completion(messages),
+                service.chat_completion([dict(m) for m in messages]),
+            )
+
+        results = asyncio.run(run())
+        assert results == ["#简约 #科技"] * 2
+        assert len(calls) == 1
+
+        # llm_wrapper 通过 src 内的顶层包名导入 core
+        from core.singleflight import get_async_singleflight
+
+        assert get_async_singleflight().stats()["coalesced"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
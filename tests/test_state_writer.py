@@ -0,0 +1,71 @@
+"""
+项目状态写入器测试
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestProjectStateWriter:
+    """测试状态修改的合并与写库"""
+
+    def test_coalesces_updates_into_one_write(self):
+        """测试多次修改合并为一次写入，content 只发送修改的字段"""
+        from src.services.state_writer import ProjectStateWriter
+
+        update = AsyncMock(return_value={"ok": True})
+        merge = AsyncMock(return_value=True)
+
+        async def scenario():
+            writer = ProjectStateWriter("p", flush_interval=0)
+            writer.update(status="in_progress", current_step="market_analysis")
+            writer.merge_content({"market_analysis": "m"})
+            writer.update(current_step="visual_research")
+            writer.merge_content({"visual_research": "v"})
+            await writer.flush()
+            await writer.flush()  # 无修改时不写库
+            return writer
+
+        with patch("src.services.state_writer.db_service.db_update_project_async", update), \
+                patch("src.services.state_writer.db_service.merge_project_content_async", merge):
+            writer = asyncio.run(scenario())
+
+        assert update.await_count == 1
+        assert update.await_args.kwargs == {
+            "status": "in_progress",
+            "current_step": "visual_research",
+        }
+        assert merge.await_count == 1
+        assert merge.await_args.args == ("p", {"market_analysis": "m", "visual_research": "v"})
+        assert writer.flushes == 1
+
+    def test_failed_write_is_retried(self):
+        """测试写库失败后保留修改，下次 flush 重试"""
+        from src.services.state_writer import ProjectStateWriter
+
+        update = AsyncMock(side_effect=[None, {"ok": True}])
+
+        async def scenario():
+            writer = ProjectStateWriter("p", flush_interval=0)
+            writer.update(status="completed")
+            await writer.flush()
+            assert writer.dirty
+            await writer.flush()
+            return writer
+
+        with patch("src.services.state_writer.db_service.db_update_project_async", update):
+            writer = asyncio.run(scenario())
+
+        assert not writer.dirty
+        assert update.await_count == 2
+        assert update.await_args.kwargs == {"status": "completed"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
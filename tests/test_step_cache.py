@@ -0,0 +1,153 @@
+"""
+步骤输出缓存测试
+"""
+
+import pytest
+import sys
+import os
+import time
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestStepCache:
+    """测试 StepCache"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        from src.core.step_cache import StepCache
+
+        return StepCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+
+    def test_cache_key_is_content_addressed(self):
+        """测试相同输入得到相同键，任一要素变化则键不同"""
+        from src.core.step_cache import make_cache_key
+
+        messages = [{"role": "user", "content": "市场分析: 咖啡机"}]
+        key = make_cache_key("market_analyst", "m1", messages, "1")
+
+        assert key == make_cache_key("market_analyst", "m1", list(messages), "1")
+        assert key != make_cache_key("market_analyst", "m2", messages, "1")
+        assert key != make_cache_key("market_analyst", "m1", messages, "2")
+        assert key != make_cache_key(
+            "market_analyst", "m1", [{"role": "user", "content": "市场分析: 水杯"}], "1"
+        )
+
+    def test_get_set_and_counters(self, cache):
+        """测试读写与命中计数"""
+        assert cache.get("k") is None
+        cache.set("k", '{"summary": "ok"}', agent="market_analyst", model="m1")
+        assert cache.get("k") == '{"summary": "ok"}'
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+
+    def test_persists_across_instances(self, tmp_path):
+        """测试缓存在重建实例（进程重启）后仍然可用"""
+        from src.core.step_cache import StepCache
+
+        path = str(tmp_path / "cache.sqlite3")
+        StepCache(path).set("k", "value")
+        assert StepCache(path).get("k") == "value"
+
+    def test_lru_eviction(self, cache):
+        """测试超过条数上限时淘汰最久未访问的条目"""
+        for key in ["a", "b", "c"]:
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get("a")  # a 变为最近访问
+        time.sleep(0.01)
+        cache.set("d", "d")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "a"
+        assert cache.stats()["entries"] == 3
+
+    def test_byte_limit_eviction(self, tmp_path):
+        """测试超过字节上限时淘汰"""
+        from src.core.step_cache import StepCache
+
+        cache = StepCache(str(tmp_path / "c.sqlite3"), max_bytes=10)
+        cache.set("a", "12345")
+        time.sleep(0.01)
+        cache.set("b", "1234567")
+        assert cache.get("a") is None
+        assert cache.get("b") == "1234567"
+
+    def test_ttl_expiry(self, tmp_path):
+        """测试过期条目视为未命中"""
+        from src.core.step_cache import StepCache
+
+        cache = StepCache(str(tmp_path / "c.sqlite3"), ttl_seconds=0.05)
+        cache.set("k", "v")
+        time.sleep(0.1)
+        assert cache.get("k") is None
+
+
+class TestWorkflowStepCache:
+    """测试工作流只把完整的响应写入步骤缓存"""
+
+    def test_truncated_response_not_cached(self, tmp_path):
+        """测试被截断后补全的响应不写缓存，完整响应写缓存"""
+        from unittest.mock import patch
+        from src.core.response_processor import LLMResponseProcessor
+        from src.core.step_cache import StepCache
+        from src.main import AsyncDesignWorkflow
+
+        cache = StepCache(str(tmp_path / "cache.sqlite3"))
+        workflow = AsyncDesignWorkflow.__new__(AsyncDesignWorkflow)
+        workflow.model = "test-model"
+        process = LLMResponseProcessor.process_market_analysis
+
+        with patch("src.main.get_step_cache", return_value=cache):
+            workflow._cache_store("k1", "market_analyst", '{"summary": "s", "content": "半', process)
+            workflow._cache_store("k2", "market_analyst", '{"summary": "s", "visuals": []}', process)
+
+        assert cache.get("k1") is None
+        assert cache.get("k2") is not None
+
+    def test_force_refresh_skips_lookup_and_overwrites(self, tmp_path):
+        """测试 use_cache=False（重新生成）时不读缓存，新响应覆盖旧缓存"""
+        import asyncio
+        from unittest.mock import AsyncMock, patch
+        from src.core.response_processor import LLMResponseProcessor
+        from src.core.step_cache import StepCache
+        from src.main import AsyncDesignWorkflow
+
+        cache = StepCache(str(tmp_path / "cache.sqlite3"))
+        workflow = AsyncDesignWorkflow.__new__(AsyncDesignWorkflow)
+        workflow.model = "test-model"
+        workflow.project_name = "p"
+        workflow.run_id = None
+        workflow.llm = AsyncMock()
+        workflow.llm.chat_completion.return_value = '{"summary": "新", "visuals": []}'
+        process = LLMResponseProcessor.process_market_analysis
+        messages = [{"role": "user", "content": "分析"}]
+
+        with patch("src.main.get_step_cache", return_value=cache):
+            workflow.use_cache = True
+            key, _ = workflow._cache_lookup("market_analyst", messages)
+            cache.set(key, '{"summary": "旧", "visuals": []}')
+            assert "旧" in asyncio.run(workflow._complete("market_analyst", messages, process))
+            workflow.llm.chat_completion.assert_not_called()
+
+            workflow.use_cache = False
+            assert "新" in asyncio.run(workflow._complete("market_analyst", messages, process))
+            workflow.llm.chat_completion.assert_called_once()
+
+        assert "新" in cache.get(key)
+
+    def test_step_request_reuses_cache_by_default(self):
+        """测试单步请求默认复用缓存，只有显式 force_refresh 才重新生成"""
+        from src.api import StepRequest
+
+        fields = {"project_name": "p", "step": "market_analysis", "brief": "b", "model_name": "m"}
+        assert StepRequest(**fields).force_refresh is False
+        assert StepRequest(**fields, force_refresh=True).force_refresh is True
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
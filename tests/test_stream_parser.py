@@ -0,0 +1,138 @@
+"""
+流式设计方案解析器测试
+"""
+
+import pytest
+import sys
+import os
+import json
+
+# 添加 src 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _feed_in_chunks(parser, text, size):
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(item for _, item in parser.feed(text[i : i + size]))
+    return items
+
+
+class TestPromptStreamParser:
+    """测试 PromptStreamParser"""
+
+    @pytest.fixture
+    def response(self):
+        return json.dumps(
+            {
+                "summary": "包含 {括号} 与 [方括号] 的摘要",
+                "visuals": [{"prompt": "不应输出"}],
+                "prompts": [
+                    {"title": "方案一", "prompt": "带引号 \" 和 } 的提示词"},
+                    {"title": "方案二", "prompt": "p2", "tags": {"a": [1, {"b": 2}]}},
+                ],
+            },
+            ensure_ascii=False,
+        )
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 17, 10000])
+    def test_emits_each_prompt_regardless_of_chunking(self, response, chunk_size):
+        """测试任意分块方式都能按顺序输出完整方案"""
+        from src.core.stream_parser import PromptStreamParser
+
+        parser = PromptStreamParser()
+        items = _feed_in_chunks(parser, response, chunk_size)
+
+        assert [item["title"] for item in items] == ["方案一", "方案二"]
+        assert items[0]["prompt"] == '带引号 " 和 } 的提示词'
+        assert items[1]["tags"] == {"a": [1, {"b": 2}]}
+        assert parser.done
+
+    def test_emits_before_response_finishes(self, response):
+        """测试第一个方案闭合后即可输出，无需等待后续内容"""
+        from src.core.stream_parser import PromptStreamParser
+
+        cut = response.index("方案二")
+        parser = PromptStreamParser()
+        items = parser.feed(response[:cut])
+
+        assert len(items) == 1
+        assert items[0][1]["title"] == "方案一"
+        assert not parser.done
+
+    def test_ignores_markdown_fence(self):
+        """测试忽略代码块围栏"""
+        from src.core.stream_parser import PromptStreamParser
+
+        text = '```json\n{"schemes": [{"prompt": "a"}]}\n```'
+        parser = PromptStreamParser()
+        assert parser.feed(text) == [(0, {"prompt": "a"})]
+
+    def test_nested_prompts_key_not_emitted(self):
+        """测试只识别顶层对象下的方案数组"""
+        from src.core.stream_parser import PromptStreamParser
+
+        text = '{"meta": {"prompts": [{"prompt": "inner"}]}, "prompts": [{"prompt": "outer"}]}'
+        parser = PromptStreamParser()
+        assert parser.feed(text) == [(0, {"prompt": "outer"})]
+
+    @pytest.mark.parametrize("chunk_size", [1, 5, 10000])
+    def test_skipped_element_keeps_index(self, chunk_size):
+        """测试中间元素解析失败或不是对象时，后续方案仍带着各自在数组中的下标"""
+        from src.core.stream_parser import PromptStreamParser
+
+        text = (
+            '{"prompts": [{"prompt": "a", "tags": [1, 2]}, "坏元素, 带逗号", '
+            '42, {"prompt": "d"}]}'
+        )
+        parser = PromptStreamParser()
+        items = []
+        for i in range(0, len(text), chunk_size):
+            items.extend(parser.feed(text[i : i + chunk_size]))
+
+        assert items == [(0, {"prompt": "a", "tags": [1, 2]}), (3, {"prompt": "d"})]
+
+
+class TestStreamedImages:
+    """测试流式出图结果回填到方案"""
+
+    def test_images_attach_by_index_after_malformed_element(self, monkeypatch):
+        """测试数组中间有坏元素时，流式生成的图片仍回填到对应方案"""
+        import asyncio
+        import main
+
+        workflow = main.AsyncDesignWorkflow(project_name="p")
+        response = json.dumps(
+            {"prompts": [{"prompt": "p0"}, "坏元素", {"prompt": "p2"}, {"prompt": "p3"}]},
+            ensure_ascii=False,
+        )
+
+        async def stream(messages, **kwargs):
+            for i in range(0, len(response), 7):
+                yield response[i : i + 7]
+
+        async def generate_image_async(prompt, *args, **kwargs):
+            return f"img-{prompt}"
+
+        async def noop(*args, **kwargs):
+            return None
+
+        monkeypatch.setattr(workflow.llm, "chat_completion_stream", stream)
+        monkeypatch.setattr(workflow.image_gen, "generate_image_async", generate_image_async)
+        monkeypatch.setattr(workflow, "_cache_lookup", lambda *args: (None, None))
+        monkeypatch.setattr(workflow, "_cache_store", lambda *args: None)
+        monkeypatch.setattr(workflow, "_on_image_done", noop)
+        monkeypatch.setattr(workflow, "_generate_images_concurrently", noop)
+
+        async def scenario():
+            data, image_tasks = await workflow.stream_design_generation("b", {}, {})
+            return await workflow.collect_streamed_images(data, image_tasks)
+
+        prompts = asyncio.run(scenario())
+
+        assert prompts[1] == "坏元素"
+        assert [prompts[i]["image_path"] for i in (0, 2, 3)] == ["img-p0", "img-p2", "img-p3"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,222 @@
+"""
+LLM token 用量与费用统计测试
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _usage(prompt, completion, cached=0):
+    return SimpleNamespace(
+        prompt_tokens=prompt,
+        completion_tokens=completion,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+    )
+
+
+class TestUsageTracker:
+    """测试用量提取与汇总"""
+
+    def test_extract_usage(self):
+        """测试从响应中提取 token 用量，缺失或 Mock 时返回 None"""
+        from src.core.usage import extract_usage
+
+        response = SimpleNamespace(usage=_usage(120, 30, cached=100))
+        assert extract_usage(response) == {
+            "prompt_tokens": 120,
+            "completion_tokens": 30,
+            "cached_tokens": 100,
+        }
+        assert extract_usage(SimpleNamespace(usage=None)) is None
+        assert extract_usage(Mock()) is None
+
+    def test_summary_by_agent_and_cost(self):
+        """测试按项目 / 运行筛选，并按 Agent 汇总费用"""
+        from src.core.usage import UsageTracker
+
+        tracker = UsageTracker()
+        tracker._pricing = {"m": {"prompt": 1.0, "completion": 4.0, "cached": 0.5}}
+        usage = {"prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 200}
+        cost = tracker.record("m", usage, 1.0, agent="market_analyst", project="p", run_id="r1")
+        tracker.record("m", usage, 3.0, agent="product_designer", project="p", run_id="r2")
+        tracker.record("other", None, 0.5, agent="tags")
+
+        assert cost == pytest.approx((800 * 1.0 + 200 * 0.5 + 500 * 4.0) / 1_000_000)
+        run = tracker.summary(run_id="r1")
+        assert list(run["by_agent"]) == ["market_analyst"]
+        project = tracker.summary(project="p")
+        assert project["total"]["calls"] == 2
+        assert project["total"]["prompt_tokens"] == 2000
+        assert project["by_agent"]["product_designer"]["avg_duration_ms"] == 3000
+        assert tracker.summary()["by_agent"]["tags"]["calls"] == 1
+
+    def test_record_failed_call(self):
+        """测试被拒绝的调用计入 failed_calls，token 与费用照常累计"""
+        from src.core.usage import UsageTracker, merge_summaries
+
+        tracker = UsageTracker()
+        usage = {"prompt_tokens": 100, "completion_tokens": 20}
+        tracker.record("m", usage, 1.0, agent="market_analyst", status="rejected")
+        tracker.record("m", usage, 1.0, agent="market_analyst")
+
+        total = tracker.summary()["total"]
+        assert total["calls"] == 2
+        assert total["failed_calls"] == 1
+        assert total["prompt_tokens"] == 200
+        assert merge_summaries(tracker.summary(), tracker.summary())["total"]["failed_calls"] == 2
+
+    def test_project_usage_accumulates_across_resume(self):
+        """测试续跑同一 run_id 时在已保存的用量上累加，新运行只累加到 total"""
+        from src.core.usage import UsageTracker, project_usage
+
+        tracker = UsageTracker()
+        tracker.record("m", {"prompt_tokens": 100, "completion_tokens": 10}, 1.0, run_id="r1")
+        first = project_usage(None, "r1", tracker.summary(run_id="r1"))
+
+        # 进程重启后续跑 r1：新进程只看到新增的调用
+        resumed = UsageTracker()
+        resumed.record("m", {"prompt_tokens": 50, "completion_tokens": 5}, 1.0, run_id="r1")
+        second = project_usage(first, "r1", resumed.summary(run_id="r1"))
+        assert second["last_run"]["total"]["prompt_tokens"] == 150
+        assert second["total"]["total"]["prompt_tokens"] == 150
+
+        third = project_usage(second, "r2", resumed.summary(run_id="r1"))
+        assert third["last_run"]["run_id"] == "r2"
+        assert third["last_run"]["total"]["prompt_tokens"] == 50
+        assert third["total"]["total"]["prompt_tokens"] == 200
+
+
+class TestLLMServiceUsage:
+    """测试 LLM 调用记录用量"""
+
+    def test_chat_completion_records_usage(self, tmp_path):
+        """测试 chat_completion 把 response.usage 按 Agent / 项目计入统计与日志"""
+        with patch("src.llm_wrapper.AsyncOpenAI"):
+            from src.llm_wrapper import AsyncLLMService
+
+            service = AsyncLLMService(api_key="test-key", base_url="http://test.local")
+        service.client = MagicMock()
+        service.log_file = str(tmp_path / "calls.jsonl")
+
+        async def create(**kwargs):
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = "扩展后的设计需求"
+            response.usage = _usage(300, 40, cached=128)
+            return response
+
+        service.client.chat.completions.create = create
+        asyncio.run(
+            service.chat_completion(
+                [{"role": "user", "content": "露营椅"}],
+                model="test-model",
+                agent="autocomplete",
+                project="demo",
+            )
+        )
+
+        from core.usage import get_usage_tracker
+
+        summary = get_usage_tracker().summary(project="demo")
+        assert summary["by_agent"]["autocomplete"]["prompt_tokens"] == 300
+        assert summary["by_agent"]["autocomplete"]["cached_tokens"] == 128
+
+        assert service.log_sink.flush()
+        with open(service.log_file, encoding="utf-8") as f:
+            entry = f.readline()
+        assert '"agent": "autocomplete"' in entry
+        assert '"completion_tokens": 40' in entry
+
+    def test_rejected_response_records_usage(self, tmp_path):
+        """测试被截断而被拒绝的响应同样记录用量与日志，再切换到下一个模型"""
+        with patch("src.llm_wrapper.AsyncOpenAI"):
+            from src.llm_wrapper import AsyncLLMService
+
+            service = AsyncLLMService(api_key="test-key", base_url="http://test.local")
+        from src.core.response_processor import LLMResponseProcessor
+
+        service.client = MagicMock()
+        service.log_file = str(tmp_path / "calls.jsonl")
+        replies = ['{"summary": "s", "content": "半个回', '{"summary": "s", "content": "完整", "visuals": []}']
+
+        async def create(**kwargs):
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = replies.pop(0)
+            response.usage = _usage(500, 200)
+            return response
+
+        service.client.chat.completions.create = create
+        asyncio.run(
+            service.chat_completion(
+                [{"role": "user", "content": "露营椅"}],
+                model="test-model",
+                validator=LLMResponseProcessor.strict(
+                    LLMResponseProcessor.process_market_analysis
+                ),
+                hedge=False,
+                agent="market_analyst",
+                project="truncated",
+            )
+        )
+
+        from core.usage import get_usage_tracker
+
+        total = get_usage_tracker().summary(project="truncated")["total"]
+        assert total["calls"] == 2
+        assert total["failed_calls"] == 1
+        assert total["completion_tokens"] == 400
+
+        assert service.log_sink.flush()
+        with open(service.log_file, encoding="utf-8") as f:
+            statuses = [line for line in f if '"status": "rejected"' in line]
+        assert len(statuses) == 1
+
+    def test_sync_stream_failure_records_usage(self, tmp_path):
+        """测试同步流中途断开时，已返回的用量计入统计"""
+        with patch("src.llm_wrapper.OpenAI"):
+            from src.llm_wrapper import LLMService
+
+            service = LLMService(api_key="test-key", base_url="http://test.local")
+        service.log_file = str(tmp_path / "calls.jsonl")
+
+        def chunk(text, usage=None):
+            item = Mock()
+            item.choices = [Mock()]
+            item.choices[0].delta.content = text
+            item.usage = usage
+            return item
+
+        def broken_stream():
+            yield chunk("第一段内容，", usage=_usage(80, 10))
+            raise Exception("Connection error.")
+
+        streams = [broken_stream(), iter([chunk("第二段内容。", usage=_usage(90, 5))])]
+        service.client = MagicMock()
+        service.client.chat.completions.create.side_effect = lambda **kwargs: streams.pop(0)
+
+        "".join(
+            service.chat_completion_stream(
+                [{"role": "user", "content": "写两段"}],
+                model="test-model",
+                project="stream-broken",
+            )
+        )
+
+        from core.usage import get_usage_tracker
+
+        total = get_usage_tracker().summary(project="stream-broken")["total"]
+        assert total["calls"] == 2
+        assert total["failed_calls"] == 1
+        assert total["prompt_tokens"] == 170
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -385,6 +385,8 @@ export function Dashboard({ project, onProjectCreated }: DashboardProps) {
           step: stepId,
           brief: brief,
           model_name: modelName,
+          // 单步运行即用户主动重新生成，不复用步骤缓存
+          force_refresh: true,
           context: {
             market_analysis: data.market_analysis,
             visual_research: data.visual_research,